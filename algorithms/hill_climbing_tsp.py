@@ -1,19 +1,89 @@
 
 
+import os
 import time
 import random
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config.settings import DENSE_MATRIX_MAX_CITIES, HC_DEFAULT_CANDIDATE_K, HC_DEFAULT_MOVES
 from models.tour import Tour
-from utils.tour_generator import random_tour, nearest_neighbor_tour
+from models.two_level_tour import make_search_tour
+from utils.lazy_distance_matrix import LazyDistanceMatrix
+from utils.profiling import profile_phase
+from utils.tour_generator import random_tour, nearest_neighbor_tour, greedy_tour, space_filling_curve_tour
 
-def two_opt_swap(cities, i, k):
-    """Thực hiện đảo ngược đoạn từ i đến k."""
-    new = cities[:i] + list(reversed(cities[i:k + 1])) + cities[k + 1:]
-    return new
+# Ngưỡng cải thiện tối thiểu, tránh lặp vô hạn vì sai số dấu phẩy động
+IMPROVEMENT_EPS = 1e-9
+
+# Các loại nước đi có thể chọn qua run(..., moves=[...])
+MOVE_TYPES = ('2opt', 'oropt', 'or2opt')
+
+# Độ dài tối đa của đoạn được chuyển trong Or-opt
+OR_OPT_MAX_SEGMENT = 3
+
+def _reverse_between(tour, outer, x, y):
+    """Đảo đoạn x..y của chu trình, với outer là láng giềng của x nằm ngoài đoạn."""
+    if tour.next(outer) == x:
+        tour.reverse_path(x, y)
+    else:
+        tour.reverse_path(y, x)
+
+def _move_segment(tour, p, s1, se, nx, u, v, keep_orientation):
+    """
+    Chuyển đoạn s1..se (đang nằm giữa p và nx) sang giữa u và v,
+    với u..v nằm trên đường đi từ nx trở đi. Thực hiện bằng 2-3 phép đảo:
+    p [s1..se nx..u] v -> p [u..nx se..s1] v -> p [nx..u] [se..s1] v.
+    """
+    _reverse_between(tour, p, s1, u)
+    _reverse_between(tour, p, u, nx)
+    if keep_orientation:
+        _reverse_between(tour, v, s1, se)
+
+# Solver dùng chung trong mỗi tiến trình con của chế độ multi-start
+_WORKER_SOLVER = None
+
+def _init_multi_start_worker(cities, distance_matrix):
+    """Khởi tạo tiến trình con khi không dùng được 'fork' (nhận dữ liệu qua pickle)."""
+    global _WORKER_SOLVER
+    _WORKER_SOLVER = HillClimbingSolver(cities, distance_matrix)
+
+def _multi_start_worker(task):
+    """Chạy một lần leo đồi độc lập; trả về kết quả gọn (id thành phố) để gửi về."""
+    start_index, seed, start_city_id, run_kwargs = task
+    started = time.perf_counter()
+    best_tour, history, _, _ = _WORKER_SOLVER.run(seed=seed, start_city_id=start_city_id, **run_kwargs)
+    return {
+        "start": start_index,
+        "seed": seed,
+        "start_city_id": start_city_id,
+        "initial_distance": history[0],
+        "distance": best_tour.distance,
+        "steps": len(history) - 1,
+        "time": time.perf_counter() - started,
+        "tour_ids": [c.id for c in best_tour.cities],
+    }
 
 class HillClimbingSolver:
     def __init__(self, cities, distance_matrix):
         self.cities = cities
         self.distance_matrix = distance_matrix
+        # SolverProfile của lần run() đang chạy (None = không đo)
+        self._profile = None
+
+    def _neighbourhood_size(self, candidate_k):
+        """
+        Số láng giềng ứng viên thực dùng. candidate_k rỗng nghĩa là xét toàn bộ
+        lân cận (n - 1), nhưng với LazyDistanceMatrix hoặc bộ dữ liệu từ
+        DENSE_MATRIX_MAX_CITIES thành phố trở lên thì danh sách n x (n - 1) quá
+        lớn, nên dùng HC_DEFAULT_CANDIDATE_K.
+        """
+        if candidate_k:
+            return candidate_k
+        n = len(self.cities)
+        if isinstance(self.distance_matrix, LazyDistanceMatrix) or n >= DENSE_MATRIX_MAX_CITIES:
+            return HC_DEFAULT_CANDIDATE_K
+        return n - 1
 
     def _rotate_to_start(self, tour_cities, start_id):
         """
@@ -31,74 +101,367 @@ class HillClimbingSolver:
             return tour_cities 
         return tour_cities[idx:] + tour_cities[:idx]
 
-    def run(self, initial_method='random', start_city_id=None, seed=None, max_no_improve=100):
-        if seed is not None:
-            random.seed(seed)
+    def _try_two_opt(self, tour, a, dist, neighbours):
+        """
+        Thử các nước 2-opt có cạnh mới (a, c) với c thuộc danh sách láng giềng
+        của a, theo cả hai chiều của tour. Áp dụng nước cải thiện đầu tiên.
 
-        # 1. Tạo Tour ban đầu
-        if initial_method == 'nn':
-            start_node = next((c for c in self.cities if c.id == start_city_id), None)
-            current_cities = nearest_neighbor_tour(self.cities, self.distance_matrix, start_node)
+        Danh sách láng giềng sắp tăng dần nên có thể dừng ngay khi
+        d(a, c) >= d(a, b): không nước nào phía sau còn có lợi.
+
+        Returns:
+            tuple | None: (delta, (a, b, c, d)) của nước đã áp dụng, hoặc None
+        """
+        profile = self._profile
+        for forward in (True, False):
+            b = tour.next(a) if forward else tour.prev(a)
+            d_ab = dist(a, b)
+
+            for c in neighbours[a]:
+                d_ac = dist(a, c)
+                if d_ac >= d_ab - IMPROVEMENT_EPS:
+                    break
+                d = tour.next(c) if forward else tour.prev(c)
+                if c == b or d == a:
+                    continue
+
+                delta = d_ac + dist(b, d) - d_ab - dist(c, d)
+                if profile is not None:
+                    profile.moves_evaluated += 1
+                if delta < -IMPROVEMENT_EPS:
+                    # Bỏ (a, b), (c, d); thêm (a, c), (b, d)
+                    if forward:
+                        tour.reverse_path(b, c)
+                    else:
+                        tour.reverse_path(a, d)
+                    return delta, (a, b, c, d)
+        return None
+
+    @staticmethod
+    def _segments_from(tour, a):
+        """
+        Liệt kê các đoạn dài 1..OR_OPT_MAX_SEGMENT có một đầu là a.
+
+        Yields:
+            tuple: (p, s1, se, nx, segment) với s1..se là đoạn đi xuôi,
+                   p đứng trước và nx đứng sau đoạn
+        """
+        max_length = min(OR_OPT_MAX_SEGMENT, len(tour) - 3)
+        for forward in (True, False):
+            s1 = se = a
+            segment = {a}
+            for length in range(1, max_length + 1):
+                if length > 1:
+                    if forward:
+                        se = tour.next(se)
+                        segment.add(se)
+                    else:
+                        s1 = tour.prev(s1)
+                        segment.add(s1)
+                elif not forward:
+                    # Đoạn 1 thành phố đã được liệt kê ở chiều xuôi
+                    continue
+                yield tour.prev(s1), s1, se, tour.next(se), segment
+
+    def _try_or_opt(self, tour, a, dist, neighbours, allow_reverse):
+        """
+        Thử chuyển một đoạn 1..OR_OPT_MAX_SEGMENT thành phố sang giữa hai
+        thành phố kề nhau (u, v) ở chỗ khác trong tour. Với allow_reverse
+        (nước "or2opt"), đoạn còn có thể được chèn ngược chiều.
+
+        Thành phố a được xét theo hai vai trò, mỗi vai trò có cạnh mới nối
+        nó với một láng giềng c đủ gần:
+          - a là một đầu đoạn, c là u hoặc v của chỗ chèn;
+          - a là u hoặc v của chỗ chèn, c là một đầu đoạn.
+        Mọi nước Or-opt có lợi đều thỏa ít nhất một trong các điều kiện cắt tỉa
+        (tiêu chí lợi ích dương), nên hai vai trò này không bỏ sót nước nào
+        khi dùng toàn bộ lân cận.
+
+        Returns:
+            tuple | None: (delta, (p, s1, se, nx, u, v)) của nước đã áp dụng
+        """
+        profile = self._profile
+        # Vai trò 1: a là một đầu đoạn
+        for p, s1, se, nx, segment in self._segments_from(tour, a):
+            removal_gain = dist(p, s1) + dist(se, nx) - dist(p, nx)
+            if removal_gain <= IMPROVEMENT_EPS:
+                continue
+
+            for end in ((s1,) if s1 == se else (s1, se)):
+                bound = max(removal_gain, dist(p, s1) if end == s1 else dist(se, nx))
+                for c in neighbours[end]:
+                    if dist(end, c) >= bound - IMPROVEMENT_EPS:
+                        break
+                    if c in segment:
+                        continue
+                    # Cạnh mới (end, c): chèn ngay sau c hoặc ngay trước c
+                    for u, v in ((c, tour.next(c)), (tour.prev(c), c)):
+                        if profile is not None:
+                            profile.moves_evaluated += 1
+                        move = self._try_insertion(tour, dist, p, s1, se, nx, segment,
+                                                   removal_gain, u, v, end, c, allow_reverse)
+                        if move is not None:
+                            return move
+
+        # Vai trò 2: a là một đầu của cạnh (u, v) nơi đoạn được chèn vào
+        for forward in (True, False):
+            other = tour.next(a) if forward else tour.prev(a)
+            u, v = (a, other) if forward else (other, a)
+            d_uv = dist(u, v)
+
+            for c in neighbours[a]:
+                if dist(a, c) >= d_uv - IMPROVEMENT_EPS:
+                    break
+                if c == other:
+                    continue
+                for p, s1, se, nx, segment in self._segments_from(tour, c):
+                    removal_gain = dist(p, s1) + dist(se, nx) - dist(p, nx)
+                    if profile is not None:
+                        profile.moves_evaluated += 1
+                    move = self._try_insertion(tour, dist, p, s1, se, nx, segment,
+                                               removal_gain, u, v, c, a, allow_reverse)
+                    if move is not None:
+                        return move
+        return None
+
+    @staticmethod
+    def _try_insertion(tour, dist, p, s1, se, nx, segment, removal_gain, u, v, end, c, allow_reverse):
+        """
+        Đánh giá (và áp dụng nếu có lợi) việc chèn đoạn s1..se vào giữa u và v
+        sao cho đầu đoạn `end` kề với thành phố c (c là u hoặc v).
+        """
+        if u in segment or v in segment:
+            return None
+        # Giữ chiều khi s1 kề u hoặc se kề v
+        keeps_orientation = (end == s1) == (c == u)
+        if not keeps_orientation and not allow_reverse:
+            return None
+
+        if keeps_orientation:
+            added = dist(u, s1) + dist(se, v)
         else:
-            current_cities = random_tour(self.cities, seed)
+            added = dist(u, se) + dist(s1, v)
+        delta = added - dist(u, v) - removal_gain
+        if delta < -IMPROVEMENT_EPS:
+            _move_segment(tour, p, s1, se, nx, u, v, keeps_orientation)
+            return delta, (p, s1, se, nx, u, v)
+        return None
 
-        # Xoay ngay từ đầu để đảm bảo điểm xuất phát đúng
-        current_cities = self._rotate_to_start(current_cities, start_city_id)
+    def _improve_city(self, tour, a, dist, neighbours, moves):
+        """
+        Thử lần lượt các loại nước đi trong moves quanh thành phố a.
 
-        current_tour = Tour(current_cities, self.distance_matrix)
-        best_tour = current_tour
-        
-        history = [current_tour.distance]
-        solution_log = []
-        
-        # Ghi log trạng thái đầu tiên (Format giống hình mẫu)
-        path_str = " -> ".join([c.name for c in current_tour.cities]) + f" -> {current_tour.cities[0].name}"
-        solution_log.append((0, current_tour.distance, f"Tour: {path_str}"))
+        Returns:
+            tuple | None: (delta, loại nước đi, các thành phố có cạnh thay đổi)
+        """
+        for kind in moves:
+            if kind == '2opt':
+                move = self._try_two_opt(tour, a, dist, neighbours)
+            else:
+                move = self._try_or_opt(tour, a, dist, neighbours, kind == 'or2opt')
+            if move is not None:
+                return move[0], kind, move[1]
+        return None
+
+    @staticmethod
+    def _describe_move(kind, names):
+        """Mô tả ngắn gọn một nước đi cho nhật ký cải thiện."""
+        if kind == '2opt':
+            a, b, c, d = names
+            return f"2-opt: {a}-{b}, {c}-{d} => {a}-{c}, {b}-{d}"
+        p, s1, se, nx, u, v = names
+        segment = s1 if s1 == se else f"{s1}..{se}"
+        return f"{'Or-opt' if kind == 'oropt' else 'Or-2opt'}: [{segment}] từ giữa {p}-{nx} sang giữa {u}-{v}"
+
+    def run(self, initial_method='random', start_city_id=None, seed=None, candidate_k=None,
+            moves=HC_DEFAULT_MOVES, profile=None):
+        """
+        Chạy Hill Climbing tới cực tiểu địa phương.
+
+        Mỗi thành phố có một "don't-look bit": chỉ các thành phố đang nằm
+        trong hàng đợi (tức là kề một cạnh vừa thay đổi) mới được xét lại.
+        Thuật toán dừng khi hàng đợi rỗng, lúc đó không còn nước đi nào
+        trong lân cận cải thiện được tour.
+
+        Args:
+            initial_method (str): Cách tạo tour ban đầu: 'random', 'nn',
+                'greedy' hoặc 'sfc' (đường cong Hilbert)
+            seed (int, optional): Seed của bộ sinh số ngẫu nhiên riêng cho lần chạy
+                này (random.Random; module random toàn cục không bị seed lại)
+            candidate_k (int, optional): Nếu có, chỉ xét các nước đi nối mỗi
+                thành phố với candidate_k láng giềng gần nhất của nó
+                (danh sách ứng viên). None = xét toàn bộ lân cận (trừ bộ dữ
+                liệu rất lớn, xem _neighbourhood_size).
+            moves (list): Các loại nước đi (mặc định HC_DEFAULT_MOVES), thử theo thứ tự:
+                '2opt'   - đảo một đoạn
+                'oropt'  - chuyển đoạn 1..3 thành phố sang chỗ khác
+                'or2opt' - như 'oropt' nhưng cho phép chèn đoạn ngược chiều
+            profile (SolverProfile, optional): Nếu có, ghi thời gian/bộ nhớ các pha
+                'construction' (tour ban đầu, danh sách ứng viên), 'evaluation'
+                (duyệt lân cận), 'apply' (các phép đảo đoạn), 'finalize', cùng số
+                nước đi được đánh giá/chấp nhận và số lần tra khoảng cách
+        """
+        moves = tuple(moves)
+        unknown = [m for m in moves if m not in MOVE_TYPES]
+        if unknown or not moves:
+            raise ValueError(f"Loại nước đi không hợp lệ: {unknown or moves} (hỗ trợ: {MOVE_TYPES})")
+
+        self._profile = profile
+        with profile_phase(profile, 'construction'):
+            rng = random.Random(seed)
+
+            # 1. Tạo Tour ban đầu
+            if initial_method == 'nn':
+                start_node = next((c for c in self.cities if c.id == start_city_id), None)
+                current_cities = nearest_neighbor_tour(self.cities, self.distance_matrix, start_node, rng=rng)
+            elif initial_method == 'greedy':
+                current_cities = greedy_tour(self.cities, self.distance_matrix)
+            elif initial_method == 'sfc':
+                current_cities = space_filling_curve_tour(self.cities)
+            else:
+                current_cities = random_tour(self.cities, rng=rng)
+
+            # Xoay ngay từ đầu để đảm bảo điểm xuất phát đúng
+            current_cities = self._rotate_to_start(current_cities, start_city_id)
+
+            current_tour = Tour(current_cities, self.distance_matrix)
+
+            history = [current_tour.distance]
+            solution_log = []
+
+            # Ghi log trạng thái đầu tiên (Format giống hình mẫu)
+            path_str = " -> ".join([c.name for c in current_tour.cities]) + f" -> {current_tour.cities[0].name}"
+            solution_log.append((0, current_tour.distance, f"Tour: {path_str}"))
+
+            # Tour được biểu diễn bằng chỉ số trong ma trận khoảng cách (ArrayTour,
+            # hoặc TwoLevelTour với bộ dữ liệu lớn); đối tượng Tour chỉ được dựng
+            # lại một lần khi kết thúc.
+            dist = self.distance_matrix.matrix.item
+            index_cities = self.distance_matrix.cities
+            tour = make_search_tour(current_tour.order.tolist())
+            best_distance = current_tour.distance
+
+            n = len(tour)
+            neighbours = self.distance_matrix.get_candidate_lists(self._neighbourhood_size(candidate_k)).tolist()
 
-        n = len(current_tour.cities)
-        no_improve = 0
         step = 0
-        
         start_time = time.time()
 
-        while no_improve < max_no_improve:
-            improved = False
-            step += 1
-            
-            # Thuật toán 2-opt
-            for i in range(0, n - 1):
-                for k in range(i + 1, n):
-                    new_cities = two_opt_swap(current_tour.cities, i, k)
-                    new_tour = Tour(new_cities, self.distance_matrix)
-                    
-                    if new_tour.distance < best_tour.distance:
-                        # --- TÌM THẤY ĐƯỜNG TỐT HƠN ---
-                        
-                        # 1. Xoay lại ngay để điểm xuất phát luôn cố định
-                        fixed_cities = self._rotate_to_start(new_cities, start_city_id)
-                        best_tour = Tour(fixed_cities, self.distance_matrix)
-                        
-                        current_tour = best_tour
-                        improved = True
-                        no_improve = 0
-                        
-                        path_names = [c.name for c in best_tour.cities]
-                        path_names.append(path_names[0]) # Quay về điểm đầu
-                        path_str = " -> ".join(path_names)
-                        
-                        # Ghi vào log (Chỉ ghi khi Cải Thiện)
-                        solution_log.append((step, best_tour.distance, f"Tour: {path_str}"))
-                        break 
-                
-                if improved:
-                    break
+        if profile is not None:
+            # Chỉ khi đo: đếm số lần tra khoảng cách và tính giờ riêng các phép đảo đoạn
+            dist = profile.counting_distance(dist)
+            tour.reverse_path = profile.timed('apply', tour.reverse_path)
+
+        with profile_phase(profile, 'evaluation'):
+            # Hàng đợi các thành phố có don't-look bit đang tắt
+            queue = deque(tour.to_list() if n > 3 else [])
+            queued = [True] * n
+
+            while queue:
+                a = queue.popleft()
+                queued[a] = False
+
+                move = self._improve_city(tour, a, dist, neighbours, moves)
+                if move is None:
+                    continue
 
-            history.append(best_tour.distance)
+                # --- TÌM THẤY ĐƯỜNG TỐT HƠN ---
+                delta, kind, endpoints = move
+                best_distance += delta
+                step += 1
 
-            if not improved:
-                no_improve += 1
-                # Không ghi log thất bại nữa (để giống mẫu sạch sẽ)
+                # Bật lại các thành phố ở hai đầu những cạnh vừa thay đổi. Với Or-opt
+                # bật cả các thành phố kề chúng, vì đoạn bắt đầu ngay cạnh một cạnh
+                # vừa đổi cũng có lợi ích gỡ đoạn khác đi.
+                woken = endpoints
+                if kind != '2opt':
+                    woken = {x for c in endpoints for x in (tour.prev(c), c, tour.next(c))}
+                for c in woken:
+                    if not queued[c]:
+                        queued[c] = True
+                        queue.append(c)
+
+                # Ghi vào log (Chỉ ghi khi Cải Thiện)
+                names = [index_cities[i].name for i in endpoints]
+                solution_log.append((step, best_distance, self._describe_move(kind, names)))
+
+                history.append(best_distance)
+
+        with profile_phase(profile, 'finalize'):
+            best_cities = self._rotate_to_start([index_cities[idx] for idx in tour.to_list()], start_city_id)
+            best_tour = Tour(best_cities, self.distance_matrix)
+
+        if profile is not None:
+            profile.moves_accepted += step
+            self._profile = None
 
         elapsed = time.time() - start_time
         
-        return best_tour, history, solution_log, elapsed
\ No newline at end of file
+        return best_tour, history, solution_log, elapsed
+
+    def run_multi_start(self, num_starts, max_workers=None, initial_method='nn', start_city_id=None,
+                        seed=None, candidate_k=None, moves=HC_DEFAULT_MOVES):
+        """
+        Chạy num_starts lần leo đồi độc lập (seed và thành phố xuất phát NN khác
+        nhau) trên một ProcessPoolExecutor và trả về tour tốt nhất.
+
+        Trên nền tảng có 'fork', các tiến trình con dùng chung ma trận khoảng cách
+        và danh sách ứng viên của tiến trình cha ở chế độ chỉ đọc (copy-on-write);
+        ở các nền tảng khác chúng được đưa vào shared memory (DistanceMatrix.shared())
+        để tiến trình con gắn vào thay vì nhận bản sao qua pickle.
+
+        Args:
+            num_starts (int): Số lần chạy
+            max_workers (int, optional): Số tiến trình (mặc định: số nhân CPU).
+                1 = chạy tuần tự trong tiến trình hiện tại.
+            start_city_id (int, optional): Xoay tour tốt nhất về thành phố này
+            seed (int, optional): Seed gốc; lần chạy thứ i dùng seed + i
+
+        Returns:
+            tuple: (best_tour, stats) với stats là danh sách dict thống kê
+                   cho từng lần chạy (seed, điểm xuất phát, độ dài, thời gian...)
+        """
+        global _WORKER_SOLVER
+
+        base_seed = seed if seed is not None else random.randrange(2 ** 31)
+        rng = random.Random(base_seed)
+        if initial_method == 'nn':
+            starts = rng.sample(self.cities, min(num_starts, len(self.cities)))
+            start_ids = [starts[i % len(starts)].id for i in range(num_starts)]
+        else:
+            start_ids = [None] * num_starts
+
+        run_kwargs = {"initial_method": initial_method, "candidate_k": candidate_k, "moves": tuple(moves)}
+        tasks = [(i, base_seed + i, start_ids[i], run_kwargs) for i in range(num_starts)]
+
+        # Dựng sẵn danh sách ứng viên để các tiến trình con không phải tính lại
+        self.distance_matrix.get_candidate_lists(self._neighbourhood_size(candidate_k))
+
+        max_workers = min(max_workers or os.cpu_count() or 1, num_starts)
+        _WORKER_SOLVER = self
+        try:
+            if max_workers <= 1:
+                stats = [_multi_start_worker(task) for task in tasks]
+            else:
+                if 'fork' in multiprocessing.get_all_start_methods():
+                    pool_kwargs = {"mp_context": multiprocessing.get_context('fork')}
+                    with ProcessPoolExecutor(max_workers=max_workers, **pool_kwargs) as pool:
+                        stats = list(pool.map(_multi_start_worker, tasks))
+                else:
+                    # Ma trận được đưa vào shared memory: tiến trình con chỉ nhận tên khối nhớ
+                    with self.distance_matrix.shared():
+                        pool_kwargs = {"initializer": _init_multi_start_worker,
+                                       "initargs": (self.cities, self.distance_matrix)}
+                        with ProcessPoolExecutor(max_workers=max_workers, **pool_kwargs) as pool:
+                            stats = list(pool.map(_multi_start_worker, tasks))
+        finally:
+            _WORKER_SOLVER = None
+
+        best = min(stats, key=lambda r: r["distance"])
+        id_to_city = {c.id: c for c in self.cities}
+        best_cities = self._rotate_to_start([id_to_city[i] for i in best["tour_ids"]], start_city_id)
+        best_tour = Tour(best_cities, self.distance_matrix)
+
+        for r in stats:
+            del r["tour_ids"]
+        return best_tour, stats
\ No newline at end of file
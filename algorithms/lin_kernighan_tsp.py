@@ -0,0 +1,289 @@
+import random
+from collections import deque
+
+from config.settings import LK_DEFAULT_CANDIDATE_K, LK_DEFAULT_MAX_DEPTH, LK_DEFAULT_BREADTH, LK_DEFAULT_KICKS
+from models.tour import Tour
+from models.two_level_tour import make_search_tour
+from algorithms.base_tsp_solver import BaseTspSolver
+from utils.profiling import profile_phase
+from utils.tour_generator import nearest_neighbor_tour
+
+# Ngưỡng cải thiện tối thiểu, tránh lặp vô hạn vì sai số dấu phẩy động
+IMPROVEMENT_EPS = 1e-9
+
+# Độ dài tối đa của mỗi đoạn trong cú "double bridge"
+KICK_SEGMENT_MAX = 50
+
+
+def make_2opt_move(tour, t1, t2, t3, t4):
+    """
+    Bỏ cạnh (t1, t2), (t3, t4) và thêm (t2, t3), (t4, t1).
+
+    Yêu cầu t2 kề t1, t4 kề t3, và t4 nằm trên đường đi từ t2 tới t3
+    không qua t1. Phép nghịch đảo là make_2opt_move(tour, t2, t3, t4, t1).
+    """
+    if tour.next(t1) == t2:
+        tour.reverse_path(t2, t4)
+    else:
+        tour.reverse_path(t4, t2)
+
+
+class LinKernighanSolver(BaseTspSolver):
+    """
+    Lin-Kernighan (phiên bản rút gọn kiểu LKH) với:
+      - nước đi độ sâu thay đổi: chuỗi các nước 2-opt nối tiếp, mỗi bước
+        giữ tổng lợi ích dương và ghi nhớ điểm đóng chu trình tốt nhất;
+      - danh sách ứng viên k láng giềng gần nhất;
+      - don't-look bits;
+      - các cú "double bridge" cục bộ (Chained LK) để thoát cực tiểu địa phương.
+    """
+
+    def __init__(self, cities, distance_matrix, candidate_k=LK_DEFAULT_CANDIDATE_K,
+                 max_depth=LK_DEFAULT_MAX_DEPTH, breadth=LK_DEFAULT_BREADTH,
+                 num_kicks=LK_DEFAULT_KICKS, seed=None, verbose=False):
+        super().__init__(cities, distance_matrix)
+
+        self.candidate_k = candidate_k
+        self.max_depth = max_depth  # Số bước tối đa của một chuỗi LK
+        self.breadth = breadth      # Số lựa chọn t3 được thử ở bước đầu tiên
+        self.num_kicks = num_kicks
+        self.seed = seed
+        self.verbose = verbose      # In tiến trình tối ưu (mặc định tắt, vd. trong tiến trình con)
+        # Bộ sinh số ngẫu nhiên riêng cho các cú kick (không đụng tới module random chung)
+        self._rng = random.Random(seed)
+        self._profile = None  # SolverProfile của lần solve() đang chạy
+
+        self._log("--- Khởi tạo LinKernighanSolver ---")
+        self._log(f"Tham số: k={candidate_k}, depth={max_depth}, breadth={breadth}, kicks={num_kicks}")
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def _ranked_steps(self, tour, t1, t2, gain, added):
+        """
+        Các lựa chọn t3 hợp lệ cho bước kế tiếp, xếp theo lợi ích nhìn trước
+        g - d(t2, t3) + d(t3, t4) giảm dần.
+        """
+        dist = self._dist
+        # t4 là láng giềng của t3 nằm về phía t2
+        toward_t2 = tour.prev if tour.next(t1) == t2 else tour.next
+        adjacent = (tour.next(t2), tour.prev(t2))
+        steps = []
+        for t3 in self._neighbours[t2]:
+            g1 = gain - dist(t2, t3)
+            if g1 <= IMPROVEMENT_EPS:
+                break
+            if t3 in adjacent:
+                continue
+            t4 = toward_t2(t3)
+            if added and (min(t3, t4), max(t3, t4)) in added:
+                continue
+            steps.append((g1 + dist(t3, t4), t3, t4))
+        steps.sort(reverse=True)
+        return steps
+
+    def _lk_chain(self, tour, t1, t2, t3):
+        """
+        Chạy một chuỗi LK bắt đầu bằng việc bỏ (t1, t2) và thêm (t2, t3).
+
+        Returns:
+            tuple: (lợi ích, danh sách nước 2-opt đã giữ lại); lợi ích 0 và
+                   danh sách rỗng nếu không cải thiện (tour được khôi phục)
+        """
+        dist = self._dist
+        moves = []
+        gain = dist(t1, t2)
+        best_gain, best_len = IMPROVEMENT_EPS, 0
+        added = set()
+
+        for _ in range(self.max_depth):
+            forward = tour.next(t1) == t2
+            if t3 is None:
+                steps = self._ranked_steps(tour, t1, t2, gain, added)
+                if not steps:
+                    break
+                _, t3, t4 = steps[0]
+            else:
+                t4 = tour.prev(t3) if forward else tour.next(t3)
+
+            make_2opt_move(tour, t1, t2, t3, t4)
+            moves.append((t1, t2, t3, t4))
+            gain += dist(t3, t4) - dist(t2, t3)
+            added.add((min(t2, t3), max(t2, t3)))
+
+            # Lợi ích nếu đóng chu trình bằng cạnh (t4, t1) ngay bây giờ
+            closed = gain - dist(t4, t1)
+            if closed > best_gain:
+                best_gain, best_len = closed, len(moves)
+
+            # Quy tắc dừng của LK: lợi ích mở không còn vượt được điểm đóng tốt nhất
+            if gain <= best_gain:
+                break
+            t2, t3 = t4, None
+
+        # Hoàn tác các bước sau điểm đóng tốt nhất
+        for move in reversed(moves[best_len:]):
+            self._undo(tour, move)
+        if best_len == 0:
+            return 0.0, []
+        return best_gain, moves[:best_len]
+
+    @staticmethod
+    def _undo(tour, move):
+        t1, t2, t3, t4 = move
+        make_2opt_move(tour, t2, t3, t4, t1)
+
+    def _improve_city(self, tour, t1):
+        """Thử một nước LK có lợi bắt đầu từ t1, theo cả hai chiều."""
+        for t2 in (tour.next(t1), tour.prev(t1)):
+            steps = self._ranked_steps(tour, t1, t2, self._dist(t1, t2), set())
+            for _, t3, _ in steps[:self.breadth]:
+                gain, moves = self._lk_chain(tour, t1, t2, t3)
+                if self._profile is not None:
+                    self._profile.moves_evaluated += 1
+                if moves:
+                    return gain, moves
+        return None
+
+    def _local_search(self, tour, queue, journal):
+        """
+        Áp dụng LK với don't-look bits cho tới khi hàng đợi rỗng.
+
+        Returns:
+            float: Tổng lợi ích (độ dài giảm được)
+        """
+        queued = self._queued
+        for c in queue:
+            queued[c] = True
+
+        total_gain = 0.0
+        while queue:
+            t1 = queue.popleft()
+            queued[t1] = False
+
+            result = self._improve_city(tour, t1)
+            if result is None:
+                continue
+
+            gain, moves = result
+            total_gain += gain
+            journal.extend(moves)
+            for move in moves:
+                for c in move:
+                    if not queued[c]:
+                        queued[c] = True
+                        queue.append(c)
+        return total_gain
+
+    def _double_bridge(self, tour, journal):
+        """
+        Cú "double bridge" cục bộ: A B C D -> A C B D, với B và C là hai đoạn
+        ngắn liền nhau bắt đầu từ một thành phố ngẫu nhiên.
+
+        Returns:
+            tuple: (độ dài tăng thêm, các thành phố ở đầu các cạnh bị đổi)
+        """
+        n = len(tour)
+        max_len = max(1, min(KICK_SEGMENT_MAX, (n - 2) // 2))
+        rng = self._rng
+        a1 = rng.randrange(n)
+
+        b0 = b1 = tour.next(a1)
+        for _ in range(rng.randint(1, max_len) - 1):
+            b1 = tour.next(b1)
+        c0 = c1 = tour.next(b1)
+        for _ in range(rng.randint(1, max_len) - 1):
+            c1 = tour.next(c1)
+        d0 = tour.next(c1)
+
+        dist = self._dist
+        delta = (dist(a1, c0) + dist(c1, b0) + dist(b1, d0)
+                 - dist(a1, b0) - dist(b1, c0) - dist(c1, d0))
+
+        # A B C D -> A C' B' D -> A C B' D -> A C B D
+        for move in ((a1, b0, d0, c1), (a1, c1, b1, c0), (c1, b1, d0, b0)):
+            make_2opt_move(tour, *move)
+            journal.append(move)
+        return delta, (a1, b0, b1, c0, c1, d0)
+
+    def solve(self, profile=None, **kwargs):
+        """
+        Args:
+            profile (SolverProfile, optional): Nếu có, ghi thời gian/bộ nhớ các pha
+                'construction' (tour NN, danh sách ứng viên), 'evaluation' (LK và
+                các cú kick), 'apply' (các phép đảo đoạn), 'finalize'; nước đi được
+                đánh giá = số chuỗi LK đã thử, được chấp nhận = số nước 2-opt còn
+                lại trong tour cuối (không tính các cú kick); bộ đếm 'kicks_accepted'
+        """
+        if not self.all_cities:
+            print("Lỗi: Chưa có thành phố nào.")
+            return None, 0, []
+
+        # Mỗi lần solve() bắt đầu lại từ seed nên kết quả tái tạo được
+        self._rng = random.Random(self.seed)
+
+        self._profile = profile
+        dm = self.distance_matrix
+        with profile_phase(profile, 'construction'):
+            initial_cities = nearest_neighbor_tour(self.all_cities, dm, rng=self._rng)
+            initial_tour = Tour(initial_cities, dm)
+            current_distance = initial_tour.distance
+            convergence_history = [current_distance]
+
+            n = len(initial_cities)
+            if n < 5:
+                self._profile = None
+                self.best_tour, self.best_distance = initial_tour, current_distance
+                return self.best_tour, self.best_distance, convergence_history
+
+            self._dist = dm.matrix.item
+            self._neighbours = dm.get_candidate_lists(self.candidate_k).tolist()
+            self._queued = [False] * n
+            tour = make_search_tour(initial_tour.order.tolist())
+
+        if profile is not None:
+            # Chỉ khi đo: đếm số lần tra khoảng cách và tính giờ riêng các phép đảo đoạn
+            self._dist = profile.counting_distance(self._dist)
+            tour.reverse_path = profile.timed('apply', tour.reverse_path)
+
+        with profile_phase(profile, 'evaluation'):
+            self._log("\nBắt đầu quá trình tối ưu...")
+            journal = []
+            current_distance -= self._local_search(tour, deque(tour.to_list()), journal)
+            accepted, kicks_accepted = len(journal), 0
+            convergence_history.append(current_distance)
+            self._log(f"LK ban đầu: {current_distance:.2f}")
+
+            for i in range(self.num_kicks):
+                journal = []
+                delta, touched = self._double_bridge(tour, journal)
+                candidate_distance = current_distance + delta
+                candidate_distance -= self._local_search(tour, deque(touched), journal)
+
+                if candidate_distance < current_distance - IMPROVEMENT_EPS:
+                    current_distance = candidate_distance
+                    accepted += len(journal) - 3
+                    kicks_accepted += 1
+                else:
+                    # Không tốt hơn: hoàn tác toàn bộ cú kick và các nước LK sau nó
+                    for move in reversed(journal):
+                        self._undo(tour, move)
+                convergence_history.append(current_distance)
+
+                if (i + 1) % 10 == 0:
+                    self._log(f"Kick {i+1}/{self.num_kicks} - best: {current_distance:.2f}")
+
+        with profile_phase(profile, 'finalize'):
+            self.best_tour = Tour.from_indices(tour.to_list(), dm)
+            self.best_distance = self.best_tour.distance
+
+        if profile is not None:
+            profile.moves_accepted += accepted
+            profile.count('kicks_accepted', kicks_accepted)
+            self._profile = None
+
+        self._log("\n--- Tối ưu hoàn tất! ---")
+        self._log(f"Quãng đường ngắn nhất: {self.best_distance:.2f}")
+
+        return self.best_tour, self.best_distance, convergence_history
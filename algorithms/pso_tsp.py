@@ -1,158 +1,242 @@
-import random
-import copy 
+import numpy as np
 
-from models.tour import Tour 
+from models.tour import Tour
 from algorithms.base_tsp_solver import BaseTspSolver
-
-class Particle:
-    def __init__(self, initial_tour: Tour):
-        self.current_tour = initial_tour
-        self.current_distance = self.current_tour.distance
-        
-        # pbest: Vị trí cá nhân tốt nhất
-        self.pbest_tour = self.current_tour.copy()
-        self.pbest_distance = self.current_distance
-        
-        # velocity: Vận tốc (danh sách các phép hoán vị)
-        self.velocity = []
-
-    def update_pbest(self):
-        self.current_distance = self.current_tour.distance
-        if self.current_distance < self.pbest_distance:
-            self.pbest_distance = self.current_distance
-            self.pbest_tour = self.current_tour.copy()
-
-class PSOSolver(BaseTspSolver): 
-    def __init__(self, cities, distance_matrix, swarm_size, num_iterations, w, c1, c2):
+from utils.profiling import profile_phase
+
+# Chỉ số đánh dấu ô trống trong các mảng phép hoán vị (velocity)
+NO_SWAP = -1
+
+class PSOSolver(BaseTspSolver):
+    """
+    PSO rời rạc cho TSP, toàn bộ bầy đàn được lưu dưới dạng mảng:
+      - vị trí: mảng hoán vị (swarm_size, n) kiểu int32, phần tử là chỉ số
+        thành phố trong ma trận khoảng cách;
+      - vận tốc: dãy phép hoán vị (i, j) của từng cá thể, lưu thành hai mảng
+        (swarm_size, L) có đệm NO_SWAP.
+    Độ dài tour, phép "trừ" và phép "cộng" đều được tính cho cả bầy cùng lúc.
+    """
+
+    def __init__(self, cities, distance_matrix, swarm_size, num_iterations, w, c1, c2, seed=None):
         # Gọi __init__ của lớp cha
         super().__init__(cities, distance_matrix)
-        
+
         # Các thuộc tính riêng của PSO
         self.swarm_size = swarm_size
         self.num_iterations = num_iterations
         self.w = w   # Quán tính
         self.c1 = c1 # Nhận thức (pbest)
         self.c2 = c2 # Xã hội (gbest)
-        
-        self.swarm = []
+        self.rng = np.random.default_rng(seed)
+
+        self.positions = None        # (swarm_size, n) vị trí hiện tại
+        self.distances = None        # (swarm_size,) độ dài hiện tại
+        self.pbest_positions = None
+        self.pbest_distances = None
+        self.gbest_position = None
+        self.velocity = None         # (I, J) mỗi mảng (swarm_size, L)
+        self._profile = None         # SolverProfile của lần solve() đang chạy
 
         print("--- Khởi tạo PSOSolver ---")
         print(f"Tham số: w={w}, c1={c1}, c2={c2}")
 
-    def _create_random_tour(self) -> Tour:
-        cities_copy = list(self.all_cities)
-        random.shuffle(cities_copy)
-        return Tour(cities_copy, self.distance_matrix)
+    def _evaluate(self, positions) -> np.ndarray:
+        """Độ dài tour của mọi cá thể, tính bằng fancy indexing trên ma trận dày."""
+        matrix = self.distance_matrix.matrix
+        if self._profile is not None:
+            self._profile.moves_evaluated += positions.shape[0]
+            self._profile.distance_lookups += positions.size
+        return matrix[positions, np.roll(positions, -1, axis=1)].sum(axis=1, dtype=np.float64)
 
     def _initialize_swarm(self):
         print("Đang khởi tạo bầy đàn...")
-        self.swarm = []
-        for _ in range(self.swarm_size):
-            random_tour = self._create_random_tour()
-            particle = Particle(random_tour)
-            self.swarm.append(particle)
-            
-            if particle.pbest_distance < self.best_distance:
-                self.best_distance = particle.pbest_distance
-                self.best_tour = particle.pbest_tour.copy()
-        
+        base = np.fromiter((self.distance_matrix.index_of(c.id) for c in self.all_cities),
+                           dtype=np.int32, count=self.num_cities)
+        keys = self.rng.random((self.swarm_size, self.num_cities))
+        self.positions = base[np.argsort(keys, axis=1)]
+        self.distances = self._evaluate(self.positions)
+
+        self.pbest_positions = self.positions.copy()
+        self.pbest_distances = self.distances.copy()
+
+        empty = np.empty((self.swarm_size, 0), dtype=np.int32)
+        self.velocity = (empty, empty)
+
+        best = int(np.argmin(self.pbest_distances))
+        self.best_distance = float(self.pbest_distances[best])
+        self.gbest_position = self.pbest_positions[best].copy()
+
         print(f"Khởi tạo hoàn tất. gbest ban đầu: {self.best_distance:.2f}")
 
-    def _find_swaps(self, tour_a: Tour, tour_b: Tour):
-        # Phép "trừ" (velocity = tour_b - tour_a)
-        swaps = []
-        temp_cities = list(tour_a.cities)
-        target_cities = tour_b.cities
-        
-        city_to_index_map = {city: i for i, city in enumerate(temp_cities)}
-
-        for i in range(self.num_cities):
-            if temp_cities[i].id != target_cities[i].id:
-                city_should_be_here = target_cities[i]
-                current_index_of_target = city_to_index_map[city_should_be_here]
-                city_at_i = temp_cities[i]
-
-                temp_cities[i], temp_cities[current_index_of_target] = temp_cities[current_index_of_target], temp_cities[i]
-                
-                city_to_index_map[city_at_i] = current_index_of_target
-                city_to_index_map[city_should_be_here] = i
-                
-                swaps.append((i, current_index_of_target))
-                
-        return swaps
-
-    def _apply_swaps(self, tour: Tour, swaps) -> Tour:
-        # Phép "cộng" (new_tour = tour + velocity)
-        new_cities = list(tour.cities)
-        for i, j in swaps:
-            if 0 <= i < len(new_cities) and 0 <= j < len(new_cities):
-                new_cities[i], new_cities[j] = new_cities[j], new_cities[i]
-            else:
-                print(f"Cảnh báo: Phép hoán vị không hợp lệ ({i}, {j})")
-                
-        return Tour(new_cities, self.distance_matrix)
+    def _find_swaps(self, current, target):
+        """
+        Phép "trừ" (velocity = target - current) cho cả bầy.
+
+        Giống thuật toán tuần tự: duyệt i tăng dần, nếu vị trí i sai thì hoán vị
+        với vị trí đang chứa thành phố đúng; mỗi bước i xử lý mọi cá thể cùng lúc.
+
+        Returns:
+            tuple: (I, J) dạng (swarm_size, n); ô không có phép hoán vị là NO_SWAP
+        """
+        size, n = current.shape
+        temp = current.copy()
+        rows = np.arange(size)
+        where = np.empty_like(temp)
+        where[rows[:, np.newaxis], temp] = np.arange(n, dtype=temp.dtype)
+
+        # Cá thể đã đúng ở vị trí i có j == i, phép hoán vị khi đó là no-op
+        swap_j = np.empty((size, n), dtype=np.int32)
+        for i in range(n):
+            wanted = target[:, i]
+            j = where[rows, wanted]
+            displaced = temp[:, i].copy()
+
+            temp[rows, j] = displaced
+            temp[:, i] = wanted
+            where[rows, displaced] = j
+            where[rows, wanted] = i
+            swap_j[:, i] = j
+
+        swap_j[swap_j == np.arange(n, dtype=np.int32)] = NO_SWAP
+        swap_i = np.where(swap_j != NO_SWAP, np.arange(n, dtype=np.int32), NO_SWAP).astype(np.int32)
+        return self._compact(swap_i, swap_j)
+
+    @staticmethod
+    def _compact(swap_i, swap_j):
+        """Dồn các phép hoán vị hợp lệ về đầu mỗi hàng (giữ thứ tự) và cắt bớt cột trống."""
+        valid = swap_i != NO_SWAP
+        order = np.argsort(~valid, axis=1, kind='stable')
+        width = int(valid.sum(axis=1).max()) if valid.size else 0
+        order = order[:, :width]
+        return (np.take_along_axis(swap_i, order, axis=1),
+                np.take_along_axis(swap_j, order, axis=1))
+
+    def _apply_swaps(self, positions, swaps):
+        """Phép "cộng" (new_position = position + velocity), áp dụng tại chỗ theo thứ tự."""
+        swap_i, swap_j = swaps
+        size, n = positions.shape
+        # Chỉ số phẳng theo từng cột t; ô NO_SWAP thành hoán vị (0, 0) của hàng, tức no-op
+        offsets = (np.arange(size, dtype=np.intp) * n)[:, np.newaxis]
+        flat_i = np.ascontiguousarray((np.maximum(swap_i, 0) + offsets).T)
+        flat_j = np.ascontiguousarray((np.maximum(swap_j, 0) + offsets).T)
+        flat = positions.reshape(-1)
+        for fi, fj in zip(flat_i, flat_j):
+            a = flat.take(fi)
+            flat[fi] = flat.take(fj)
+            flat[fj] = a
+        return positions
 
     def _sample_swaps(self, swaps, probability_factor):
-        # Nhân vận tốc với hệ số (w, c1*r1, c2*r2)
-        if not swaps:
-            return []
-        
-        k = int(len(swaps) * probability_factor)
-        k = max(0, min(k, len(swaps))) 
-        
-        return random.sample(swaps, k)
-
-    def solve(self, **kwargs):
+        """
+        Nhân vận tốc với hệ số (w, c1*r1, c2*r2): mỗi cá thể giữ lại
+        int(len * hệ số) phép hoán vị được chọn ngẫu nhiên, theo thứ tự ngẫu nhiên.
+
+        Args:
+            probability_factor: Số thực hoặc mảng (swarm_size,) hệ số cho từng cá thể
+        """
+        swap_i, swap_j = swaps
+        if swap_i.shape[1] == 0:
+            return swaps
+
+        valid = swap_i != NO_SWAP
+        lengths = valid.sum(axis=1)
+        k = (lengths * np.asarray(probability_factor, dtype=np.float64)).astype(np.int64)
+        k = np.clip(k, 0, lengths)
+
+        keys = self.rng.random(swap_i.shape)
+        keys[~valid] = np.inf
+        order = np.argsort(keys, axis=1)
+        keep = np.arange(swap_i.shape[1]) < k[:, np.newaxis]
+
+        sampled_i = np.where(keep, np.take_along_axis(swap_i, order, axis=1), NO_SWAP)
+        sampled_j = np.where(keep, np.take_along_axis(swap_j, order, axis=1), NO_SWAP)
+        return self._compact(sampled_i.astype(np.int32), sampled_j.astype(np.int32))
+
+    def _to_tour(self, position) -> Tour:
+        return Tour.from_indices(position, self.distance_matrix)
+
+    def solve(self, profile=None, **kwargs):
+        """
+        Args:
+            profile (SolverProfile, optional): Nếu có, ghi thời gian/bộ nhớ các pha
+                'construction' (khởi tạo bầy), 'apply' (tính vận tốc và di chuyển),
+                'evaluation' (tính độ dài, cập nhật pbest/gbest), 'finalize'; nước đi
+                được đánh giá = số tour được tính độ dài, được chấp nhận = số lần pbest
+                cải thiện
+        """
         if not self.all_cities:
             print("Lỗi: Chưa có thành phố nào.")
-            return None, 0, [] 
+            return None, 0, []
+
+        self._profile = profile
+        with profile_phase(profile, 'construction'):
+            self._initialize_swarm()
 
-        self._initialize_swarm()
-        
         print("\nBắt đầu quá trình tối ưu...")
         convergence_history = [self.best_distance]
 
         for i in range(self.num_iterations):
-            
-            # Cập nhật gbest (best_tour)
-            best_particle_in_iteration = min(self.swarm, key=lambda p: p.current_distance)
-            if best_particle_in_iteration.current_distance < self.best_distance:
-                self.best_distance = best_particle_in_iteration.current_distance
-                self.best_tour = best_particle_in_iteration.current_tour.copy()
-
-            for particle in self.swarm:
-                
-                # --- Công thức cập nhật PSO ---
+
+            with profile_phase(profile, 'evaluation'):
+                # Cập nhật gbest
+                best = int(np.argmin(self.distances))
+                if self.distances[best] < self.best_distance:
+                    self.best_distance = float(self.distances[best])
+                    self.gbest_position = self.positions[best].copy()
+
+            with profile_phase(profile, 'apply'):
+                # --- Công thức cập nhật PSO (cho cả bầy cùng lúc) ---
                 # v(t+1) = w*v(t) + c1*r1*(pbest - x(t)) + c2*r2*(gbest - x(t))
-                
-                inertia_swaps = self._sample_swaps(particle.velocity, self.w)
-                
-                r1 = random.random()
-                pbest_diff_swaps = self._find_swaps(particle.current_tour, particle.pbest_tour)
-                cognitive_swaps = self._sample_swaps(pbest_diff_swaps, self.c1 * r1)
 
-                r2 = random.random()
-                gbest_diff_swaps = self._find_swaps(particle.current_tour, self.best_tour)
-                social_swaps = self._sample_swaps(gbest_diff_swaps, self.c2 * r2)
+                inertia_swaps = self._sample_swaps(self.velocity, self.w)
+
+                # Hiệu với pbest và gbest được tính chung một lượt trên mảng (2 * swarm_size, n)
+                size = self.swarm_size
+                diff_i, diff_j = self._find_swaps(
+                    np.concatenate([self.positions, self.positions]),
+                    np.concatenate([self.pbest_positions,
+                                    np.broadcast_to(self.gbest_position, self.positions.shape)]))
+
+                r1 = self.rng.random(size)
+                cognitive_swaps = self._sample_swaps((diff_i[:size], diff_j[:size]), self.c1 * r1)
+
+                r2 = self.rng.random(size)
+                social_swaps = self._sample_swaps((diff_i[size:], diff_j[size:]), self.c2 * r2)
 
                 # Vận tốc mới v(t+1)
-                particle.velocity = inertia_swaps + cognitive_swaps + social_swaps
+                self.velocity = self._compact(
+                    np.concatenate([inertia_swaps[0], cognitive_swaps[0], social_swaps[0]], axis=1),
+                    np.concatenate([inertia_swaps[1], cognitive_swaps[1], social_swaps[1]], axis=1))
 
                 # Vị trí mới x(t+1) = x(t) + v(t+1)
-                particle.current_tour = self._apply_swaps(particle.current_tour, particle.velocity)
-                
-                particle.update_pbest()
+                self._apply_swaps(self.positions, self.velocity)
+
+            with profile_phase(profile, 'evaluation'):
+                self.distances = self._evaluate(self.positions)
+
+                # Cập nhật pbest
+                improved = self.distances < self.pbest_distances
+                self.pbest_positions[improved] = self.positions[improved]
+                self.pbest_distances[improved] = self.distances[improved]
+
+            if profile is not None:
+                profile.moves_accepted += int(improved.sum())
+                profile.count('swaps_applied', int((self.velocity[0] != NO_SWAP).sum()))
 
             convergence_history.append(self.best_distance)
-            
+
             if (i + 1) % 10 == 0:
                 print(f"Vòng {i+1}/{self.num_iterations} - gbest: {self.best_distance:.2f}")
-        
+
+        with profile_phase(profile, 'finalize'):
+            self.best_tour = self._to_tour(self.gbest_position)
+        self._profile = None
+
         print("\n--- Tối ưu hoàn tất! ---")
         if self.best_tour:
             print(f"Quãng đường ngắn nhất (gbest): {self.best_distance:.2f}")
             print(f"Chu trình tốt nhất (id): {[city.id for city in self.best_tour.cities]}")
         else:
             print("Không tìm thấy chu trình tốt nhất.")
-            
-        return self.best_tour, self.best_distance, convergence_history
\ No newline at end of file
+
+        return self.best_tour, self.best_distance, convergence_history
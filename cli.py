@@ -0,0 +1,243 @@
+"""
+Chạy thuật toán từ dòng lệnh, không cần màn hình:
+
+    python -m cli data/data_cities.json --algorithm hc --method nn --output tour.json --stats stats.json
+    python -m cli depots.tspbin --algorithm pso --iterations 200 --quiet
+    python -m cli data/data_cities.json --algorithm lk --kicks 500
+
+File dữ liệu có thể là JSON, CSV, TSPLIB (.tsp) hoặc nhị phân (.tspbin). Tham số
+mặc định lấy từ config/settings.py. Module này chỉ import phần tính toán;
+PyQt5/matplotlib chỉ được import (muộn) khi dùng --plot.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+from config import settings
+
+
+ALGORITHMS = ('hc', 'pso', 'lk')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m cli",
+                                     description="Giải TSP bằng Hill Climbing, PSO hoặc Lin-Kernighan (không cần GUI).")
+    parser.add_argument('instance', nargs='?', default=settings.DATA_FILE_PATH,
+                        help="File dữ liệu: .json, .csv, .tsp hoặc .tspbin (mặc định: DATA_FILE_PATH)")
+    parser.add_argument('-a', '--algorithm', choices=ALGORITHMS, default='hc')
+    parser.add_argument('-n', '--cities', type=int, default=None,
+                        help="Chỉ dùng N thành phố đầu tiên")
+    parser.add_argument('--start', type=int, default=None, help="Id thành phố xuất phát")
+    parser.add_argument('--seed', type=int, default=settings.HC_DEFAULT_SEED)
+    parser.add_argument('-o', '--output', default=None, help="Ghi tour ra file JSON")
+    parser.add_argument('--stats', default=None, help="Ghi thống kê lần chạy ra file JSON")
+    parser.add_argument('--plot', default=None, help="Vẽ tour ra file ảnh (cần matplotlib)")
+    parser.add_argument('--history', action='store_true',
+                        help="Lưu thống kê vào lịch sử chạy (HISTORY_DB_PATH)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Không dùng cache ma trận khoảng cách trên đĩa (MATRIX_CACHE_DIR)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Ẩn log của thuật toán")
+    parser.add_argument('--profile', action='store_true',
+                        help="Đo thời gian từng pha, số nước đi và số lần tra khoảng cách")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="Như --profile, đo thêm bộ nhớ cấp phát mỗi pha (tracemalloc, chậm hơn)")
+
+    hc = parser.add_argument_group("Hill Climbing")
+    hc.add_argument('--method', choices=('random', 'nn', 'greedy', 'sfc'), default=settings.HC_DEFAULT_METHOD,
+                    help="Cách tạo tour ban đầu")
+    hc.add_argument('--candidate-k', type=int, default=settings.HC_DEFAULT_CANDIDATE_K,
+                    help="Số láng giềng ứng viên (0 = xét toàn bộ lân cận)")
+    hc.add_argument('--moves', nargs='+', default=list(settings.HC_DEFAULT_MOVES),
+                    help="Các loại nước đi: 2opt, oropt, or2opt")
+    hc.add_argument('--starts', type=int, default=1, help="Số lần leo đồi độc lập (multi-start)")
+    hc.add_argument('--workers', type=int, default=None, help="Số tiến trình cho multi-start")
+
+    pso = parser.add_argument_group("PSO")
+    pso.add_argument('--swarm-size', type=int, default=settings.PSO_DEFAULT_SWARM_SIZE)
+    pso.add_argument('--iterations', type=int, default=settings.PSO_DEFAULT_ITERATIONS)
+    pso.add_argument('--w', type=float, default=settings.PSO_DEFAULT_W)
+    pso.add_argument('--c1', type=float, default=settings.PSO_DEFAULT_C1)
+    pso.add_argument('--c2', type=float, default=settings.PSO_DEFAULT_C2)
+
+    lk = parser.add_argument_group("Lin-Kernighan")
+    lk.add_argument('--lk-candidate-k', type=int, default=settings.LK_DEFAULT_CANDIDATE_K,
+                    help="Số láng giềng ứng viên của LK")
+    lk.add_argument('--max-depth', type=int, default=settings.LK_DEFAULT_MAX_DEPTH,
+                    help="Số bước tối đa của một chuỗi LK")
+    lk.add_argument('--breadth', type=int, default=settings.LK_DEFAULT_BREADTH,
+                    help="Số lựa chọn được thử ở bước đầu của chuỗi LK")
+    lk.add_argument('--kicks', type=int, default=settings.LK_DEFAULT_KICKS,
+                    help="Số cú double-bridge (Chained LK)")
+    return parser
+
+
+def load_instance(path: str, num_cities=None, use_cache: bool = True):
+    """
+    Đọc bộ dữ liệu và dựng bộ khoảng cách; trả về (cities, distance_matrix).
+
+    Với num_cities, giống GUI: ma trận của cả bộ dữ liệu được cache trên đĩa
+    (một file cho mọi N) rồi lấy prefix(num_cities). Khi không có gì để dùng
+    lại (không cache, hoặc file nhị phân không kèm ma trận) thì cắt danh sách
+    thành phố trước khi dựng, không tính ma trận của cả bộ dữ liệu.
+    """
+    from utils.data_loader import DataLoader
+    from utils.lazy_distance_matrix import make_distance_matrix
+
+    if DataLoader.detect_format(path) == 'binary':
+        from utils import instance_format
+
+        if num_cities and 'distance' not in instance_format.read_header(path)['blocks']:
+            cities = DataLoader.load_binary(path)[:num_cities]
+            return cities, make_distance_matrix(cities, settings.DENSE_MATRIX_MAX_CITIES)
+        distance_matrix = DataLoader.load_binary_distance_matrix(path, settings.DENSE_MATRIX_MAX_CITIES)
+    else:
+        cities = DataLoader.load_city_array(path)
+        if num_cities and not use_cache:
+            cities = cities[:num_cities]
+        distance_matrix = make_distance_matrix(cities, settings.DENSE_MATRIX_MAX_CITIES,
+                                               cache_dir=settings.MATRIX_CACHE_DIR if use_cache else None)
+    if num_cities:
+        distance_matrix = distance_matrix.prefix(num_cities)
+    return distance_matrix.cities, distance_matrix
+
+
+def run_solver(args, cities, distance_matrix, profile=None):
+    """Chạy thuật toán đã chọn; trả về (best_tour, history, params)."""
+    if args.algorithm == 'hc':
+        from algorithms.hill_climbing_tsp import HillClimbingSolver
+
+        params = {"initial_method": args.method, "start_city_id": args.start, "seed": args.seed,
+                  "candidate_k": args.candidate_k or None, "moves": tuple(args.moves)}
+        solver = HillClimbingSolver(cities, distance_matrix)
+        if args.starts > 1:
+            best_tour, runs = solver.run_multi_start(args.starts, max_workers=args.workers, **params)
+            best = min(runs, key=lambda r: r["distance"])
+            history = [best["initial_distance"], best_tour.distance]
+            params.update(starts=args.starts, workers=args.workers)
+        else:
+            best_tour, history, _, _ = solver.run(**params, profile=profile)
+        params["moves"] = list(params["moves"])
+        return best_tour, history, params
+
+    if args.algorithm == 'lk':
+        from algorithms.lin_kernighan_tsp import LinKernighanSolver
+
+        params = {"candidate_k": args.lk_candidate_k, "max_depth": args.max_depth,
+                  "breadth": args.breadth, "num_kicks": args.kicks, "seed": args.seed}
+        solver = LinKernighanSolver(cities, distance_matrix, **params, verbose=not args.quiet)
+        best_tour, _, history = solver.solve(profile=profile)
+        if best_tour is not None and args.start is not None:
+            best_tour = _rotate(best_tour, args.start)
+        return best_tour, history, params
+
+    from algorithms.pso_tsp import PSOSolver
+
+    params = {"swarm_size": args.swarm_size, "num_iterations": args.iterations,
+              "w": args.w, "c1": args.c1, "c2": args.c2, "seed": args.seed}
+    solver = PSOSolver(cities, distance_matrix, **params)
+    best_tour, _, history = solver.solve(profile=profile)
+    if best_tour is not None and args.start is not None:
+        best_tour = _rotate(best_tour, args.start)
+    return best_tour, history, params
+
+
+def _rotate(tour, start_city_id):
+    """Xoay tour để bắt đầu từ start_city_id (giữ nguyên độ dài)."""
+    from models.tour import Tour
+
+    order = tour.order.tolist()
+    try:
+        shift = order.index(tour.distance_matrix.index_of(start_city_id))
+    except (KeyError, ValueError):
+        return tour
+    return Tour.from_indices(order[shift:] + order[:shift], tour.distance_matrix, tour.distance)
+
+
+def save_plot(tour, path: str):
+    """Vẽ tour ra file ảnh; matplotlib chỉ được import ở đây, với backend không cần màn hình."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from visualization.map_plotter import MapPlotter
+
+    figure = MapPlotter.plot_tour(tour, show_labels=len(tour) <= 100)
+    figure.savefig(path, dpi=120, bbox_inches='tight')
+    print(f"Bản đồ tour đã được lưu: {path}")
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    try:
+        started = time.perf_counter()
+        cities, distance_matrix = load_instance(args.instance, args.cities, use_cache=not args.no_cache)
+        load_time = time.perf_counter() - started
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Lỗi: Không đọc được dữ liệu {args.instance}: {e}", file=sys.stderr)
+        return 1
+    if len(cities) == 0:
+        print(f"Lỗi: Không có thành phố nào trong {args.instance}", file=sys.stderr)
+        return 1
+
+    profile = None
+    if args.profile or args.profile_memory:
+        from utils.profiling import SolverProfile
+        profile = SolverProfile(track_allocations=args.profile_memory)
+        if args.algorithm == 'hc' and args.starts > 1:
+            print("Lỗi: --profile chỉ dùng được khi --starts 1", file=sys.stderr)
+            return 1
+
+    log = open(os.devnull, 'w') if args.quiet else contextlib.nullcontext(sys.stdout)
+    with log as stream, contextlib.redirect_stdout(stream), profile or contextlib.nullcontext():
+        started = time.perf_counter()
+        try:
+            best_tour, history, params = run_solver(args, cities, distance_matrix, profile)
+        except ValueError as e:
+            print(f"Lỗi: {e}", file=sys.stderr)
+            return 1
+        solve_time = time.perf_counter() - started
+
+    from utils.distance_matrix import instance_hash
+
+    stats = {
+        "algorithm": args.algorithm,
+        "instance": os.path.abspath(args.instance),
+        "instance_hash": instance_hash(cities),
+        "num_cities": len(cities),
+        "distance": best_tour.distance,
+        "initial_distance": history[0] if history else None,
+        "steps": len(history) - 1,
+        "load_time": load_time,
+        "time": solve_time,
+        "params": params,
+    }
+    if profile is not None:
+        stats["profile"] = profile.as_dict()
+        for line in profile.summary():
+            print(f"  {line}")
+    print(f"{args.algorithm.upper()} | {len(cities)} thành phố | quãng đường: {best_tour.distance:.2f} km "
+          f"| thời gian: {solve_time:.3f}s (đọc dữ liệu {load_time:.3f}s)")
+
+    if args.output:
+        from utils.data_loader import DataLoader
+        DataLoader.export_tour_to_json(best_tour, args.output)
+    if args.history:
+        from comparison.run_history import RunHistory
+        RunHistory.save_run(stats)
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as file:
+            json.dump(stats, file, indent=2, ensure_ascii=False)
+        print(f"Thống kê đã được xuất ra file: {args.stats}")
+    if args.plot:
+        try:
+            save_plot(best_tour, args.plot)
+        except ImportError as e:
+            print(f"Lỗi: Không vẽ được bản đồ (thiếu thư viện): {e}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
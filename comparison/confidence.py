@@ -0,0 +1,111 @@
+import math
+from statistics import NormalDist
+from typing import Dict, Sequence
+
+import numpy as np
+
+
+# Từ số bậc tự do này trở lên dùng khai triển Cornish-Fisher (sai số < 1e-9)
+_SERIES_MAX_DOF = 1000
+
+
+def _t_central_probability(t: float, dof: int) -> float:
+    """
+    P(|T| < t) của phân phối Student t với dof nguyên, tính đúng bằng chuỗi
+    hữu hạn theo θ = arctan(t / √ν) (Abramowitz & Stegun 26.7.3, 26.7.4).
+    """
+    theta = math.atan(t / math.sqrt(dof))
+    c2 = math.cos(theta) ** 2
+    if dof % 2:
+        # ν lẻ: 2/π (θ + sinθ cosθ (1 + 2/3 cos²θ + ... ))
+        if dof == 1:
+            return 2 * theta / math.pi
+        term = total = 1.0
+        for k in range(1, (dof - 1) // 2):
+            term *= c2 * (2 * k) / (2 * k + 1)
+            total += term
+        return 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * total)
+    # ν chẵn: sinθ (1 + 1/2 cos²θ + 1·3/(2·4) cos⁴θ + ... )
+    term = total = 1.0
+    for k in range(1, dof // 2):
+        term *= c2 * (2 * k - 1) / (2 * k)
+        total += term
+    return math.sin(theta) * total
+
+
+def _cornish_fisher(p: float, dof: int) -> float:
+    """Khai triển Cornish-Fisher quanh phân vị chuẩn (Abramowitz & Stegun 26.7.5)."""
+    z = NormalDist().inv_cdf(p)
+    z2 = z * z
+    g1 = (z2 + 1) * z / 4
+    g2 = ((5 * z2 + 16) * z2 + 3) * z / 96
+    g3 = (((3 * z2 + 19) * z2 + 17) * z2 - 15) * z / 384
+    g4 = ((((79 * z2 + 776) * z2 + 1482) * z2 - 1920) * z2 - 945) * z / 92160
+    v = float(dof)
+    return z + g1 / v + g2 / v ** 2 + g3 / v ** 3 + g4 / v ** 4
+
+
+def t_quantile(confidence: float, dof: int) -> float:
+    """
+    Phân vị hai phía của phân phối Student t (không cần scipy).
+
+    Với dof < _SERIES_MAX_DOF, giải P(|T| < t) = confidence bằng chia đôi trên
+    công thức đúng của hàm phân phối (chính xác tới sai số dấu phẩy động, kể
+    cả với rất ít lần chạy); dof lớn hơn dùng khai triển Cornish-Fisher.
+
+    Args:
+        confidence (float): Mức tin cậy, ví dụ 0.95
+        dof (int): Số bậc tự do (n - 1)
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f"Mức tin cậy phải nằm trong (0, 1): {confidence}")
+    if dof < 1:
+        raise ValueError(f"Số bậc tự do phải >= 1: {dof}")
+    p = 0.5 + confidence / 2
+    if dof == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if dof == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    if dof >= _SERIES_MAX_DOF:
+        return _cornish_fisher(p, dof)
+
+    # Phân vị t luôn lớn hơn phân vị chuẩn; nới cận trên cho tới khi chứa nghiệm
+    low = NormalDist().inv_cdf(p)
+    high = max(2 * _cornish_fisher(p, dof), low + 1.0)
+    while _t_central_probability(high, dof) < confidence:
+        low, high = high, 2 * high
+    for _ in range(200):
+        mid = (low + high) / 2
+        if mid in (low, high):
+            break
+        if _t_central_probability(mid, dof) < confidence:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def summarize(values: Sequence[float], confidence: float = 0.95) -> Dict[str, float]:
+    """
+    Trung bình, trung vị, độ lệch chuẩn mẫu và khoảng tin cậy t của trung bình.
+
+    Returns:
+        dict: {"mean", "median", "std", "ci_low", "ci_high", "half_width", "rel_half_width"};
+              với ít hơn 2 giá trị, half_width là vô cùng
+    """
+    data = np.asarray(values, dtype=np.float64)
+    n = len(data)
+    if n == 0:
+        raise ValueError("Không có giá trị nào để thống kê")
+    mean = float(data.mean())
+    std = float(data.std(ddof=1)) if n > 1 else 0.0
+    half_width = t_quantile(confidence, n - 1) * std / math.sqrt(n) if n > 1 else math.inf
+    return {
+        "mean": mean,
+        "median": float(np.median(data)),
+        "std": std,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "half_width": half_width,
+        "rel_half_width": half_width / abs(mean) if mean else (0.0 if half_width == 0 else math.inf),
+    }
@@ -1,75 +1,417 @@
-# File: comparison/performance_analyzer.py
 
+import os
 import time
+import queue
+import multiprocessing
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator, List, Dict, Any, Optional, Sequence
+
 import numpy as np
-from typing import List, Dict, Any
 
 from models.city import City
 from utils.distance_matrix import DistanceMatrix
 from algorithms.hill_climbing_tsp import HillClimbingSolver
 from algorithms.pso_tsp import PSOSolver
+from algorithms.lin_kernighan_tsp import LinKernighanSolver
+from comparison.confidence import summarize
+from utils.profiling import SolverProfile, mean_profile
+from config.settings import LK_DEFAULT_CANDIDATE_K
+
+# Tên thuật toán (cũng là khóa của PerformanceAnalyzer.results). Chỉ số trong
+# bộ này là một phần seed của mỗi lần chạy (_run_seed): chỉ thêm vào cuối.
+ALGORITHMS = ("Hill Climbing", "PSO", "Lin-Kernighan")
+# Các thuật toán được chạy khi không chỉ định algorithms
+DEFAULT_ALGORITHMS = ("Hill Climbing", "PSO")
+
+# Mặc định của kiểm thử thích nghi (iter_adaptive): dừng khi nửa độ rộng khoảng
+# tin cậy của trung bình nhỏ hơn tỉ lệ này so với trung bình
+ADAPTIVE_CONFIDENCE = 0.95
+ADAPTIVE_DISTANCE_TARGET = 0.01
+ADAPTIVE_TIME_TARGET = 0.05
+ADAPTIVE_MIN_RUNS = 3
+ADAPTIVE_MAX_RUNS = 100
+
+# Dữ liệu dùng chung trong mỗi tiến trình con của benchmark: (cities, distance_matrix)
+_WORKER_DATA = None
+
+def _init_benchmark_worker(cities, distance_matrix):
+    """Khởi tạo tiến trình con của benchmark (nhận dữ liệu qua pickle / shared memory)."""
+    global _WORKER_DATA
+    _WORKER_DATA = (cities, distance_matrix)
+
+def _run_task(task, cities, distance_matrix):
+    """Chạy một lần (run_index, algo_name, params, seed, profile) với seed riêng của lần đó."""
+    run_index, algo_name, params, seed, profile = task
+    result = run_once(algo_name, {**params, "seed": seed}, cities, distance_matrix, *profile)
+    result["run"] = run_index
+    result["seed"] = seed
+    return result
+
+def _run_seed(root: np.random.SeedSequence, run_index: int, algo_name: str) -> int:
+    """
+    Seed của lần chạy run_index của algo_name: SeedSequence con của root với
+    spawn_key (run_index, chỉ số của algo_name trong ALGORITHMS). Seed chỉ phụ
+    thuộc cặp (lần chạy, thuật toán), không phụ thuộc thứ tự chạy hay số thuật
+    toán có trong ALGORITHMS (thêm thuật toán mới vào cuối không làm đổi seed cũ).
+    """
+    spawn_key = root.spawn_key + (run_index, ALGORITHMS.index(algo_name))
+    child = np.random.SeedSequence(root.entropy, spawn_key=spawn_key, pool_size=root.pool_size)
+    return int(child.generate_state(1)[0])
+
+def _benchmark_worker(task):
+    return _run_task(task, *_WORKER_DATA)
+
+def run_once(algo_name: str, params: dict, cities: List[City], distance_matrix,
+             profile: bool = False, track_allocations: bool = False) -> Dict[str, Any]:
+    """
+    Chạy một lần một thuật toán.
+
+    Args:
+        algo_name (str): "Hill Climbing", "PSO" hoặc "Lin-Kernighan"
+        params (dict): Tham số của HillClimbingSolver.run, PSOSolver hoặc LinKernighanSolver
+        profile (bool): Đo từng pha bằng SolverProfile (kết quả ở khóa "profile")
+        track_allocations (bool): Đo cả bộ nhớ cấp phát mỗi pha (tracemalloc, chậm hơn)
+
+    Returns:
+        dict: {"algorithm", "distance", "time", "steps"} (và "profile" nếu đo);
+              distance là None nếu không tìm được tour
+    """
+    if algo_name not in ALGORITHMS:
+        raise ValueError(f"Thuật toán không hợp lệ: {algo_name} (hỗ trợ: {ALGORITHMS})")
+    profiler = SolverProfile(track_allocations) if profile else None
+    with profiler if profiler is not None else nullcontext():
+        started = time.perf_counter()
+        if algo_name == "Hill Climbing":
+            best_tour, history, _, _ = HillClimbingSolver(cities, distance_matrix).run(**params, profile=profiler)
+            distance = best_tour.distance if best_tour else None
+        else:
+            solver_class = PSOSolver if algo_name == "PSO" else LinKernighanSolver
+            best_tour, distance, history = solver_class(cities, distance_matrix, **params).solve(profile=profiler)
+            if not best_tour:
+                distance = None
+        elapsed = time.perf_counter() - started
+
+    result = {
+        "algorithm": algo_name,
+        "distance": distance,
+        "time": elapsed,
+        "steps": max(len(history) - 1, 0),
+    }
+    if profiler is not None:
+        result["profile"] = profiler.as_dict()
+    return result
 
 class PerformanceAnalyzer:
     """
-    Lớp chịu trách nhiệm chạy các thuật toán nhiều lần 
+    Lớp chịu trách nhiệm chạy các thuật toán nhiều lần
     để thu thập dữ liệu thống kê về hiệu năng.
     """
-    
+
     def __init__(self, cities: List[City], distance_matrix: DistanceMatrix):
         self.cities = cities
         self.distance_matrix = distance_matrix
-        self.results: Dict[str, Dict[str, List]] = {
-            "Hill Climbing": {"distances": [], "times": []},
-            "PSO": {"distances": [], "times": []}
-        }
-
-    def run_analysis(self, hc_params: dict, pso_params: dict, num_runs: int = 5):
-     
-        self.results = { "Hill Climbing": {"distances": [], "times": []},
-                         "PSO": {"distances": [], "times": []} }
-        
+        self.results: Dict[str, Dict[str, List]] = {name: {"distances": [], "times": []} for name in ALGORITHMS}
+        # Kết quả từng lần chạy (dict của iter_runs), theo thứ tự (lần chạy, thuật toán)
+        self.runs: List[Dict[str, Any]] = []
+        # Entropy gốc của SeedSequence ở lần phân tích gần nhất (dùng lại để tái tạo kết quả)
+        self.seed: Optional[int] = None
+        # Lý do dừng của từng thuật toán ở lần iter_adaptive gần nhất
+        self.stop_reasons: Dict[str, str] = {}
+
+    def run_analysis(self, hc_params: dict, pso_params: dict, num_runs: int = 5,
+                     max_workers: Optional[int] = None, seed: Optional[int] = None,
+                     profile: bool = False, track_allocations: bool = False,
+                     algorithms: Sequence[str] = DEFAULT_ALGORITHMS, lk_params: Optional[dict] = None):
+        """
+        Chạy num_runs lần các thuật toán (mặc định HC và PSO), song song trên max_workers
+        tiến trình (xem iter_runs). Với cùng seed, kết quả giống hệt nhau dù chạy bao nhiêu tiến trình.
+        """
         print(f"Bắt đầu phân tích so sánh ({num_runs} lần chạy)...")
-        
-        for i in range(num_runs):
-            # --- Chạy Hill Climbing ---
-            hc_solver = HillClimbingSolver(self.cities, self.distance_matrix)
-            start_time_hc = time.perf_counter()
-            
-          
-            best_tour_hc, _, _, _ = hc_solver.run(**hc_params)
-            
-            time_hc = time.perf_counter() - start_time_hc
-            
-            if best_tour_hc:
-                self.results["Hill Climbing"]["distances"].append(best_tour_hc.distance)
-                self.results["Hill Climbing"]["times"].append(time_hc)
-
-            # --- Chạy PSO ---
-            pso_solver = PSOSolver(self.cities, self.distance_matrix, **pso_params)
-            start_time_pso = time.perf_counter()
-            
-            # PSO trả về 3 giá trị (tour, distance, history)
-            best_tour_pso, best_dist_pso, _ = pso_solver.solve()
-            
-            time_pso = time.perf_counter() - start_time_pso
-            
-            if best_tour_pso:
-                self.results["PSO"]["distances"].append(best_dist_pso)
-                self.results["PSO"]["times"].append(time_pso)
-        
+        for _ in self.iter_runs(hc_params, pso_params, num_runs, algorithms=algorithms,
+                                max_workers=max_workers, seed=seed, profile=profile,
+                                track_allocations=track_allocations, lk_params=lk_params):
+            pass
         print("Phân tích so sánh hoàn tất.")
 
-    def get_statistics(self) -> Dict[str, Dict[str, float]]:
+    def iter_runs(self, hc_params: dict, pso_params: dict, num_runs: int = 5,
+                  algorithms: Sequence[str] = DEFAULT_ALGORITHMS, max_workers: Optional[int] = None,
+                  should_stop: Optional[Callable[[], bool]] = None,
+                  seed: Optional[int] = None, profile: bool = False,
+                  track_allocations: bool = False,
+                  lk_params: Optional[dict] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Chạy num_runs lần mỗi thuật toán trên một pool tiến trình và trả về
+        (yield) kết quả từng lần ngay khi nó xong, đồng thời ghi vào self.runs
+        và self.results.
+
+        Mỗi lần chạy có seed riêng lấy từ numpy.random.SeedSequence(seed) (_run_seed),
+        gán theo (lần chạy, thuật toán) chứ không theo tiến trình thực hiện, nên
+        độ dài tour của từng lần giống hệt nhau với mọi max_workers. Khóa 'seed'
+        trong hc_params/pso_params/lk_params bị thay bằng seed của từng lần.
+
+        Args:
+            algorithms (Sequence[str]): Các thuật toán cần chạy, trong ALGORITHMS
+                (mặc định DEFAULT_ALGORITHMS: HC và PSO)
+            max_workers (int, optional): Số tiến trình (mặc định os.cpu_count());
+                1 = chạy tuần tự ngay trong tiến trình hiện tại
+            should_stop (callable, optional): Được hỏi định kỳ; trả về True thì
+                dừng các tiến trình con ngay (các lần chưa xong bị bỏ)
+            seed (int, optional): Seed gốc; None = lấy entropy từ hệ điều hành
+                (giá trị thực dùng được lưu ở self.seed)
+            profile (bool): Đo từng pha của mỗi lần chạy (utils.profiling.SolverProfile);
+                get_statistics() khi đó có thêm khóa "profile" (trung bình các lần)
+            track_allocations (bool): Đo cả bộ nhớ cấp phát mỗi pha (chậm hơn)
+            lk_params (dict, optional): Tham số của LinKernighanSolver khi chạy
+                "Lin-Kernighan" (None = mặc định LK_DEFAULT_* trong settings)
+
+        Yields:
+            dict: Kết quả của run_once kèm "run" (lần chạy thứ mấy, từ 0) và "seed"
+        """
+        self._check_algorithms(algorithms)
+        root = np.random.SeedSequence(seed)
+        self.seed = root.entropy
+        params = {"Hill Climbing": hc_params, "PSO": pso_params, "Lin-Kernighan": lk_params or {}}
+        options = (profile, track_allocations)
+        tasks = iter([(i, name, params[name], _run_seed(root, i, name), options)
+                      for i in range(num_runs) for name in ALGORITHMS if name in algorithms])
+
+        self._prepare(params, algorithms)
+        max_workers = min(max_workers or os.cpu_count() or 1, num_runs * len(algorithms))
+        yield from self._drive(lambda: next(tasks, None), max_workers, should_stop)
+
+    def iter_adaptive(self, hc_params: dict, pso_params: dict,
+                      algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+                      distance_target: float = ADAPTIVE_DISTANCE_TARGET,
+                      time_target: Optional[float] = ADAPTIVE_TIME_TARGET,
+                      confidence: float = ADAPTIVE_CONFIDENCE,
+                      min_runs: int = ADAPTIVE_MIN_RUNS, max_runs: int = ADAPTIVE_MAX_RUNS,
+                      time_budget: Optional[float] = None, max_workers: Optional[int] = None,
+                      should_stop: Optional[Callable[[], bool]] = None,
+                      seed: Optional[int] = None, profile: bool = False,
+                      track_allocations: bool = False,
+                      lk_params: Optional[dict] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Kiểm thử thích nghi: mỗi thuật toán được chạy thêm cho tới khi khoảng tin
+        cậy của trung bình quãng đường (và thời gian) đủ hẹp, hoặc đạt max_runs,
+        hoặc hết time_budget. Thuật toán ít biến động (HC) dừng sớm, thuật toán
+        nhiễu (PSO) được chạy nhiều hơn. Lần chạy thứ i dùng cùng seed như iter_runs.
+
+        Lý do dừng của từng thuật toán được ghi ở self.stop_reasons:
+        'ci' (đạt độ hẹp), 'max_runs', 'time_budget' hoặc 'stopped' (should_stop).
+
+        Args:
+            distance_target (float): Nửa độ rộng khoảng tin cậy tối đa của quãng
+                đường trung bình, tính theo tỉ lệ so với trung bình (0.01 = ±1%)
+            time_target (float, optional): Như trên cho thời gian; None = không xét
+            confidence (float): Mức tin cậy của khoảng tin cậy t
+            min_runs (int): Số lần tối thiểu trước khi xét điều kiện dừng (>= 2)
+            max_runs (int): Số lần tối đa cho mỗi thuật toán
+            time_budget (float, optional): Giới hạn thời gian (giây) cho cả quá trình;
+                hết giờ thì không chạy thêm và bỏ các lần đang dở
+            algorithms, max_workers, should_stop, seed, profile, track_allocations,
+            lk_params: Như iter_runs
+
+        Yields:
+            dict: Kết quả từng lần chạy, như iter_runs
+        """
+        self._check_algorithms(algorithms)
+        if min_runs < 2 or max_runs < min_runs:
+            raise ValueError(f"Cần 2 <= min_runs <= max_runs (min_runs={min_runs}, max_runs={max_runs})")
+        root = np.random.SeedSequence(seed)
+        self.seed = root.entropy
+        params = {"Hill Climbing": hc_params, "PSO": pso_params, "Lin-Kernighan": lk_params or {}}
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        submitted = {name: 0 for name in algorithms}
+
+        def converged(name):
+            data = self.results[name]
+            if len(data["distances"]) < min_runs:
+                return False
+            if summarize(data["distances"], confidence)["rel_half_width"] > distance_target:
+                return False
+            return time_target is None or summarize(data["times"], confidence)["rel_half_width"] <= time_target
+
+        def next_task():
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            # Lần chạy còn dở cũng được tính: có thể chạy dư tối đa max_workers - 1 lần
+            pending = [name for name in algorithms
+                       if submitted[name] < max_runs and (submitted[name] < min_runs or not converged(name))]
+            if not pending:
+                return None
+            name = min(pending, key=lambda a: submitted[a])
+            i = submitted[name]
+            submitted[name] += 1
+            return (i, name, params[name], _run_seed(root, i, name), (profile, track_allocations))
+
+        self.stop_reasons = {}
+        self._prepare(params, algorithms)
+        max_workers = min(max_workers or os.cpu_count() or 1, max_runs * len(algorithms))
+        stopped = should_stop or (lambda: False)
+        try:
+            yield from self._drive(next_task, max_workers, stopped, deadline)
+        finally:
+            for name in algorithms:
+                if converged(name):
+                    reason = "ci"
+                elif len(self.results[name]["distances"]) >= max_runs:
+                    reason = "max_runs"
+                elif deadline is not None and time.perf_counter() > deadline:
+                    reason = "time_budget"
+                else:
+                    reason = "stopped"
+                self.stop_reasons[name] = reason
+
+    def run_adaptive(self, hc_params: dict, pso_params: dict, **kwargs) -> Dict[str, Dict[str, Any]]:
+        """
+        Chạy iter_adaptive tới khi dừng; trả về get_statistics() kèm "stop_reason"
+        của từng thuật toán. Tham số như iter_adaptive.
+        """
+        confidence = kwargs.get("confidence", ADAPTIVE_CONFIDENCE)
+        print("Bắt đầu phân tích so sánh (thích nghi)...")
+        for _ in self.iter_adaptive(hc_params, pso_params, **kwargs):
+            pass
+        stats = self.get_statistics(confidence)
+        for name, reason in self.stop_reasons.items():
+            if name in stats:
+                stats[name]["stop_reason"] = reason
+        print("Phân tích so sánh hoàn tất.")
+        return stats
+
+    @staticmethod
+    def _check_algorithms(algorithms: Sequence[str]):
+        unknown = [a for a in algorithms if a not in ALGORITHMS]
+        if unknown:
+            raise ValueError(f"Thuật toán không hợp lệ: {unknown} (hỗ trợ: {ALGORITHMS})")
+
+    def _prepare(self, params: Dict[str, dict], algorithms: Sequence[str]):
+        self.runs = []
+        self.results = {name: {"distances": [], "times": []} for name in ALGORITHMS}
+        # Dựng sẵn danh sách ứng viên để các tiến trình con không phải tính lại
+        if "Hill Climbing" in algorithms and params["Hill Climbing"].get("candidate_k"):
+            self.distance_matrix.get_candidate_lists(params["Hill Climbing"]["candidate_k"])
+        if "Lin-Kernighan" in algorithms:
+            self.distance_matrix.get_candidate_lists(
+                params["Lin-Kernighan"].get("candidate_k", LK_DEFAULT_CANDIDATE_K))
+
+    def _drive(self, next_task, max_workers, stopped, deadline=None):
+        """
+        Giữ tối đa max_workers task đang chạy, lấy task mới từ next_task() (None =
+        tạm hết) và yield kết quả theo thứ tự xong. Khi kết thúc, self.runs và
+        self.results được sắp lại theo (lần chạy, thuật toán).
+        """
+        stopped = stopped or (lambda: False)
+        try:
+            with self._task_runner(max_workers) as (submit, results):
+                in_flight = 0
+                while True:
+                    while in_flight < max_workers:
+                        task = next_task()
+                        if task is None:
+                            break
+                        submit(task)
+                        in_flight += 1
+                    if in_flight == 0:
+                        return
+                    result = self._next_result(results, stopped, deadline)
+                    if result is None:
+                        return
+                    in_flight -= 1
+                    self.runs.append(result)
+                    self._record(result)
+                    yield result
+        finally:
+            self.runs.sort(key=lambda r: (r["run"], ALGORITHMS.index(r["algorithm"])))
+            self.results = {name: {"distances": [], "times": []} for name in ALGORITHMS}
+            for result in self.runs:
+                self._record(result)
+
+    @contextmanager
+    def _task_runner(self, max_workers):
+        """
+        Trả về (submit, results): submit(task) đưa task đi chạy, kết quả (hoặc
+        exception) được đưa vào hàng đợi results. max_workers <= 1 thì chạy ngay
+        trong tiến trình hiện tại.
+        """
+        results = queue.Queue()
+        if max_workers <= 1:
+            def submit(task):
+                try:
+                    results.put(_run_task(task, self.cities, self.distance_matrix))
+                except Exception as e:
+                    results.put(e)
+            yield submit, results
+            return
+
+        # Không fork tiến trình đang có nhiều luồng (GUI): dùng forkserver nếu có,
+        # dữ liệu được gửi qua initializer, ma trận nằm trong shared memory.
+        # Dùng multiprocessing.Pool vì khi bị hủy có thể terminate() các tiến trình con ngay.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        with self.distance_matrix.shared():
+            pool = context.Pool(max_workers, initializer=_init_benchmark_worker,
+                                initargs=(self.cities, self.distance_matrix))
+            try:
+                yield (lambda task: pool.apply_async(_benchmark_worker, (task,), callback=results.put,
+                                                     error_callback=results.put)), results
+            finally:
+                pool.terminate()
+                pool.join()
+
+    @staticmethod
+    def _next_result(results, stopped, deadline):
+        """Chờ kết quả kế tiếp; None nếu should_stop() trả về True hoặc đã quá deadline."""
+        while True:
+            if stopped():
+                return None
+            try:
+                item = results.get(timeout=0.1)
+            except queue.Empty:
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+                continue
+            if isinstance(item, BaseException):
+                raise item
+            return item
+
+    def _record(self, result: Dict[str, Any]):
+        if result["distance"] is None:
+            return
+        data = self.results[result["algorithm"]]
+        data["distances"].append(result["distance"])
+        data["times"].append(result["time"])
+
+    def get_statistics(self, confidence: float = ADAPTIVE_CONFIDENCE) -> Dict[str, Dict[str, float]]:
+        """
+        Thống kê cho từng thuật toán: trung bình/tốt nhất/tệ nhất/độ lệch chuẩn
+        quãng đường, thời gian trung bình, cùng trung vị và khoảng tin cậy t
+        (mức confidence) của quãng đường và thời gian. Nếu các lần chạy có đo
+        (profile=True), khóa "profile" là trung bình của chúng (mean_profile).
+        """
         stats = {}
         for algo_name, data in self.results.items():
             if not data["distances"]:
                 continue
-            
+
+            distance = summarize(data["distances"], confidence)
+            times = summarize(data["times"], confidence)
             stats[algo_name] = {
                 "distance": float(np.mean(data["distances"])),
                 "best_distance": float(np.min(data["distances"])),
                 "worst_distance": float(np.max(data["distances"])),
                 "std_dev_distance": float(np.std(data["distances"])),
-                "time": float(np.mean(data["times"]))
+                "time": float(np.mean(data["times"])),
+                "runs": len(data["distances"]),
+                "median_distance": distance["median"],
+                "distance_ci_low": distance["ci_low"],
+                "distance_ci_high": distance["ci_high"],
+                "median_time": times["median"],
+                "time_ci_low": times["ci_low"],
+                "time_ci_high": times["ci_high"],
+                "confidence": confidence
             }
-        return stats
\ No newline at end of file
+            profiles = [r["profile"] for r in self.runs
+                        if r["algorithm"] == algo_name and r["distance"] is not None and "profile" in r]
+            if profiles:
+                stats[algo_name]["profile"] = mean_profile(profiles)
+        return stats
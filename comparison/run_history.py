@@ -1,40 +1,199 @@
 
+import datetime
+import hashlib
 import json
 import os
-import datetime
-from typing import List, Dict, Any
+import sqlite3
+from typing import List, Dict, Any, Optional, Sequence
 
 # Import đường dẫn file từ config
-from config.settings import HISTORY_FILE_PATH
+from config.settings import HISTORY_DB_PATH, HISTORY_FILE_PATH
+
+# Lịch sử được lưu trong SQLite (chế độ WAL): mỗi lần lưu chỉ chèn thêm một dòng
+# (append-only), nhiều tiến trình ghi cùng lúc được SQLite khóa và xếp hàng.
+# Các cột hay lọc (thuật toán, mã băm bộ dữ liệu, tham số, thời điểm) được tách
+# riêng và đánh chỉ mục; bản ghi đầy đủ nằm trong cột record (JSON).
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    algorithm TEXT,
+    instance_hash TEXT,
+    params_hash TEXT,
+    distance REAL,
+    time REAL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_algorithm ON runs (algorithm, timestamp);
+CREATE INDEX IF NOT EXISTS idx_runs_instance ON runs (instance_hash, algorithm, params_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_params ON runs (params_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (timestamp);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_INSERT = ("INSERT INTO runs (timestamp, algorithm, instance_hash, params_hash, distance, time, record) "
+           "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+# Các cột dùng được trong RunHistory.aggregate(group_by=...)
+GROUP_COLUMNS = ('algorithm', 'instance_hash', 'params_hash')
+
+# Chờ tối đa (giây) khi tiến trình khác đang giữ khóa ghi
+_BUSY_TIMEOUT = 30
+
+
+def params_hash(params: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Mã băm ngắn của bộ tham số (không phụ thuộc thứ tự khóa); None nếu không có tham số."""
+    if params is None:
+        return None
+    encoded = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+
 
 class RunHistory:
     """
     Quản lý việc đọc và ghi lịch sử các lần chạy thuật toán.
+
+    Một bản ghi là dict tùy ý; các khóa "algorithm", "instance_hash" (xem
+    utils.distance_matrix.instance_hash), "params", "distance", "time" và
+    "timestamp" (tự thêm khi lưu) được đánh chỉ mục để truy vấn nhanh.
+    Mọi phương thức nhận path tùy chọn (mặc định HISTORY_DB_PATH).
     """
-    
+
     @staticmethod
-    def load_history() -> List[Dict[str, Any]]:
-        """Tải toàn bộ lịch sử chạy từ file JSON."""
-        if not os.path.exists(HISTORY_FILE_PATH):
-            return []
+    def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+        path = path or HISTORY_DB_PATH
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=_BUSY_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        if path == HISTORY_DB_PATH:
+            RunHistory._import_legacy_json(conn)
+        return conn
+
+    @staticmethod
+    def _import_legacy_json(conn: sqlite3.Connection):
+        """Chép lịch sử cũ (run_history.json) vào cơ sở dữ liệu, một lần duy nhất."""
+        imported = "SELECT 1 FROM meta WHERE key = 'legacy_json_imported'"
+        if not os.path.exists(HISTORY_FILE_PATH) or conn.execute(imported).fetchone():
+            return
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute(imported).fetchone():
+                return
+            try:
+                with open(HISTORY_FILE_PATH, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                print(f"Lỗi: File lịch sử {HISTORY_FILE_PATH} bị hỏng, bỏ qua khi chuyển đổi.")
+                records = []
+            conn.executemany(_INSERT, [RunHistory._row(r) for r in records if isinstance(r, dict)])
+            conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                         (datetime.datetime.now().isoformat(),))
+
+    @staticmethod
+    def _row(record: Dict[str, Any]) -> tuple:
+        return (record.get("timestamp") or datetime.datetime.now().isoformat(),
+                record.get("algorithm"), record.get("instance_hash"), params_hash(record.get("params")),
+                record.get("distance"), record.get("time"),
+                json.dumps(record, ensure_ascii=False, default=str))
+
+    @staticmethod
+    def load_history(path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Tải toàn bộ lịch sử chạy (theo thứ tự lưu)."""
         try:
-            with open(HISTORY_FILE_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            print(f"Lỗi: File lịch sử {HISTORY_FILE_PATH} bị hỏng.")
+            return RunHistory.query(path=path)
+        except sqlite3.Error as e:
+            print(f"Lỗi: Không đọc được lịch sử {path or HISTORY_DB_PATH}: {e}")
             return []
 
     @staticmethod
-    def save_run(run_result: Dict[str, Any]):
-      
-        history = RunHistory.load_history()
-        
+    def save_run(run_result: Dict[str, Any], path: Optional[str] = None):
+        """Thêm một lần chạy vào cuối lịch sử (không đọc hay ghi lại các bản ghi cũ)."""
         # Thêm thông tin thời gian
         run_result["timestamp"] = datetime.datetime.now().isoformat()
-        history.append(run_result)
-        
         try:
-            with open(HISTORY_FILE_PATH, 'w', encoding='utf-8') as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
-        except IOError as e:
-            print(f"Lỗi khi lưu lịch sử: {e}")
\ No newline at end of file
+            conn = RunHistory._connect(path)
+            try:
+                with conn:
+                    conn.execute(_INSERT, RunHistory._row(run_result))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Lỗi khi lưu lịch sử: {e}")
+
+    @staticmethod
+    def _where(algorithm=None, instance_hash=None, params=None, since=None, until=None):
+        clauses, args = [], []
+        for column, value in (("algorithm", algorithm), ("instance_hash", instance_hash),
+                              ("params_hash", params_hash(params))):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            args.append(since.isoformat() if isinstance(since, datetime.datetime) else since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            args.append(until.isoformat() if isinstance(until, datetime.datetime) else until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    @staticmethod
+    def query(algorithm: Optional[str] = None, instance_hash: Optional[str] = None,
+              params: Optional[Dict[str, Any]] = None, since=None, until=None,
+              limit: Optional[int] = None, newest_first: bool = False,
+              path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Lấy các bản ghi khớp mọi điều kiện được truyền (dùng chỉ mục).
+
+        Args:
+            algorithm (str, optional): Tên thuật toán
+            instance_hash (str, optional): Mã băm bộ dữ liệu
+            params (dict, optional): Bộ tham số (so khớp toàn bộ qua params_hash)
+            since, until (datetime | str, optional): Khoảng thời gian [since, until)
+            limit (int, optional): Số bản ghi tối đa
+            newest_first (bool): Sắp xếp mới nhất trước
+        """
+        where, args = RunHistory._where(algorithm, instance_hash, params, since, until)
+        sql = f"SELECT record FROM runs{where} ORDER BY id {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        conn = RunHistory._connect(path)
+        try:
+            return [json.loads(record) for (record,) in conn.execute(sql, args)]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def aggregate(group_by: Sequence[str] = ('algorithm',), algorithm: Optional[str] = None,
+                  instance_hash: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                  since=None, until=None, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Thống kê tính ngay trong SQLite (không tải bản ghi lên): số lần chạy,
+        quãng đường trung bình / tốt nhất / tệ nhất và thời gian trung bình,
+        theo nhóm group_by (các cột trong GROUP_COLUMNS). Điều kiện lọc như query().
+
+        Raises:
+            ValueError: Nếu group_by có cột không hỗ trợ
+        """
+        group_by = tuple(group_by)
+        unknown = [c for c in group_by if c not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"Không nhóm được theo {unknown} (hỗ trợ: {GROUP_COLUMNS})")
+        where, args = RunHistory._where(algorithm, instance_hash, params, since, until)
+        columns = ", ".join(group_by)
+        select = (columns + ", " if columns else "") + (
+            "COUNT(*), AVG(distance), MIN(distance), MAX(distance), AVG(time), MAX(timestamp)")
+        sql = f"SELECT {select} FROM runs{where}"
+        if columns:
+            sql += f" GROUP BY {columns} ORDER BY {columns}"
+        conn = RunHistory._connect(path)
+        try:
+            rows = conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+        keys = group_by + ("runs", "distance", "best_distance", "worst_distance", "time", "last_run")
+        return [dict(zip(keys, row)) for row in rows if row[len(group_by)]]
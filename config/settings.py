@@ -8,15 +8,30 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Đường dẫn đến file dữ liệu 
 DATA_FILE_PATH = os.path.join(BASE_DIR, "data", "data_cities.json")
 
-# Đường dẫn đến file lưu lịch sử 
+# Đường dẫn đến file lưu lịch sử (SQLite, chỉ ghi thêm)
+HISTORY_DB_PATH = os.path.join(BASE_DIR, "comparison", "run_history.sqlite3")
+# File lịch sử JSON cũ: được chép vào HISTORY_DB_PATH một lần nếu còn tồn tại
 HISTORY_FILE_PATH = os.path.join(BASE_DIR, "comparison", "run_history.json")
 
+# Thư mục cache ma trận khoảng cách (.npy, đọc lại bằng memory-map)
+MATRIX_CACHE_DIR = os.path.join(BASE_DIR, "data", "cache")
+
+# Từ số thành phố này trở lên không dựng ma trận dày mà dùng LazyDistanceMatrix
+DENSE_MATRIX_MAX_CITIES = 20000
+
+# Kiểm thử nhiều lần (nút "CHẠY KIỂM THỬ"): số lần chạy và số tiến trình (None = số CPU)
+BENCHMARK_NUM_RUNS = 5
+BENCHMARK_MAX_WORKERS = None
+
 
 
 # tham số mẫu
 HC_DEFAULT_METHOD = 'nn'
 HC_DEFAULT_SEED = 42
-HC_DEFAULT_MAX_NO_IMPROVE = 100
+# Số láng giềng gần nhất trong danh sách ứng viên (None = xét toàn bộ lân cận)
+HC_DEFAULT_CANDIDATE_K = 10
+# Các loại nước đi của Hill Climbing: '2opt', 'oropt', 'or2opt'
+HC_DEFAULT_MOVES = ('2opt', 'or2opt')
 
 
 # --- Tham số PSO (Defaults) ---
@@ -25,4 +40,10 @@ PSO_DEFAULT_SWARM_SIZE = 30
 PSO_DEFAULT_ITERATIONS = 100
 PSO_DEFAULT_W = 0.7
 PSO_DEFAULT_C1 = 1.5
-PSO_DEFAULT_C2 = 1.5
\ No newline at end of file
+PSO_DEFAULT_C2 = 1.5
+
+# --- Tham số Lin-Kernighan (Defaults) ---
+LK_DEFAULT_CANDIDATE_K = 8
+LK_DEFAULT_MAX_DEPTH = 50
+LK_DEFAULT_BREADTH = 5
+LK_DEFAULT_KICKS = 100
@@ -0,0 +1,51 @@
+import traceback
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from comparison.performance_analyzer import PerformanceAnalyzer
+
+class BenchmarkThread(QThread):
+    """
+    Luồng chạy kiểm thử nhiều lần trong nền.
+    Các lần chạy được chia cho một pool tiến trình (PerformanceAnalyzer.iter_runs);
+    kết quả từng lần được gửi về GUI ngay khi xong. Có thể hủy giữa chừng.
+    """
+
+    # Kết quả một lần chạy (dict của PerformanceAnalyzer.iter_runs)
+    run_signal = pyqtSignal(dict)
+    # Thống kê tổng hợp (get_statistics) và cờ cho biết đã bị hủy hay chưa
+    finished_signal = pyqtSignal(dict, bool)
+    log_signal = pyqtSignal(str)
+
+    def __init__(self, algorithms, hc_params, pso_params, num_runs, cities, distance_matrix,
+                 max_workers=None):
+        super().__init__()
+        self.algorithms = tuple(algorithms)
+        self.hc_params = hc_params
+        self.pso_params = pso_params
+        self.num_runs = num_runs
+        self.cities = cities
+        self.distance_matrix = distance_matrix
+        self.max_workers = max_workers
+        self._cancelled = False
+
+    def cancel(self):
+        """Yêu cầu dừng: các tiến trình con bị dừng, lần chưa xong bị bỏ."""
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        analyzer = PerformanceAnalyzer(self.cities, self.distance_matrix)
+        self.log_signal.emit(f"[BENCH] {self.num_runs} lần x {', '.join(self.algorithms)}...")
+        try:
+            runs = analyzer.iter_runs(self.hc_params, self.pso_params, self.num_runs,
+                                      algorithms=self.algorithms, max_workers=self.max_workers,
+                                      should_stop=self.is_cancelled)
+            for result in runs:
+                self.run_signal.emit(result)
+            self.log_signal.emit(f"[BENCH] Seed gốc (để chạy lại y hệt): {analyzer.seed}")
+        except Exception as e:
+            self.log_signal.emit(f"LỖI KIỂM THỬ: {str(e)}")
+            print(traceback.format_exc())
+        self.finished_signal.emit(analyzer.get_statistics(), self._cancelled)
@@ -2,13 +2,12 @@
 
 import sys
 import time
-import traceback
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QTabWidget, QTextEdit, QLabel, QGroupBox, 
                              QFormLayout, QComboBox, QSpinBox, 
                              QDoubleSpinBox, QPushButton, QSplitter,
                              QStackedWidget, QMessageBox, QTableWidget, 
-                             QTableWidgetItem, QHeaderView, QSlider, QApplication)
+                             QTableWidgetItem, QHeaderView, QSlider, QCheckBox)
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QColor
 
@@ -19,11 +18,12 @@ plt.style.use('dark_background')
 
 # Import Logic
 from utils.data_loader import DataLoader
-from utils.distance_matrix import DistanceMatrix
+from utils.lazy_distance_matrix import make_distance_matrix
 from models.city import City
 from models.tour import Tour
 from gui.solver_thread import SolverThread
-from comparison.performance_analyzer import PerformanceAnalyzer 
+from gui.benchmark_thread import BenchmarkThread
+from config.settings import MATRIX_CACHE_DIR, DENSE_MATRIX_MAX_CITIES, BENCHMARK_NUM_RUNS, BENCHMARK_MAX_WORKERS
 
 # --- DARK THEME STYLESHEET ---
 DARK_STYLESHEET = """
@@ -175,7 +175,7 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("TSP Solver Pro - Hill Climbing & PSO (Full Benchmark)")
         self.setGeometry(50, 50, 1400, 850)
         self.setStyleSheet(DARK_STYLESHEET)
-        self.all_cities = []; self.cities = []; self.distance_matrix = None; self.solver_thread = None 
+        self.all_cities = []; self.cities = []; self.distance_matrix = None; self.solver_thread = None; self.bench_thread = None 
         self._init_ui()
         self.load_data_automatically()
 
@@ -215,12 +215,13 @@ class MainWindow(QMainWindow):
         w_hc = QWidget()
         l_hc = QFormLayout(w_hc)
         l_hc.setContentsMargins(0,0,0,0)
-        self.hc_method = QComboBox(); self.hc_method.addItems(["random", "nn"])
+        self.hc_method = QComboBox(); self.hc_method.addItems(["random", "nn", "greedy", "sfc"])
         self.hc_seed = QSpinBox(); self.hc_seed.setValue(42); self.hc_seed.setRange(0, 99999)
-        self.hc_improve = QSpinBox(); self.hc_improve.setValue(100); self.hc_improve.setRange(10, 50000)
+        self.hc_candidate_k = QSpinBox(); self.hc_candidate_k.setRange(0, 100); self.hc_candidate_k.setValue(10)
+        self.hc_candidate_k.setToolTip("Số láng giềng gần nhất được xét cho mỗi thành phố (0 = toàn bộ)")
         l_hc.addRow("Khởi tạo:", self.hc_method)
         l_hc.addRow("Seed:", self.hc_seed)
-        l_hc.addRow("Max No Improve:", self.hc_improve)
+        l_hc.addRow("Láng giềng (K):", self.hc_candidate_k)
         
         # PSO Params
         w_pso = QWidget()
@@ -246,9 +247,12 @@ class MainWindow(QMainWindow):
         self.btn_run.setFixedHeight(40)
         self.btn_run.clicked.connect(self.on_run)
         side_layout.addWidget(self.btn_run)
+        self.chk_profile = QCheckBox("Đo thời gian từng pha (profile)")
+        self.chk_profile.setToolTip("Ghi thời gian dựng tour / đánh giá / áp dụng nước đi, số nước đi và số lần tra khoảng cách vào nhật ký")
+        side_layout.addWidget(self.chk_profile)
         
         # --- NÚT BENCHMARK MỚI ---
-        self.btn_bench = QPushButton("CHẠY KIỂM THỬ (5 Lần)")
+        self.btn_bench = QPushButton(f"CHẠY KIỂM THỬ ({BENCHMARK_NUM_RUNS} Lần)")
         self.btn_bench.setObjectName("btn_bench")
         self.btn_bench.setFixedHeight(35)
         self.btn_bench.clicked.connect(self.on_run_benchmark)
@@ -290,6 +294,10 @@ class MainWindow(QMainWindow):
             self.all_cities = DataLoader.load_cities_from_json("data/data_cities.json")
             total = len(self.all_cities)
             if total < 4: raise ValueError("Data < 4 cities")
+            # Ma trận của toàn bộ dữ liệu, đọc từ cache trên đĩa nếu đã có;
+            # dữ liệu quá lớn thì dùng oracle tính khoảng cách theo yêu cầu
+            self.full_distance_matrix = make_distance_matrix(self.all_cities, DENSE_MATRIX_MAX_CITIES,
+                                                             cache_dir=MATRIX_CACHE_DIR)
             self.slider_cities.setMaximum(total)
             self.slider_cities.setValue(total)
             self.on_city_count_changed(total)
@@ -299,7 +307,7 @@ class MainWindow(QMainWindow):
 
     def on_city_count_changed(self, count):
         self.cities = self.all_cities[:count]
-        self.distance_matrix = DistanceMatrix(self.cities)
+        self.distance_matrix = self.full_distance_matrix.prefix(count)
         self.lbl_city_count.setText(f"{count} thành phố")
         self.combo_start_city.clear()
         self.combo_start_city.addItem("Ngẫu nhiên", None)
@@ -344,22 +352,26 @@ class MainWindow(QMainWindow):
         start_name = self.combo_start_city.currentText()
         self.log(f"🚀 Chạy {algo} | Xuất phát: {start_name}", "blue")
         
-        self.thread = SolverThread(algo, params, self.cities, self.distance_matrix)
+        self.thread = SolverThread(algo, params, self.cities, self.distance_matrix,
+                                   profile=self.chk_profile.isChecked())
         self.thread.result_signal.connect(self.on_finish)
         self.thread.log_signal.connect(lambda s: self.log(f"  >> {s}", "#a6adc8"))
         self.thread.start()
 
     def on_run_benchmark(self):
-        """Chạy kiểm thử (5 lần)"""
+        """Chạy kiểm thử (BENCHMARK_NUM_RUNS lần) trong nền; bấm lần nữa để hủy"""
+        if self.bench_thread is not None and self.bench_thread.isRunning():
+            self.bench_thread.cancel()
+            self.btn_bench.setEnabled(False)
+            self.log("⏹ Đang hủy kiểm thử...", "red")
+            return
         if not self.cities: return
         algo_name = self.combo_algo.currentText()
-        
-        # Lấy cả 2 bộ tham số để truyền vào Analyzer
+
         hc_params = {
             'initial_method': self.hc_method.currentText(),
             'start_city_id': self.combo_start_city.currentData(),
-            'seed': None, # Random seed cho benchmark
-            'max_no_improve': self.hc_improve.value()
+            'candidate_k': self.hc_candidate_k.value() or None
         }
         pso_params = {
             'swarm_size': self.pso_swarm.value(),
@@ -369,45 +381,53 @@ class MainWindow(QMainWindow):
             'c2': self.pso_c2.value()
         }
 
+        self.btn_run.setEnabled(False)
+        self.slider_cities.setEnabled(False)
+        self.btn_bench.setText("HỦY KIỂM THỬ")
         self.log("="*40, "white")
-        self.log(f"📊 ĐANG CHẠY KIỂM THỬ 5 LẦN ({algo_name})...", "blue")
-        self.log("Vui lòng đợi (giao diện có thể tạm dừng)...", "white")
-        QApplication.processEvents() # Cập nhật UI
+        self.log(f"📊 ĐANG CHẠY KIỂM THỬ {BENCHMARK_NUM_RUNS} LẦN ({algo_name})...", "blue")
+        self.tabs.setCurrentIndex(2)
+
+        # Chỉ chạy thuật toán đang chọn (tên khớp với khóa trong performance_analyzer.py)
+        self.bench_thread = BenchmarkThread((algo_name,), hc_params, pso_params, BENCHMARK_NUM_RUNS,
+                                            self.cities, self.distance_matrix, BENCHMARK_MAX_WORKERS)
+        self.bench_thread.run_signal.connect(self.on_benchmark_run)
+        self.bench_thread.finished_signal.connect(self.on_benchmark_finish)
+        self.bench_thread.log_signal.connect(lambda s: self.log(f"  >> {s}", "#a6adc8"))
+        self.bench_thread.start()
+
+    def on_benchmark_run(self, result):
+        """Một lần chạy kiểm thử vừa xong: thêm ngay vào bảng so sánh"""
+        if result['distance'] is None:
+            self.log(f"   • Lần {result['run'] + 1}: không tìm được tour", "red")
+            return
+        self.log(f"   • Lần {result['run'] + 1}: {result['distance']:.2f} km | {result['time']:.4f} s", "white")
+        self.tab_compare.add_result(f"{result['algorithm']} (lần {result['run'] + 1})",
+                                    result['distance'], result['time'], result['steps'])
+
+    def on_benchmark_finish(self, stats, cancelled):
+        self.btn_run.setEnabled(True)
+        self.btn_bench.setEnabled(True)
+        self.btn_bench.setText(f"CHẠY KIỂM THỬ ({BENCHMARK_NUM_RUNS} Lần)")
+        self.slider_cities.setEnabled(True)
 
-        try:
-            analyzer = PerformanceAnalyzer(self.cities, self.distance_matrix)
-            
-            # Chạy phân tích
-            # Lưu ý: PerformanceAnalyzer được thiết kế để chạy cả 2, 
-            # nhưng ở đây ta chỉ quan tâm kết quả của thuật toán đang chọn
-            analyzer.run_analysis(hc_params, pso_params, num_runs=5)
-            stats = analyzer.get_statistics()
-            
-            # Lấy kết quả của thuật toán hiện tại
-            # (Tên key phải khớp với trong performance_analyzer.py)
-            key_map = {"Hill Climbing": "Hill Climbing", "PSO": "PSO"}
-            my_stats = stats.get(key_map.get(algo_name))
-            
-            if my_stats:
-                avg_dist = my_stats['distance']
-                avg_time = my_stats['time']
-                best_dist = my_stats['best_distance']
-                
-                self.log(f"✅ KẾT QUẢ KIỂM THỬ ({algo_name}):", "green")
-                self.log(f"   • Trung bình quãng đường: {avg_dist:.2f} km", "white")
-                self.log(f"   • Tốt nhất trong 5 lần: {best_dist:.2f} km", "white")
-                self.log(f"   • Thời gian trung bình: {avg_time:.4f} s", "white")
-                
-                # Thêm vào bảng so sánh
-                self.tab_compare.add_result(f"{algo_name} (Avg 10)", avg_dist, avg_time, "10 runs")
-                self.tabs.setCurrentIndex(2)
-            else:
-                self.log("❌ Không có kết quả thống kê.", "red")
+        algo_name = self.bench_thread.algorithms[0]
+        my_stats = stats.get(algo_name)
+        if cancelled:
+            self.log(f"⏹ Đã hủy kiểm thử sau {my_stats['runs'] if my_stats else 0} lần chạy.", "red")
+        if not my_stats:
+            self.log("❌ Không có kết quả thống kê.", "red")
+            return
 
-        except Exception as e:
-            self.log(f"❌ Lỗi kiểm thử: {e}", "red")
-            import traceback
-            print(traceback.format_exc())
+        runs = my_stats['runs']
+        self.log(f"✅ KẾT QUẢ KIỂM THỬ ({algo_name}):", "green")
+        self.log(f"   • Trung bình quãng đường: {my_stats['distance']:.2f} km", "white")
+        self.log(f"   • Tốt nhất trong {runs} lần: {my_stats['best_distance']:.2f} km", "white")
+        self.log(f"   • Thời gian trung bình: {my_stats['time']:.4f} s", "white")
+
+        # Thêm dòng tổng hợp vào bảng so sánh
+        self.tab_compare.add_result(f"{algo_name} (TB {runs} lần)", my_stats['distance'], my_stats['time'],
+                                    f"{runs} runs")
 
     def _get_current_params(self, algo):
         start_id = self.combo_start_city.currentData()
@@ -416,7 +436,7 @@ class MainWindow(QMainWindow):
                 'initial_method': self.hc_method.currentText(),
                 'start_city_id': start_id,
                 'seed': self.hc_seed.value(),
-                'max_no_improve': self.hc_improve.value()
+                'candidate_k': self.hc_candidate_k.value() or None
             }
         else:
             return {
@@ -2,12 +2,15 @@
 
 import time
 import traceback
+from contextlib import nullcontext
 from PyQt5.QtCore import QThread, pyqtSignal
 
 # Import các thuật toán
 from algorithms.hill_climbing_tsp import HillClimbingSolver
 from algorithms.pso_tsp import PSOSolver
+from config.settings import HC_DEFAULT_MOVES
 from models.tour import Tour
+from utils.profiling import SolverProfile
 
 class SolverThread(QThread):
     """
@@ -18,13 +21,17 @@ class SolverThread(QThread):
     # Tín hiệu gửi kết quả về GUI
     result_signal = pyqtSignal(object, list, list, float)
     log_signal = pyqtSignal(str)
+    # Kết quả đo từng pha (SolverProfile.as_dict()), chỉ phát khi profile=True
+    profile_signal = pyqtSignal(dict)
 
-    def __init__(self, algo_name, params, cities, distance_matrix):
+    def __init__(self, algo_name, params, cities, distance_matrix, profile=False, track_allocations=False):
         super().__init__()
         self.algo_name = algo_name
         self.params = params
         self.cities = cities
         self.distance_matrix = distance_matrix
+        self.profile = profile
+        self.track_allocations = track_allocations
 
     def run(self):
         self.log_signal.emit(f"[THREAD] Đang khởi tạo {self.algo_name}...")
@@ -33,6 +40,7 @@ class SolverThread(QThread):
         best_tour = None
         history = []
         solution_log = []
+        profiler = SolverProfile(self.track_allocations) if self.profile else None
         
         try:
             # 1. CHẠY THUẬT TOÁN 
@@ -42,15 +50,19 @@ class SolverThread(QThread):
                 
                 method = self.params.get('initial_method', 'random')
                 seed = self.params.get('seed', 42)
-                no_improve = self.params.get('max_no_improve', 100)
                 start_city_id = self.params.get('start_city_id', None)
+                candidate_k = self.params.get('candidate_k', None)
+                moves = self.params.get('moves', HC_DEFAULT_MOVES)
                 
-                best_tour, history, solution_log, _ = solver.run(
-                    initial_method=method, 
-                    start_city_id=start_city_id,
-                    seed=seed, 
-                    max_no_improve=no_improve
-                )
+                with profiler if profiler is not None else nullcontext():
+                    best_tour, history, solution_log, _ = solver.run(
+                        initial_method=method, 
+                        start_city_id=start_city_id,
+                        seed=seed, 
+                        candidate_k=candidate_k,
+                        moves=moves,
+                        profile=profiler
+                    )
 
             elif "PSO" in self.algo_name:
                 swarm_size = self.params.get('swarm_size', 30)
@@ -62,7 +74,8 @@ class SolverThread(QThread):
                 solver = PSOSolver(self.cities, self.distance_matrix, 
                                    swarm_size, iterations, w, c1, c2)
                 
-                best_tour, best_dist, history = solver.solve()
+                with profiler if profiler is not None else nullcontext():
+                    best_tour, best_dist, history = solver.solve(profile=profiler)
 
                 solution_log = []
                 if history:
@@ -94,6 +107,11 @@ class SolverThread(QThread):
             end_time = time.perf_counter()
             elapsed_time = end_time - start_time
             
+            if profiler is not None:
+                for line in profiler.summary():
+                    self.log_signal.emit(f"[PROFILE] {line}")
+                self.profile_signal.emit(profiler.as_dict())
+
             self.result_signal.emit(best_tour, history, solution_log, elapsed_time)
             
         except Exception as e:
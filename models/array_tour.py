@@ -0,0 +1,74 @@
+
+from typing import Iterable, List
+
+
+class ArrayTour:
+    """
+    Tour dạng mảng dùng cho tìm kiếm cục bộ.
+
+    Lưu thứ tự các chỉ số thành phố (theo ma trận khoảng cách) cùng chỉ mục
+    vị trí city -> position, nên next/prev/between đều O(1) và phép đảo
+    đường đi chỉ tốn O(độ dài đoạn ngắn hơn).
+    """
+
+    def __init__(self, order: Iterable[int]):
+        """
+        Args:
+            order (Iterable[int]): Thứ tự ban đầu, là hoán vị của 0..n-1
+        """
+        self.order: List[int] = [int(c) for c in order]
+        self.pos: List[int] = [0] * len(self.order)
+        for i, c in enumerate(self.order):
+            self.pos[c] = i
+
+    def next(self, c: int) -> int:
+        """Thành phố đứng sau c."""
+        i = self.pos[c] + 1
+        return self.order[0] if i == len(self.order) else self.order[i]
+
+    def prev(self, c: int) -> int:
+        """Thành phố đứng trước c."""
+        return self.order[self.pos[c] - 1]
+
+    def between(self, a: int, b: int, c: int) -> bool:
+        """True nếu b nằm trên đường đi xuôi từ a tới c (tính cả hai đầu)."""
+        pa, pb, pc = self.pos[a], self.pos[b], self.pos[c]
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    def reverse_path(self, a: int, b: int):
+        """
+        Đảo đường đi xuôi từ a tới b.
+
+        Nếu phần bù ngắn hơn thì đảo phần bù: chu trình thu được giống hệt,
+        chỉ ngược chiều, nên người gọi phải hỏi lại next/prev sau khi đảo.
+        """
+        order, pos = self.order, self.pos
+        n = len(order)
+        i, j = pos[a], pos[b]
+        length = (j - i) % n + 1
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+
+        for _ in range(length // 2):
+            ci, cj = order[i], order[j]
+            order[i], order[j] = cj, ci
+            pos[cj], pos[ci] = i, j
+            i += 1
+            if i == n:
+                i = 0
+            j -= 1
+            if j < 0:
+                j = n - 1
+
+    def to_list(self) -> List[int]:
+        """Thứ tự hiện tại của tour."""
+        return list(self.order)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __repr__(self) -> str:
+        return f"ArrayTour(num_cities={len(self.order)})"
@@ -1,10 +1,15 @@
+from collections.abc import Sequence
+from typing import Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
 
 
 class City:
+    # Không có __dict__ riêng cho mỗi thành phố
+    __slots__ = ('id', 'name', 'x', 'y')
 
-    
     def __init__(self, id: int, name: str, latitude: float, longitude: float):
-  
+
         self.id = int(id)
         self.name = str(name)
         self.x = float(longitude)
@@ -19,7 +24,117 @@ class City:
         if isinstance(other, City):
             return self.id == other.id
         return False
-        
+
     def __hash__(self) -> int:
 
-        return hash(self.id)
\ No newline at end of file
+        return hash(self.id)
+
+
+class CityArray(Sequence):
+    """
+    Tập thành phố lưu theo cột (struct-of-arrays): id (int64), tên (chuỗi
+    NumPy), vĩ độ và kinh độ (float64, độ).
+
+    Dùng được ở mọi chỗ nhận List[City]: len(), duyệt và cities[i] trả về
+    City dựng khi cần; cities[slice] hoặc cities[mảng chỉ số] trả về
+    CityArray mới (slice là view, không sao chép). DistanceMatrix,
+    LazyDistanceMatrix, Tour và các hàm dựng tour đọc thẳng các cột.
+    """
+
+    __slots__ = ('ids', 'names', 'lat', 'lon', '_sorter')
+
+    def __init__(self, ids, names, latitudes, longitudes):
+        """
+        Args:
+            ids: Mảng id thành phố
+            names: Mảng tên thành phố
+            latitudes: Mảng vĩ độ (độ)
+            longitudes: Mảng kinh độ (độ)
+
+        Raises:
+            ValueError: Nếu các cột không cùng độ dài
+        """
+        self.ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        self.names = np.asarray(names, dtype=np.str_).reshape(-1)
+        self.lat = np.asarray(latitudes, dtype=np.float64).reshape(-1)
+        self.lon = np.asarray(longitudes, dtype=np.float64).reshape(-1)
+        self._sorter = None
+
+        n = len(self.ids)
+        if not (len(self.names) == len(self.lat) == len(self.lon) == n):
+            raise ValueError(f"Các cột không cùng độ dài: ids={n}, names={len(self.names)}, "
+                             f"lat={len(self.lat)}, lon={len(self.lon)}")
+
+    @classmethod
+    def from_cities(cls, cities: Iterable[City]) -> 'CityArray':
+        """Dựng CityArray từ danh sách City."""
+        if isinstance(cities, CityArray):
+            return cities
+        cities = list(cities)
+        return cls([c.id for c in cities], [c.name for c in cities],
+                   [c.y for c in cities], [c.x for c in cities])
+
+    def to_list(self) -> List[City]:
+        """Danh sách City tương ứng."""
+        return list(self)
+
+    def positions_of(self, ids) -> np.ndarray:
+        """
+        Vị trí (trong mảng này) của các id, tra bằng searchsorted.
+
+        Raises:
+            KeyError: Nếu có id không tồn tại
+        """
+        if self._sorter is None:
+            self._sorter = np.argsort(self.ids, kind='stable')
+        ids = np.asarray(ids, dtype=np.int64)
+        sorted_ids = self.ids[self._sorter]
+        if sorted_ids.size == 0:
+            if ids.size:
+                raise KeyError(int(ids.reshape(-1)[0]))
+            return ids.astype(np.intp)
+
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), sorted_ids.size - 1)
+        missing = sorted_ids[pos] != ids
+        if np.any(missing):
+            raise KeyError(int(ids[missing].reshape(-1)[0]))
+        return self._sorter[pos]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index) -> Union[City, 'CityArray']:
+        if isinstance(index, (int, np.integer)):
+            return City(self.ids[index], self.names[index], self.lat[index], self.lon[index])
+        return CityArray(self.ids[index], self.names[index], self.lat[index], self.lon[index])
+
+    def __iter__(self) -> Iterator[City]:
+        for city_id, name, lat, lon in zip(self.ids.tolist(), self.names.tolist(),
+                                           self.lat.tolist(), self.lon.tolist()):
+            yield City(city_id, name, lat, lon)
+
+    def __getstate__(self):
+        return (self.ids, self.names, self.lat, self.lon)
+
+    def __setstate__(self, state):
+        self.ids, self.names, self.lat, self.lon = state
+        self._sorter = None
+
+    def __repr__(self) -> str:
+        return f"CityArray(num_cities={len(self)})"
+
+
+def city_ids(cities) -> np.ndarray:
+    """Mảng id (int64) của một List[City] hoặc CityArray."""
+    if isinstance(cities, CityArray):
+        return cities.ids
+    return np.fromiter((c.id for c in cities), dtype=np.int64, count=len(cities))
+
+
+def city_coordinates(cities) -> Tuple[np.ndarray, np.ndarray]:
+    """(vĩ độ, kinh độ) tính bằng độ, dạng mảng float64, của một List[City] hoặc CityArray."""
+    if isinstance(cities, CityArray):
+        return cities.lat, cities.lon
+    n = len(cities)
+    return (np.fromiter((c.y for c in cities), dtype=np.float64, count=n),
+            np.fromiter((c.x for c in cities), dtype=np.float64, count=n))
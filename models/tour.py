@@ -1,62 +1,174 @@
 
-from typing import List, TYPE_CHECKING
+from typing import Iterable, List, Optional, TYPE_CHECKING
+
+import numpy as np
+
+from models.city import City, CityArray, city_ids
 
 if TYPE_CHECKING:
-    from models.city import City
-    from utils.distance_matrix import DistanceMatrix 
+    from utils.distance_matrix import DistanceMatrix
 
 
 class Tour:
- 
-    
-    def __init__(self, cities: List['City'], distance_matrix: 'DistanceMatrix'):
+    """
+    Một chu trình qua các thành phố.
+
+    Thứ tự được lưu dưới dạng mảng int32 các chỉ số trong ma trận khoảng cách
+    (`order`); danh sách City (`cities`) chỉ được dựng khi cần và được giữ lại
+    cho tới lần thay đổi kế tiếp. Các phép reverse/swap/move_segment sửa mảng
+    tại chỗ và cập nhật `distance` theo độ chênh lệch, copy() chỉ chép mảng.
+    """
+
+    def __init__(self, cities: List[City], distance_matrix: 'DistanceMatrix',
+                 distance: Optional[float] = None):
         """
-        Khởi tạo một Tour. (Giữ nguyên)
+        Khởi tạo một Tour.
+
+        Args:
+            cities (List[City] | CityArray): Các thành phố theo thứ tự đi
+            distance_matrix (DistanceMatrix): Ma trận khoảng cách
+            distance (float, optional): Độ dài đã biết; nếu None thì được tính lại
         """
-        self.cities: List['City'] = cities[:]
         self.distance_matrix: 'DistanceMatrix' = distance_matrix
-        self.distance: float = self._calculate_total_distance()
+        self.order: np.ndarray = self._to_indices(cities)
+        self._cities: Optional[List[City]] = None if isinstance(cities, CityArray) else list(cities)
+        self.distance: float = self._calculate_total_distance() if distance is None else distance
+
+    @classmethod
+    def from_indices(cls, order: Iterable[int], distance_matrix: 'DistanceMatrix',
+                     distance: Optional[float] = None) -> 'Tour':
+        """
+        Dựng Tour trực tiếp từ thứ tự các chỉ số trong ma trận khoảng cách
+        (không cần danh sách City).
+        """
+        tour = cls.__new__(cls)
+        tour.distance_matrix = distance_matrix
+        tour.order = np.array(order, dtype=np.int32)
+        tour._cities = None
+        tour.distance = tour._calculate_total_distance() if distance is None else distance
+        return tour
+
+    def _to_indices(self, cities: List[City]) -> np.ndarray:
+        matrix_cities = self.distance_matrix.cities
+        if isinstance(cities, CityArray) and isinstance(matrix_cities, CityArray):
+            # Tra cả mảng id một lần thay vì từng thành phố
+            return matrix_cities.positions_of(cities.ids).astype(np.int32)
+        index_of = self.distance_matrix.index_of
+        return np.fromiter(map(index_of, city_ids(cities).tolist()), dtype=np.int32, count=len(cities))
 
     def _calculate_total_distance(self) -> float:
-      
-        if not self.cities:
+
+        if self.order.size == 0:
             return 0.0
 
-        total_distance = 0.0
-        num_cities = len(self.cities)
+        matrix = self.distance_matrix.matrix
+        return float(np.sum(matrix[self.order, np.roll(self.order, -1)], dtype=np.float64))
+
+    @property
+    def cities(self) -> List[City]:
+        """Danh sách City theo thứ tự đi (dựng từ `order` khi cần)."""
+        if self._cities is None:
+            index_cities = self.distance_matrix.cities
+            self._cities = [index_cities[i] for i in self.order.tolist()]
+        return self._cities
+
+    @cities.setter
+    def cities(self, cities: List[City]):
+        self.order = self._to_indices(cities)
+        self._cities = None if isinstance(cities, CityArray) else list(cities)
+        self.distance = self._calculate_total_distance()
+
+    def _d(self, a: int, b: int) -> float:
+        return self.distance_matrix.matrix.item(a, b)
 
-        for i in range(num_cities):
-            city_a = self.cities[i]
-            city_b = self.cities[i - 1] if i > 0 else self.cities[-1]
-            total_distance += self.distance_matrix.get_distance(city_a.id, city_b.id)
-            
-        return total_distance
+    def reverse(self, i: int, k: int):
+        """
+        Đảo đoạn order[i..k] (0 <= i <= k < n), tức nước 2-opt bỏ hai cạnh
+        ở hai đầu đoạn; độ dài được cập nhật O(1).
+        """
+        order = self.order
+        n = len(order)
+        if k - i + 1 < n - 1:
+            a, b = int(order[i - 1]), int(order[i])
+            c, e = int(order[k]), int(order[(k + 1) % n])
+            self.distance += self._d(a, c) + self._d(b, e) - self._d(a, b) - self._d(c, e)
+        order[i:k + 1] = order[i:k + 1][::-1]
+        self._cities = None
+
+    def swap(self, i: int, j: int):
+        """Đổi chỗ hai thành phố ở vị trí i và j; độ dài được cập nhật O(1)."""
+        if i == j:
+            return
+        order = self.order
+        n = len(order)
+        # Các cạnh (p, p+1) bị ảnh hưởng, tính một lần kể cả khi i, j kề nhau
+        edges = {(i - 1) % n, i, (j - 1) % n, j}
+
+        def edges_length():
+            return sum(self._d(int(order[p]), int(order[(p + 1) % n])) for p in edges)
+
+        before = edges_length()
+        order[i], order[j] = order[j], order[i]
+        self.distance += edges_length() - before
+        self._cities = None
+
+    def move_segment(self, i: int, k: int, j: int, reverse: bool = False):
+        """
+        Chuyển đoạn order[i..k] (0 <= i <= k < n) tới ngay sau thành phố ở vị trí j
+        (j nằm ngoài đoạn), tùy chọn đảo chiều đoạn (nước Or-opt).
+        Độ dài được cập nhật O(1), mảng được dựng lại bằng các phép chép khối.
+        """
+        order = self.order
+        n = len(order)
+        if i <= j <= k:
+            raise ValueError(f"Vị trí chèn {j} nằm trong đoạn [{i}, {k}]")
+        if (j + 1) % n == i or k - i + 1 >= n - 1:
+            # Chèn về đúng chỗ cũ (hoặc đoạn gần như cả tour): chỉ có thể là đảo đoạn
+            if reverse:
+                self.reverse(i, k)
+            return
+
+        a, b = int(order[i - 1]), int(order[i])
+        c, e = int(order[k]), int(order[(k + 1) % n])
+        p, q = int(order[j]), int(order[(j + 1) % n])
+        first, last = (c, b) if reverse else (b, c)
+        self.distance += (self._d(a, e) + self._d(p, first) + self._d(last, q)
+                          - self._d(a, b) - self._d(c, e) - self._d(p, q))
+
+        segment = order[i:k + 1][::-1] if reverse else order[i:k + 1]
+        rest = np.concatenate((order[:i], order[k + 1:]))
+        at = j + 1 if j < i else j - (k - i + 1) + 1
+        self.order = np.concatenate((rest[:at], segment, rest[at:]))
+        self._cities = None
 
     def copy(self) -> 'Tour':
-      
-        new_tour = Tour(self.cities, self.distance_matrix)
-        new_tour.distance = self.distance 
+        """Bản sao O(n): chỉ chép mảng thứ tự, không tính lại độ dài."""
+        new_tour = Tour.__new__(Tour)
+        new_tour.distance_matrix = self.distance_matrix
+        new_tour.order = self.order.copy()
+        new_tour._cities = None
+        new_tour.distance = self.distance
         return new_tour
 
     def __len__(self) -> int:
 
-        return len(self.cities)
+        return len(self.order)
 
-    def __getitem__(self, index: int) -> 'City':
+    def __getitem__(self, index: int) -> City:
 
-        return self.cities[index]
+        return self.distance_matrix.cities[int(self.order[index])]
 
     def __repr__(self) -> str:
-   
+
         # Kiểm tra xem city có thuộc tính 'name' không, nếu không thì dùng 'id'
         def get_city_display(city):
             if hasattr(city, 'name') and city.name:
                 return city.name
             return str(city.id)
 
-
-        path_preview = " -> ".join(get_city_display(city) for city in self.cities[:5])
-        if len(self.cities) > 5:
+        index_cities = self.distance_matrix.cities
+        path_preview = " -> ".join(get_city_display(index_cities[i]) for i in self.order[:5].tolist())
+        if len(self.order) > 5:
             path_preview += "..."
-            
-        return f"Tour(distance={self.distance:.2f}, path=[{path_preview}])"
\ No newline at end of file
+
+        return f"Tour(distance={self.distance:.2f}, path=[{path_preview}])"
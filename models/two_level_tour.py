@@ -0,0 +1,244 @@
+import math
+from typing import Iterable, List, Optional
+
+from models.array_tour import ArrayTour
+
+
+# Từ số thành phố này trở lên, make_search_tour() dùng TwoLevelTour thay cho ArrayTour
+TWO_LEVEL_MIN_CITIES = 20_000
+
+
+class _Segment:
+    """Một đoạn liên tiếp của tour: danh sách thành phố kèm bit đảo chiều và thứ hạng."""
+
+    __slots__ = ('cities', 'reversed', 'rank')
+
+    def __init__(self, cities: List[int], rank: int):
+        self.cities = cities
+        self.reversed = False
+        self.rank = rank
+
+    def sequence(self) -> List[int]:
+        """Các thành phố của đoạn theo chiều đi của tour."""
+        return self.cities[::-1] if self.reversed else list(self.cities)
+
+
+class TwoLevelTour:
+    """
+    Tour dạng danh sách hai cấp dùng cho tìm kiếm cục bộ trên bộ dữ liệu lớn.
+
+    Tour được chia thành khoảng sqrt(n) đoạn liên tiếp. Mỗi đoạn lưu danh sách
+    thành phố, bit đảo chiều và thứ hạng của nó trong tour; mỗi thành phố biết
+    đoạn chứa nó và vị trí trong đoạn. Vì vậy next/prev/between là O(1), còn
+    reverse_path chỉ tách tối đa hai đoạn ở hai đầu, đảo thứ tự và lật bit của
+    các đoạn nằm giữa, rồi gộp các đoạn nhỏ ở biên: O(sqrt(n)) thay vì O(n).
+    Khi số đoạn tăng quá gấp đôi ban đầu, các đoạn được chia lại từ đầu.
+
+    Giao diện giống ArrayTour (next, prev, between, reverse_path, to_list)
+    nên các engine 2-opt/Or-opt/LK dùng được cả hai.
+    """
+
+    def __init__(self, order: Iterable[int], group_size: Optional[int] = None):
+        """
+        Args:
+            order (Iterable[int]): Thứ tự ban đầu, là hoán vị của 0..n-1
+            group_size (int, optional): Kích thước đoạn tối đa (mặc định ~sqrt(n))
+        """
+        order = [int(c) for c in order]
+        n = len(order)
+        self.group_size = group_size or max(8, math.isqrt(n))
+        self._seg: List[Optional[_Segment]] = [None] * n
+        self._idx: List[int] = [0] * n
+        self._build(order)
+
+    def _build(self, order: List[int]):
+        """Chia tour thành các đoạn group_size thành phố."""
+        g = self.group_size
+        self._segments: List[_Segment] = []
+        for start in range(0, len(order), g):
+            self._segments.append(self._new_segment(order[start:start + g], len(self._segments)))
+        self._max_segments = 2 * len(self._segments) + 4
+
+    def _new_segment(self, cities: List[int], rank: int) -> _Segment:
+        segment = _Segment(cities, rank)
+        seg, idx = self._seg, self._idx
+        for i, c in enumerate(cities):
+            seg[c] = segment
+            idx[c] = i
+        return segment
+
+    def _renumber(self, start: int):
+        """Cập nhật thứ hạng các đoạn từ vị trí start trở đi."""
+        segments = self._segments
+        for r in range(start, len(segments)):
+            segments[r].rank = r
+
+    def _offset(self, c: int) -> int:
+        """Vị trí của c trong đoạn chứa nó, tính theo chiều đi của tour."""
+        segment = self._seg[c]
+        i = self._idx[c]
+        return len(segment.cities) - 1 - i if segment.reversed else i
+
+    def next(self, c: int) -> int:
+        """Thành phố đứng sau c."""
+        segment = self._seg[c]
+        i = self._idx[c]
+        if segment.reversed:
+            if i > 0:
+                return segment.cities[i - 1]
+        elif i + 1 < len(segment.cities):
+            return segment.cities[i + 1]
+        segments = self._segments
+        following = segments[segment.rank + 1] if segment.rank + 1 < len(segments) else segments[0]
+        return following.cities[-1] if following.reversed else following.cities[0]
+
+    def prev(self, c: int) -> int:
+        """Thành phố đứng trước c."""
+        segment = self._seg[c]
+        i = self._idx[c]
+        if segment.reversed:
+            if i + 1 < len(segment.cities):
+                return segment.cities[i + 1]
+        elif i > 0:
+            return segment.cities[i - 1]
+        preceding = self._segments[segment.rank - 1]
+        return preceding.cities[0] if preceding.reversed else preceding.cities[-1]
+
+    def between(self, a: int, b: int, c: int) -> bool:
+        """True nếu b nằm trên đường đi xuôi từ a tới c (tính cả hai đầu)."""
+        pa = (self._seg[a].rank, self._offset(a))
+        pb = (self._seg[b].rank, self._offset(b))
+        pc = (self._seg[c].rank, self._offset(c))
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    def reverse_path(self, a: int, b: int):
+        """
+        Đảo đường đi xuôi từ a tới b.
+
+        Như ArrayTour: nếu phần bù đi qua ít đoạn hơn thì đảo phần bù (cùng chu
+        trình, ngược chiều), nên người gọi phải hỏi lại next/prev sau khi đảo.
+        """
+        if a == b or self.next(b) == a:
+            return
+
+        seg = self._seg
+        if seg[a] is seg[b] and self._offset(a) <= self._offset(b):
+            self._reverse_inside(seg[a], self._offset(a), self._offset(b))
+            return
+
+        m = len(self._segments)
+        span = m + 1 if seg[a] is seg[b] else (seg[b].rank - seg[a].rank) % m + 1
+        if 2 * span > m + 2:
+            a, b = self.next(b), self.prev(a)
+            if seg[a] is seg[b]:
+                self._reverse_inside(seg[a], self._offset(a), self._offset(b))
+                return
+
+        # Tách để a mở đầu một đoạn và b kết thúc một đoạn
+        if self._offset(a) > 0:
+            self._split(seg[a], self._offset(a))
+        if self._offset(b) < len(seg[b].cities) - 1:
+            self._split(seg[b], self._offset(b) + 1)
+
+        # Đảo thứ tự và lật chiều các đoạn từ seg[a] tới seg[b] (có thể vòng qua cuối)
+        segments = self._segments
+        m = len(segments)
+        first, last = seg[a].rank, seg[b].rank
+        ranks = [(first + t) % m for t in range(((last - first) % m) + 1)]
+        chosen = [segments[r] for r in reversed(ranks)]
+        for r, segment in zip(ranks, chosen):
+            segments[r] = segment
+            segment.rank = r
+            segment.reversed = not segment.reversed
+
+        # Gộp các đoạn nhỏ ở hai biên vừa đổi
+        for left in (segments[last], segments[first - 1]):
+            if left.rank < len(segments) and segments[left.rank] is left:
+                self._try_merge(left)
+
+        if len(segments) > self._max_segments:
+            self._build(self.to_list())
+
+    def _reverse_inside(self, segment: _Segment, start: int, stop: int):
+        """Đảo đoạn con [start, stop] (theo chiều tour) nằm gọn trong một đoạn."""
+        cities = segment.cities
+        if segment.reversed:
+            start, stop = len(cities) - 1 - stop, len(cities) - 1 - start
+        cities[start:stop + 1] = cities[start:stop + 1][::-1]
+        idx = self._idx
+        for i in range(start, stop + 1):
+            idx[cities[i]] = i
+
+    def _split(self, segment: _Segment, offset: int) -> _Segment:
+        """
+        Tách đoạn tại vị trí offset (theo chiều tour): segment giữ phần trước,
+        phần từ offset trở đi thành đoạn mới đứng ngay sau nó.
+        """
+        cities = segment.cities
+        if segment.reversed:
+            cut = len(cities) - offset
+            tail, segment.cities = cities[:cut], cities[cut:]
+            idx = self._idx
+            for i, c in enumerate(segment.cities):
+                idx[c] = i
+        else:
+            tail = cities[offset:]
+            del cities[offset:]
+
+        rank = segment.rank + 1
+        new_segment = self._new_segment(tail, rank)
+        new_segment.reversed = segment.reversed
+        self._segments.insert(rank, new_segment)
+        self._renumber(rank)
+        return new_segment
+
+    def _try_merge(self, left: _Segment):
+        """Gộp đoạn left với đoạn ngay sau nó nếu tổng không vượt group_size."""
+        segments = self._segments
+        rank = left.rank
+        if rank + 1 >= len(segments):
+            return
+        right = segments[rank + 1]
+        if len(left.cities) + len(right.cities) > self.group_size:
+            return
+
+        merged = left.sequence() + right.sequence()
+        left.cities = merged
+        left.reversed = False
+        seg, idx = self._seg, self._idx
+        for i, c in enumerate(merged):
+            seg[c] = left
+            idx[c] = i
+        del segments[rank + 1]
+        self._renumber(rank + 1)
+
+    def to_list(self) -> List[int]:
+        """Thứ tự hiện tại của tour."""
+        order: List[int] = []
+        for segment in self._segments:
+            order.extend(reversed(segment.cities) if segment.reversed else segment.cities)
+        return order
+
+    def __len__(self) -> int:
+        return len(self._idx)
+
+    def __repr__(self) -> str:
+        return f"TwoLevelTour(num_cities={len(self)}, segments={len(self._segments)})"
+
+
+def make_search_tour(order: Iterable[int], two_level_min: Optional[int] = None):
+    """
+    Chọn cách biểu diễn tour cho tìm kiếm cục bộ theo kích thước: ArrayTour
+    (đảo O(n), hằng số nhỏ) hoặc TwoLevelTour (đảo O(sqrt(n))) khi n >= two_level_min.
+
+    Args:
+        order (Iterable[int]): Thứ tự ban đầu, là hoán vị của 0..n-1
+        two_level_min (int, optional): Ngưỡng số thành phố (mặc định TWO_LEVEL_MIN_CITIES)
+    """
+    order = [int(c) for c in order]
+    threshold = TWO_LEVEL_MIN_CITIES if two_level_min is None else two_level_min
+    if len(order) >= threshold:
+        return TwoLevelTour(order)
+    return ArrayTour(order)
@@ -0,0 +1,20 @@
+import os
+import random
+import sys
+
+import pytest
+
+# Cho phép chạy `pytest` từ thư mục gốc mà không cần cài đặt gói
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.city import City
+
+
+@pytest.fixture
+def random_cities():
+    """Sinh n thành phố ngẫu nhiên (tọa độ trong vùng Việt Nam), tái tạo được theo seed."""
+    def make(n, seed=0):
+        rng = random.Random(seed)
+        return [City(id=1000 + i, name=f"C{i}", latitude=rng.uniform(8.5, 23.0),
+                     longitude=rng.uniform(102.0, 109.5)) for i in range(n)]
+    return make
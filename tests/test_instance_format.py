@@ -0,0 +1,86 @@
+import struct
+
+import numpy as np
+import pytest
+
+from models.city import City
+from utils import instance_format
+from utils.data_loader import DataLoader
+from utils.distance_matrix import DistanceMatrix, instance_hash
+
+
+@pytest.fixture
+def cities(random_cities):
+    cities = random_cities(40, seed=5)
+    # Tên có dấu và độ dài khác nhau
+    cities[0] = City(id=7, name="Thành phố Hồ Chí Minh", latitude=10.8231, longitude=106.6297)
+    cities[1] = City(id=-3, name="Huế", latitude=16.4637, longitude=107.5909)
+    return cities
+
+
+def test_save_load_binary_round_trip(tmp_path, cities):
+    path = str(tmp_path / f"cities{instance_format.FILE_EXTENSION}")
+    DataLoader.save_binary(cities, path)
+
+    assert DataLoader.detect_format(path) == 'binary'
+    loaded = DataLoader.load_binary(path)
+    assert len(loaded) == len(cities)
+    assert [(c.id, c.name, c.y, c.x) for c in loaded] == \
+           [(c.id, c.name, c.y, c.x) for c in cities]
+    assert instance_hash(loaded) == instance_hash(cities)
+    assert DataLoader.load_city_array(path)[1].name == "Huế"
+    assert [record[1] for record in DataLoader.iter_cities(path)][:2] == ["Thành phố Hồ Chí Minh", "Huế"]
+
+    header = instance_format.read_header(path)
+    assert header['num_cities'] == len(cities)
+    assert set(header['blocks']) == {'ids', 'lat', 'lon', 'names'}
+    assert all(block['offset'] % instance_format.BLOCK_ALIGNMENT == 0 for block in header['blocks'].values())
+
+
+def test_round_trip_with_matrix_and_candidates(tmp_path, cities):
+    path = str(tmp_path / "with_matrix.tspbin")
+    dm = DistanceMatrix(cities)
+    DataLoader.save_binary(cities, path, distance_matrix=dm, candidate_k=5)
+
+    loaded = DataLoader.load_binary_distance_matrix(path)
+    assert isinstance(loaded, DistanceMatrix)
+    assert isinstance(loaded.matrix, np.memmap) or isinstance(loaded.matrix.base, np.memmap)
+    np.testing.assert_array_equal(loaded.matrix, dm.matrix)
+    np.testing.assert_array_equal(loaded.get_candidate_lists(5), dm.get_candidate_lists(5))
+    assert loaded.get_distance(7, -3) == pytest.approx(dm.get_distance(7, -3))
+
+
+def test_distance_matrix_is_built_when_not_stored(tmp_path, cities):
+    path = str(tmp_path / "plain.tspbin")
+    DataLoader.save_binary(cities, path)
+    loaded = DataLoader.load_binary_distance_matrix(path)
+    np.testing.assert_allclose(loaded.matrix, DistanceMatrix(cities).matrix)
+
+
+def test_write_rejects_wrong_shapes(tmp_path, cities):
+    path = str(tmp_path / "bad.tspbin")
+    with pytest.raises(ValueError):
+        instance_format.write_instance(path, cities, matrix=np.zeros((3, 3)))
+    with pytest.raises(ValueError):
+        instance_format.write_instance(path, cities, candidates=np.zeros((3, 2), dtype=np.int32))
+
+
+def test_read_rejects_invalid_files(tmp_path, cities):
+    path = tmp_path / "cities.tspbin"
+    DataLoader.save_binary(cities, str(path))
+    data = path.read_bytes()
+
+    not_binary = tmp_path / "not_binary.tspbin"
+    not_binary.write_bytes(b"NOTATSP!" + data[8:])
+    with pytest.raises(ValueError):
+        instance_format.read_header(str(not_binary))
+
+    newer = tmp_path / "newer.tspbin"
+    newer.write_bytes(struct.pack('<8sI', instance_format.MAGIC, instance_format.FORMAT_VERSION + 1) + data[12:])
+    with pytest.raises(ValueError):
+        instance_format.read_header(str(newer))
+
+    truncated = tmp_path / "truncated.tspbin"
+    truncated.write_bytes(data[:len(data) // 2])
+    with pytest.raises(ValueError):
+        instance_format.read_instance(str(truncated))
@@ -0,0 +1,16 @@
+import numpy as np
+
+from comparison import performance_analyzer
+from comparison.performance_analyzer import _run_seed
+
+
+def test_run_seed_depends_only_on_run_and_algorithm(monkeypatch):
+    root = np.random.SeedSequence(1234)
+    seeds = {(i, name): _run_seed(root, i, name)
+             for i in range(5) for name in performance_analyzer.ALGORITHMS}
+    assert len(set(seeds.values())) == len(seeds)
+
+    # Thêm một thuật toán vào cuối không làm đổi seed của các cặp (lần chạy, thuật toán) cũ
+    monkeypatch.setattr(performance_analyzer, "ALGORITHMS", performance_analyzer.ALGORITHMS + ("New",))
+    assert all(_run_seed(root, i, name) == seed for (i, name), seed in seeds.items())
+    assert _run_seed(np.random.SeedSequence(1234), 3, "PSO") == seeds[(3, "PSO")]
@@ -0,0 +1,73 @@
+import datetime
+
+import pytest
+
+from comparison.run_history import RunHistory, params_hash
+
+
+@pytest.fixture
+def history_path(tmp_path):
+    path = str(tmp_path / "history" / "runs.sqlite3")
+    runs = [
+        ("Hill Climbing", "aaa", {"initial_method": "nn", "candidate_k": 8}, 100.0, 0.5),
+        ("Hill Climbing", "aaa", {"candidate_k": 8, "initial_method": "nn"}, 90.0, 0.7),
+        ("Hill Climbing", "bbb", {"initial_method": "random", "candidate_k": 8}, 300.0, 1.0),
+        ("PSO", "aaa", {"swarm_size": 30}, 120.0, 2.0),
+    ]
+    for algorithm, instance, params, distance, time in runs:
+        RunHistory.save_run({"algorithm": algorithm, "instance_hash": instance, "params": params,
+                             "distance": distance, "time": time}, path=path)
+    return path
+
+
+def test_params_hash_ignores_key_order():
+    assert params_hash({"a": 1, "b": 2}) == params_hash({"b": 2, "a": 1})
+    assert params_hash({"a": 1}) != params_hash({"a": 2})
+    assert params_hash(None) is None
+
+
+def test_save_and_load_keep_order_and_records(history_path):
+    records = RunHistory.load_history(history_path)
+    assert [r["distance"] for r in records] == [100.0, 90.0, 300.0, 120.0]
+    assert all("timestamp" in r for r in records)
+    assert records[0]["params"] == {"initial_method": "nn", "candidate_k": 8}
+
+
+def test_query_filters(history_path):
+    query = RunHistory.query
+    assert len(query(algorithm="Hill Climbing", path=history_path)) == 3
+    assert [r["distance"] for r in query(instance_hash="aaa", algorithm="Hill Climbing", path=history_path)] == [100.0, 90.0]
+    # Bộ tham số được so khớp không phụ thuộc thứ tự khóa
+    same_params = query(params={"candidate_k": 8, "initial_method": "nn"}, path=history_path)
+    assert [r["distance"] for r in same_params] == [100.0, 90.0]
+    assert [r["distance"] for r in query(limit=2, newest_first=True, path=history_path)] == [120.0, 300.0]
+    assert query(algorithm="Lin-Kernighan", path=history_path) == []
+
+
+def test_query_time_range(history_path):
+    middle = datetime.datetime.now()
+    RunHistory.save_run({"algorithm": "PSO", "distance": 110.0, "time": 1.0}, path=history_path)
+    assert [r["distance"] for r in RunHistory.query(since=middle, path=history_path)] == [110.0]
+    assert len(RunHistory.query(until=middle, path=history_path)) == 4
+    assert len(RunHistory.query(since=middle.isoformat(), algorithm="Hill Climbing", path=history_path)) == 0
+
+
+def test_aggregate(history_path):
+    by_algorithm = RunHistory.aggregate(path=history_path)
+    assert [row["algorithm"] for row in by_algorithm] == ["Hill Climbing", "PSO"]
+    hc = by_algorithm[0]
+    assert hc["runs"] == 3
+    assert hc["distance"] == pytest.approx((100.0 + 90.0 + 300.0) / 3)
+    assert (hc["best_distance"], hc["worst_distance"]) == (90.0, 300.0)
+    assert hc["time"] == pytest.approx((0.5 + 0.7 + 1.0) / 3)
+
+    groups = RunHistory.aggregate(group_by=("instance_hash", "params_hash"), algorithm="Hill Climbing",
+                                  path=history_path)
+    assert sorted(row["runs"] for row in groups) == [1, 2]
+
+    total = RunHistory.aggregate(group_by=(), path=history_path)
+    assert len(total) == 1 and total[0]["runs"] == 4
+    assert RunHistory.aggregate(algorithm="Lin-Kernighan", group_by=(), path=history_path) == []
+
+    with pytest.raises(ValueError):
+        RunHistory.aggregate(group_by=("distance",), path=history_path)
@@ -0,0 +1,92 @@
+import random
+
+import numpy as np
+import pytest
+
+from models.city import city_coordinates
+from utils.distance_matrix import DistanceMatrix
+from utils.spatial_index import SpatialIndex
+
+
+def build(cities, **kwargs):
+    lat, lon = city_coordinates(cities)
+    return SpatialIndex(lat, lon, **kwargs)
+
+
+@pytest.mark.parametrize("n, k", [(30, 5), (500, 8), (500, 1), (40, 39)])
+def test_k_nearest_all_matches_dense_candidate_lists(random_cities, n, k):
+    cities = random_cities(n, seed=n + k)
+    dm = DistanceMatrix(cities)
+    expected = dm.get_candidate_lists(k)
+    result = build(cities).k_nearest_all(k)
+
+    assert result.shape == expected.shape == (n, k)
+    assert result.dtype == np.int32
+    assert not (result == np.arange(n)[:, np.newaxis]).any()
+    # So theo khoảng cách (không phụ thuộc cách phá hòa), rồi theo tập chỉ số
+    rows = np.arange(n)[:, np.newaxis]
+    np.testing.assert_allclose(dm.matrix[rows, result], dm.matrix[rows, expected])
+    assert (np.sort(result, axis=1) == np.sort(expected, axis=1)).all()
+
+
+def test_k_nearest_all_ignores_removed_points(random_cities):
+    cities = random_cities(200, seed=3)
+    index = build(cities)
+    expected = index.k_nearest_all(6)
+    for i in range(0, 200, 3):
+        index.remove(i)
+    assert (index.k_nearest_all(6) == expected).all()
+
+
+def test_nearest_after_removals_matches_brute_force(random_cities):
+    n = 300
+    cities = random_cities(n, seed=7)
+    dm = DistanceMatrix(cities)
+    index = build(cities)
+    rng = random.Random(7)
+    alive = set(range(n))
+
+    for i in rng.sample(range(n), 250):
+        index.remove(i)
+        alive.discard(i)
+        index.remove(i)  # xóa lần hai không làm gì
+        q = rng.randrange(n)
+        others = alive - {q}
+        got = index.nearest(q)
+        if not others:
+            assert got is None
+            continue
+        assert got in others
+        assert dm.matrix[q, got] == pytest.approx(min(dm.matrix[q, j] for j in others))
+
+        odd = {j for j in others if j % 2}
+        got = index.nearest(q, accept=lambda j: j % 2 == 1)
+        if odd:
+            assert dm.matrix[q, got] == pytest.approx(min(dm.matrix[q, j] for j in odd))
+        else:
+            assert got is None
+    assert index.num_alive == len(alive)
+
+
+def test_copy_has_independent_removals(random_cities):
+    cities = random_cities(50, seed=1)
+    index = build(cities)
+    subset = index.copy(active=range(10))
+    assert subset.num_alive == 10 and index.num_alive == 50
+    subset.remove(0)
+    assert subset.num_alive == 9 and index.num_alive == 50
+    assert subset.nearest(20) in range(1, 10)
+
+
+def test_get_nearest_city_agrees_between_scan_and_index(random_cities):
+    cities = random_cities(400, seed=11)
+    dm = DistanceMatrix(cities)
+    ids = [c.id for c in cities]
+    start = ids[0]
+    # Tập lớn: tìm qua chỉ mục; tập nhỏ: quét trực tiếp. Cả hai đều không trả về chính nó.
+    large = set(ids)
+    nearest = dm.get_nearest_city(start, large)
+    small = {start, nearest, ids[5], ids[9]}
+    assert nearest != start
+    assert dm.get_nearest_city(start, small) == nearest
+    assert dm.get_nearest_city(start, {start}) is None
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from models.array_tour import ArrayTour
+from models.two_level_tour import TwoLevelTour
+
+
+def canonical_cycle(order):
+    """Chu trình không định hướng: bắt đầu từ 0, chọn chiều có láng giềng thứ hai nhỏ hơn."""
+    i = order.index(0)
+    forward = order[i:] + order[:i]
+    backward = [forward[0]] + forward[:0:-1]
+    return min(forward, backward)
+
+
+def assert_consistent(tour, n):
+    """next/prev/between khớp với to_list() của chính tour."""
+    order = tour.to_list()
+    assert sorted(order) == list(range(n))
+    for p, c in enumerate(order):
+        assert tour.next(c) == order[(p + 1) % n]
+        assert tour.prev(c) == order[p - 1]
+    a, c = order[3], order[n // 2]
+    for b in order:
+        assert tour.between(a, b, c) == (3 <= order.index(b) <= n // 2)
+
+
+@pytest.mark.parametrize("n, group_size, seed", [(10, 8, 0), (257, 8, 1), (400, 16, 2)])
+def test_matches_array_tour_under_random_reversals(n, group_size, seed):
+    rng = random.Random(seed)
+    order = list(range(n))
+    rng.shuffle(order)
+    reference = ArrayTour(order)
+    tour = TwoLevelTour(order, group_size=group_size)
+
+    for step in range(600):
+        a, b = rng.sample(range(n), 2)
+        # Hai cách biểu diễn có thể ngược chiều nhau sau khi đảo phần bù: đường đi
+        # xuôi a -> b của bản tham chiếu là đường đi xuôi b -> a của bản kia
+        if tour.next(a) == reference.next(a):
+            tour.reverse_path(a, b)
+        else:
+            tour.reverse_path(b, a)
+        reference.reverse_path(a, b)
+        assert canonical_cycle(tour.to_list()) == canonical_cycle(reference.to_list()), step
+
+        if step % 100 == 0:
+            assert_consistent(tour, n)
+    assert_consistent(tour, n)
+
+
+def test_reverse_path_degenerate_cases():
+    tour = TwoLevelTour(range(50), group_size=8)
+    tour.reverse_path(7, 7)
+    assert tour.to_list() == list(range(50))
+    # Đường đi xuôi 10 -> 9 là cả chu trình: không đổi gì
+    tour.reverse_path(10, 9)
+    assert canonical_cycle(tour.to_list()) == list(range(50))
+    # Đảo trong một đoạn
+    tour.reverse_path(1, 3)
+    assert canonical_cycle(tour.to_list())[:5] == [0, 3, 2, 1, 4]
@@ -1,47 +1,309 @@
+import csv
 import json
-from typing import List, Dict, Tuple
-from models.city import City
+import os
+import re
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from models.city import City, CityArray
+from utils import instance_format
+from utils.distance_matrix import DistanceMatrix
+from utils.lazy_distance_matrix import DEFAULT_DENSE_LIMIT, make_distance_matrix
+
+
+# Số ký tự đọc mỗi lần khi phân tích file JSON theo luồng
+_JSON_CHUNK_CHARS = 1 << 20
+
+# Vị trí mảng thành phố trong file JSON: {"locations": [...]} hoặc mảng ở gốc
+_JSON_ARRAY_START = re.compile(r'"locations"\s*:\s*\[|^\s*\[')
+
+# Tên cột được chấp nhận trong file CSV
+_CSV_COLUMNS = {
+    'id': ('id',),
+    'name': ('name',),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lon', 'lng'),
+}
+
+# Định dạng theo phần mở rộng của file
+_FORMATS = {'.json': 'json', '.csv': 'csv', '.tsp': 'tsplib', instance_format.FILE_EXTENSION: 'binary'}
+
+# Một bản ghi thành phố: (id, tên, vĩ độ, kinh độ)
+CityRecord = Tuple[int, str, float, float]
+
+
+def _json_record(location: dict) -> CityRecord:
+    return (int(location['id']), str(location['name']),
+            float(location['latitude']), float(location['longitude']))
+
+
+def _iter_json_records(file) -> Iterator[CityRecord]:
+    """
+    Đọc lần lượt các phần tử của mảng "locations" (hoặc mảng ở gốc) mà
+    không nạp cả file: mỗi lần chỉ giữ khoảng một khối _JSON_CHUNK_CHARS ký tự.
+
+    Các phần tử trọn vẹn trong khối được giải mã cùng lúc bằng json.loads (tới
+    dấu '}' cuối cùng của khối); nếu chỗ cắt đó không phải ranh giới phần tử
+    (ví dụ '}' nằm trong chuỗi) thì giải mã từng phần tử bằng raw_decode.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(_JSON_CHUNK_CHARS)
+    while True:
+        match = _JSON_ARRAY_START.search(buffer)
+        if match:
+            pos = match.end()
+            break
+        more = file.read(_JSON_CHUNK_CHARS)
+        if not more:
+            return
+        buffer += more
+
+    # Trước vị trí này không thử giải mã cả khối nữa (lần thử trước đã thất bại)
+    no_batch_until = pos
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        locations = None
+        cut = buffer.rfind('}', pos) + 1
+        if cut > max(pos, no_batch_until):
+            try:
+                locations = json.loads('[' + buffer[pos:cut] + ']')
+                pos = cut
+            except json.JSONDecodeError:
+                no_batch_until = cut
+        if locations is None:
+            try:
+                if pos == len(buffer):
+                    raise json.JSONDecodeError("Cần thêm dữ liệu", buffer, pos)
+                location, pos = decoder.raw_decode(buffer, pos)
+                locations = (location,)
+            except json.JSONDecodeError:
+                # Phần tử bị cắt ở cuối khối: đọc thêm rồi giải mã lại
+                more = file.read(_JSON_CHUNK_CHARS)
+                if not more:
+                    raise ValueError(f"File JSON không hợp lệ hoặc bị cắt cụt gần ký tự {pos}")
+                no_batch_until -= pos
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+
+        for location in locations:
+            yield _json_record(location)
+        if pos >= _JSON_CHUNK_CHARS:
+            no_batch_until -= pos
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def _iter_csv_records(file) -> Iterator[CityRecord]:
+    """
+    Đọc từng dòng CSV có header. Cần cột vĩ độ/kinh độ; thiếu cột id thì
+    dùng số thứ tự dòng, thiếu cột name thì dùng id làm tên.
+    """
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [column.strip().lower() for column in header]
+    columns = {}
+    for field, aliases in _CSV_COLUMNS.items():
+        columns[field] = next((header.index(a) for a in aliases if a in header), None)
+    if columns['latitude'] is None or columns['longitude'] is None:
+        raise ValueError(f"File CSV thiếu cột vĩ độ/kinh độ (header: {header})")
+
+    id_col, name_col = columns['id'], columns['name']
+    lat_col, lon_col = columns['latitude'], columns['longitude']
+    row_number = 0
+    for row in reader:
+        if not row:
+            continue
+        city_id = int(row[id_col]) if id_col is not None else row_number
+        name = row[name_col] if name_col is not None else str(city_id)
+        row_number += 1
+        yield city_id, name, float(row[lat_col]), float(row[lon_col])
+
+
+def _tsplib_geo_degrees(value: float) -> float:
+    """Tọa độ GEO của TSPLIB (DDD.MM, độ và phút) sang độ thập phân."""
+    degrees = int(value)
+    return degrees + 5.0 * (value - degrees) / 3.0
+
+
+def _iter_tsplib_records(file) -> Iterator[CityRecord]:
+    """
+    Đọc NODE_COORD_SECTION của file TSPLIB .tsp. Chỉ hỗ trợ EDGE_WEIGHT_TYPE
+    GEO (tọa độ địa lý "id vĩ_độ kinh_độ" dạng DDD.MM), vì khoảng cách được
+    tính bằng haversine.
+    """
+    edge_weight_type = None
+    for line in file:
+        line = line.strip()
+        if line.startswith('NODE_COORD_SECTION'):
+            break
+        if ':' in line:
+            key, value = (part.strip() for part in line.split(':', 1))
+            if key.upper() == 'EDGE_WEIGHT_TYPE':
+                edge_weight_type = value.upper()
+    else:
+        return
+
+    if edge_weight_type != 'GEO':
+        raise ValueError(f"EDGE_WEIGHT_TYPE không hỗ trợ: {edge_weight_type} (chỉ hỗ trợ GEO)")
+
+    for line in file:
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == 'EOF' or not fields[0].lstrip('-').isdigit():
+            break
+        city_id = int(fields[0])
+        yield (city_id, str(city_id),
+               _tsplib_geo_degrees(float(fields[1])), _tsplib_geo_degrees(float(fields[2])))
+
+
+_READERS = {'json': _iter_json_records, 'csv': _iter_csv_records, 'tsplib': _iter_tsplib_records}
 
 
 class DataLoader:
   
     
+    @staticmethod
+    def detect_format(filepath: str) -> str:
+        """
+        Định dạng file theo phần mở rộng: 'json', 'csv', 'tsplib' (.tsp) hoặc
+        'binary' (.tspbin, xem save_binary).
+
+        Raises:
+            ValueError: Nếu phần mở rộng không được hỗ trợ
+        """
+        extension = os.path.splitext(filepath)[1].lower()
+        if extension not in _FORMATS:
+            raise ValueError(f"Định dạng file không hỗ trợ: '{extension}' (hỗ trợ: {sorted(_FORMATS)})")
+        return _FORMATS[extension]
+
+    @staticmethod
+    def iter_cities(filepath: str, file_format: Optional[str] = None) -> Iterator[CityRecord]:
+        """
+        Đọc file theo luồng và trả về lần lượt từng bản ghi (id, tên, vĩ độ,
+        kinh độ), không nạp cả file vào bộ nhớ.
+
+        Args:
+            filepath (str): Đường dẫn file JSON, CSV, TSPLIB hoặc nhị phân
+            file_format (str, optional): 'json', 'csv', 'tsplib' hoặc 'binary';
+                mặc định đoán theo phần mở rộng
+        """
+        file_format = file_format or DataLoader.detect_format(filepath)
+        if file_format == 'binary':
+            cities = DataLoader.load_binary(filepath)
+            yield from zip(cities.ids.tolist(), cities.names.tolist(),
+                           cities.lat.tolist(), cities.lon.tolist())
+            return
+        if file_format not in _READERS:
+            raise ValueError(f"Định dạng không hỗ trợ: {file_format} (hỗ trợ: {sorted(_READERS)})")
+        with open(filepath, 'r', encoding='utf-8', newline='') as file:
+            yield from _READERS[file_format](file)
+
+    @staticmethod
+    def load_city_array(filepath: str, file_format: Optional[str] = None) -> CityArray:
+        """
+        Load thành phố thành CityArray trong một lượt đọc: các bản ghi được
+        ghi thẳng vào các cột (array của thư viện chuẩn), không tạo đối tượng
+        City và không giữ cả tài liệu JSON trong bộ nhớ.
+
+        Args:
+            filepath (str): Đường dẫn file JSON, CSV, TSPLIB hoặc nhị phân
+            file_format (str, optional): Xem iter_cities()
+
+        Returns:
+            CityArray: Các thành phố theo thứ tự trong file
+        """
+        if (file_format or DataLoader.detect_format(filepath)) == 'binary':
+            return DataLoader.load_binary(filepath)
+
+        ids, latitudes, longitudes = array('q'), array('d'), array('d')
+        names: List[str] = []
+        for city_id, name, latitude, longitude in DataLoader.iter_cities(filepath, file_format):
+            ids.append(city_id)
+            names.append(name)
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+
+        return CityArray(np.frombuffer(ids, dtype=np.int64), names,
+                         np.frombuffer(latitudes, dtype=np.float64),
+                         np.frombuffer(longitudes, dtype=np.float64))
+
+    @staticmethod
+    def save_binary(cities, filepath: str, distance_matrix=None, candidate_k: Optional[int] = None):
+        """
+        Ghi bộ dữ liệu ra file nhị phân (.tspbin): header có phiên bản rồi các
+        mảng thô id, tên, vĩ độ, kinh độ; tùy chọn kèm ma trận khoảng cách dày
+        và danh sách ứng viên để lần sau không phải tính lại.
+
+        Args:
+            cities (List[City] | CityArray): Các thành phố
+            filepath (str): Đường dẫn file xuất ra
+            distance_matrix (DistanceMatrix | LazyDistanceMatrix, optional): Nếu
+                là DistanceMatrix dày thì ma trận được ghi kèm
+            candidate_k (int, optional): Ghi kèm get_candidate_lists(candidate_k)
+                của distance_matrix
+        """
+        matrix = candidates = None
+        if distance_matrix is not None:
+            if isinstance(distance_matrix, DistanceMatrix):
+                matrix = distance_matrix.matrix
+            if candidate_k:
+                candidates = distance_matrix.get_candidate_lists(candidate_k)
+        instance_format.write_instance(filepath, cities, matrix, candidates)
+        print(f"Bộ dữ liệu đã được ghi ra file nhị phân: {filepath}")
+
+    @staticmethod
+    def load_binary(filepath: str) -> CityArray:
+        """
+        Mở file nhị phân bằng memory-map: các cột của CityArray trỏ thẳng vào
+        file, không phân tích và không sao chép.
+        """
+        return instance_format.city_array_from_blocks(instance_format.read_instance(filepath))
+
+    @staticmethod
+    def load_binary_distance_matrix(filepath: str, dense_limit: int = DEFAULT_DENSE_LIMIT):
+        """
+        Dựng bộ khoảng cách cho file nhị phân: dùng khối ma trận đã lưu nếu có
+        (memory-map, không tính lại), ngược lại make_distance_matrix(); danh
+        sách ứng viên đã lưu được nạp sẵn.
+
+        Returns:
+            DistanceMatrix | LazyDistanceMatrix
+        """
+        blocks = instance_format.read_instance(filepath)
+        cities = instance_format.city_array_from_blocks(blocks)
+        if 'distance' in blocks:
+            distance_matrix = DistanceMatrix.from_matrix(cities, blocks['distance'])
+        else:
+            distance_matrix = make_distance_matrix(cities, dense_limit)
+        if 'candidates' in blocks:
+            distance_matrix.add_candidate_lists(blocks['candidates'])
+        return distance_matrix
+
     @staticmethod
     def load_cities_from_json(filepath: str) -> List[City]:
    
-        with open(filepath, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            
-        cities = []
-        
-        for location in data.get('locations', []):
-        
-            city = City(
-                id=location['id'],
-                name=location['name'],
-                latitude=location['latitude'],
-                longitude=location['longitude']
-            )
-            cities.append(city)
-            
-        return cities
+        return [City(id=city_id, name=name, latitude=latitude, longitude=longitude)
+                for city_id, name, latitude, longitude in DataLoader.iter_cities(filepath, 'json')]
     
     @staticmethod
     def get_city_names(filepath: str) -> Dict[int, str]:
         
-        with open(filepath, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            
-        city_names = {}
-        for location in data.get('locations', []):
-            city_names[location['id']] = location['name']
-            
-        return city_names
+        return {city_id: name for city_id, name, _, _ in DataLoader.iter_cities(filepath, 'json')}
     
     @staticmethod
     def load_cities_with_names(filepath: str) -> Tuple[List[City], Dict[int, str]]:
         """
-        Load cả danh sách City và dictionary tên thành phố cùng lúc.
+        Load cả danh sách City và dictionary tên thành phố trong một lượt đọc file.
         
         Args:
             filepath (str): Đường dẫn tới file JSON
@@ -50,7 +312,7 @@ class DataLoader:
             Tuple[List[City], Dict[int, str]]: (Danh sách City, Dictionary tên thành phố)
         """
         cities = DataLoader.load_cities_from_json(filepath)
-        city_names = DataLoader.get_city_names(filepath)
+        city_names = {city.id: city.name for city in cities}
         
         return cities, city_names
     
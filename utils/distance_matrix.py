@@ -1,93 +1,459 @@
+import hashlib
 import math
-from typing import List
-from models.city import City
+import os
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models.city import City, city_coordinates, city_ids
+from utils.spatial_index import SpatialIndex, prefers_index
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# Tên công thức khoảng cách, là một phần của khóa cache trên đĩa
+DISTANCE_METRIC = 'haversine'
+
+# Số phần tử tối đa của một khối hàng khi tính haversine vector hóa.
+# Giới hạn này giữ bộ nhớ tạm ở mức vài chục MB kể cả với n rất lớn.
+_BUILD_BLOCK_ELEMENTS = 4_000_000
+
+
+def haversine_km(lat_a, lon_a, lat_b, lon_b) -> np.ndarray:
+    """
+    Khoảng cách haversine (km) vector hóa; tọa độ tính bằng radian,
+    các mảng đầu vào được broadcast theo quy tắc của NumPy.
+    """
+    a = (np.sin((lat_b - lat_a) / 2) ** 2
+         + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2)
+    # Sai số làm tròn có thể đẩy a vượt 1 một chút
+    a = np.clip(a, 0.0, 1.0)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def instance_hash(cities: List[City]) -> str:
+    """
+    Mã băm (sha256, hex) của một bộ dữ liệu (List[City] hoặc CityArray): số
+    thành phố và tọa độ (vĩ độ, kinh độ) theo đúng thứ tự trong danh sách.
+    """
+    coords = np.column_stack(city_coordinates(cities)).reshape(-1, 2)
+    digest = hashlib.sha256()
+    digest.update(str(len(coords)).encode('ascii'))
+    digest.update(np.ascontiguousarray(coords).tobytes())
+    return digest.hexdigest()
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Gắn vào khối shared memory có sẵn mà không nhận quyền dọn dẹp nó."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: tiến trình con dùng chung resource tracker với tiến trình
+        # cha nên việc đăng ký lại cùng tên không làm khối bị xóa sớm
+        return shared_memory.SharedMemory(name=name)
 
 
 class DistanceMatrix:
-  
-    
-    def __init__(self, cities: List[City]):
+
+
+    def __init__(self, cities: List[City], dtype=np.float64, cache_dir: Optional[str] = None):
         """
         Khởi tạo ma trận khoảng cách từ danh sách thành phố.
-        
+
+        Ma trận được lưu dưới dạng mảng NumPy dày (n x n), kèm bảng ánh xạ
+        id thành phố -> chỉ số hàng/cột.
+
         Args:
-            cities (List[City]): Danh sách các đối tượng City
+            cities (List[City] | CityArray): Danh sách các thành phố
+            dtype: Kiểu số thực của ma trận (np.float32 hoặc np.float64)
+            cache_dir (str, optional): Thư mục cache trên đĩa. Nếu có, ma trận
+                được đọc bằng memory-map từ file .npy ứng với cache_key()
+                (hoặc được tính rồi ghi vào đó nếu chưa có).
         """
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.dtype(np.float32), np.dtype(np.float64)):
+            raise ValueError(f"dtype không hỗ trợ: {self.dtype} (chỉ float32/float64)")
+        self._setup(cities)
+
+        if cache_dir is not None and self.num_cities > 0:
+            self._matrix = self._load_or_build_cached(cache_dir)
+        else:
+            self._matrix = np.zeros((self.num_cities, self.num_cities), dtype=self.dtype)
+            self._build_matrix()
+
+    def _setup(self, cities: List[City]):
+        """Khởi tạo các thuộc tính chung (trừ bản thân ma trận)."""
         self.cities = cities
         self.num_cities = len(cities)
-        self._matrix = {}
+        self._ids: List[int] = city_ids(cities).tolist()
+        self._index: Dict[int, int] = dict(zip(self._ids, range(self.num_cities)))
+        self._candidates: Dict[int, np.ndarray] = {}
+        # Các khối shared memory đang chứa dữ liệu của ma trận (xem share())
+        self._shm: Dict[str, shared_memory.SharedMemory] = {}
+        self._shm_owner = False
+        # Các mảng đã được share() thay bằng view shared memory, theo khóa của _shm;
+        # release() đặt lại chúng thay vì sao chép (giữ nguyên memory-map của file cache)
+        self._unshared: Dict[str, np.ndarray] = {}
+        # File cache .npy mà ma trận đang được memory-map từ đó (nếu có)
+        self._cache_path: Optional[str] = None
+        self._spatial_index: Optional[SpatialIndex] = None
+
+    @classmethod
+    def from_matrix(cls, cities: List[City], matrix: np.ndarray) -> 'DistanceMatrix':
+        """
+        Dựng DistanceMatrix trên một ma trận có sẵn (ví dụ khối đã memory-map
+        của file nhị phân), không tính lại và không sao chép.
+
+        Raises:
+            ValueError: Nếu kích thước hoặc dtype của ma trận không hợp lệ
+        """
+        n = len(cities)
+        if matrix.shape != (n, n):
+            raise ValueError(f"Ma trận có kích thước {matrix.shape}, cần ({n}, {n})")
+        if matrix.dtype not in (np.dtype(np.float32), np.dtype(np.float64)):
+            raise ValueError(f"dtype không hỗ trợ: {matrix.dtype} (chỉ float32/float64)")
+        dm = cls.__new__(cls)
+        dm.dtype = matrix.dtype
+        dm._setup(cities)
+        dm._matrix = matrix
+        return dm
+
+    def cache_key(self) -> str:
+        """Khóa cache: băm của tọa độ, công thức khoảng cách và dtype."""
+        digest = hashlib.sha256(instance_hash(self.cities).encode('ascii'))
+        digest.update(f"{DISTANCE_METRIC}:{EARTH_RADIUS_KM}:{self.dtype.str}".encode('ascii'))
+        return digest.hexdigest()[:32]
+
+    def _load_or_build_cached(self, cache_dir: str) -> np.ndarray:
+        """
+        Mở ma trận từ cache (chỉ đọc, memory-map); nếu chưa có hoặc file
+        không hợp lệ thì tính lại và ghi file mới (ghi tạm rồi đổi tên).
+        """
+        n = self.num_cities
+        path = os.path.join(cache_dir, f"{self.cache_key()}.npy")
+        if os.path.exists(path):
+            try:
+                matrix = np.load(path, mmap_mode='r')
+                if matrix.shape == (n, n) and matrix.dtype == self.dtype:
+                    self._cache_path = path
+                    return matrix
+            except (OSError, ValueError):
+                pass
+            print(f"Cache ma trận không hợp lệ, tính lại: {path}")
+
+        self._matrix = np.zeros((n, n), dtype=self.dtype)
         self._build_matrix()
-    
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, self._matrix)
+            os.replace(tmp_path, path)
+            self._cache_path = path
+        except OSError as e:
+            print(f"Không ghi được cache ma trận khoảng cách: {e}")
+        return self._matrix
+
+    def prefix(self, count: int) -> 'DistanceMatrix':
+        """
+        Ma trận cho `count` thành phố đầu tiên, là view trên ma trận hiện tại
+        (không tính lại khoảng cách, không sao chép dữ liệu).
+        """
+        count = max(0, min(int(count), self.num_cities))
+        if count == self.num_cities:
+            return self
+        sub = DistanceMatrix.__new__(DistanceMatrix)
+        sub.dtype = self.dtype
+        sub._setup(self.cities[:count])
+        sub._matrix = self._matrix[:count, :count]
+        return sub
+
     def _build_matrix(self):
         """
         Xây dựng ma trận khoảng cách giữa tất cả các cặp thành phố.
-        Sử dụng dictionary để lưu trữ với key là tuple (id1, id2).
-        """
-        for i in range(self.num_cities):
-            for j in range(i, self.num_cities):
-                city_a = self.cities[i]
-                city_b = self.cities[j]
-                
-                if i == j:
-                    distance = 0.0
-                else:
-                    distance = self._calculate_distance(city_a, city_b)
-                
-                self._matrix[(city_a.id, city_b.id)] = distance
-                self._matrix[(city_b.id, city_a.id)] = distance
-    
+        Công thức haversine được tính vector hóa theo từng khối hàng.
+        """
+        n = self.num_cities
+        if n == 0:
+            return
+
+        lat, lon = (np.radians(a) for a in city_coordinates(self.cities))
+
+        block = max(1, _BUILD_BLOCK_ELEMENTS // n)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            self._matrix[start:stop] = haversine_km(lat[start:stop, np.newaxis], lon[start:stop, np.newaxis],
+                                                    lat[np.newaxis, :], lon[np.newaxis, :])
+
+        np.fill_diagonal(self._matrix, 0.0)
+
     @staticmethod
     def _calculate_distance(city_a: City, city_b: City) -> float:
-     
+
         lat1 = math.radians(city_a.y)
         lon1 = math.radians(city_a.x)
         lat2 = math.radians(city_b.y)
         lon2 = math.radians(city_b.x)
-        
+
         dlat = lat2 - lat1
         dlon = lon2 - lon1
-        
+
         a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
         c = 2 * math.asin(math.sqrt(a))
-        
-        earth_radius = 6371.0
-        
-        return earth_radius * c
-    
+
+        return EARTH_RADIUS_KM * c
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Mảng khoảng cách dày (n x n), đánh chỉ số theo thứ tự của `cities`."""
+        return self._matrix
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """Chỉ mục không gian trên tọa độ các thành phố, dựng ở lần dùng đầu tiên."""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(*city_coordinates(self.cities))
+        return self._spatial_index
+
+    def index_of(self, city_id: int) -> int:
+        """
+        Trả về chỉ số hàng/cột của thành phố trong ma trận.
+
+        Raises:
+            KeyError: Nếu id không có trong ma trận
+        """
+        return self._index[city_id]
+
+    def get_candidate_lists(self, k: int) -> np.ndarray:
+        """
+        Danh sách ứng viên: k láng giềng gần nhất của mỗi thành phố.
+
+        Được tính một lần cho mỗi k bằng argpartition theo khối hàng
+        (O(n^2) tổng cộng, không sắp xếp cả hàng) rồi lưu lại.
+
+        Args:
+            k (int): Số láng giềng cho mỗi thành phố (bị chặn bởi n - 1)
+
+        Returns:
+            np.ndarray: Mảng int32 (n x k); hàng i chứa chỉ số các láng giềng
+                        của thành phố i, sắp theo khoảng cách tăng dần
+        """
+        n = self.num_cities
+        k = max(0, min(int(k), n - 1))
+        cached = self._candidates.get(k)
+        if cached is not None:
+            return cached
+
+        candidates = np.empty((n, k), dtype=np.int32)
+        if k > 0:
+            block = max(1, _BUILD_BLOCK_ELEMENTS // n)
+            for start in range(0, n, block):
+                stop = min(start + block, n)
+                rows = np.array(self._matrix[start:stop], dtype=np.float64)
+                # Loại chính thành phố đó khỏi danh sách láng giềng
+                rows[np.arange(stop - start), np.arange(start, stop)] = np.inf
+
+                nearest = np.argpartition(rows, k - 1, axis=1)[:, :k]
+                nearest_dist = np.take_along_axis(rows, nearest, axis=1)
+                ranking = np.argsort(nearest_dist, axis=1, kind='stable')
+                candidates[start:stop] = np.take_along_axis(nearest, ranking, axis=1)
+
+        self._candidates[k] = candidates
+        return candidates
+
+    def add_candidate_lists(self, candidates: np.ndarray):
+        """
+        Nạp danh sách ứng viên đã tính sẵn (n x k, mỗi hàng sắp theo khoảng
+        cách tăng dần); get_candidate_lists(k) sẽ trả về nó thay vì tính lại.
+        """
+        if candidates.ndim != 2 or len(candidates) != self.num_cities:
+            raise ValueError(f"Danh sách ứng viên có kích thước {candidates.shape}, "
+                             f"cần ({self.num_cities}, k)")
+        self._candidates[candidates.shape[1]] = candidates
+
+    def share(self) -> 'DistanceMatrix':
+        """
+        Chuyển ma trận (và các danh sách ứng viên đã tính) sang shared memory.
+
+        Sau khi gọi, việc pickle đối tượng (ví dụ gửi sang tiến trình con của
+        ProcessPoolExecutor) chỉ gửi tên các khối nhớ; bên nhận gắn vào chúng
+        và dùng trực tiếp, không sao chép mảng O(n^2). Tiến trình gọi share()
+        sở hữu các khối và phải gọi release() khi xong (hoặc dùng shared()).
+
+        Returns:
+            DistanceMatrix: Chính đối tượng này
+        """
+        if self._shm:
+            return self
+
+        self._shm_owner = True
+        self._unshared['matrix'] = self._matrix
+        self._matrix = self._publish('matrix', self._matrix)
+        for k, candidates in self._candidates.items():
+            self._unshared[f'candidates:{k}'] = candidates
+            self._candidates[k] = self._publish(f'candidates:{k}', candidates)
+        return self
+
+    def _publish(self, key: str, array: np.ndarray) -> np.ndarray:
+        """Sao chép mảng vào một khối shared memory mới, trả về view trên khối đó."""
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self._shm[key] = block
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        view[...] = array
+        return view
+
+    @property
+    def is_shared(self) -> bool:
+        """True nếu ma trận đang nằm trong shared memory."""
+        return bool(self._shm)
+
+    def release(self):
+        """
+        Tách ma trận khỏi shared memory: các mảng có trước share() (ví dụ
+        memory-map của file cache) được đặt lại, tiến trình con đã gắn vào thì
+        memory-map lại file cache; chỉ khi khối shared memory là nơi duy nhất
+        chứa dữ liệu thì mới chép ra bộ nhớ riêng. Các khối được đóng và, nếu
+        tiến trình này sở hữu chúng, bị xóa.
+        """
+        if not self._shm:
+            return
+
+        unshared, self._unshared = self._unshared, {}
+        if 'matrix' in self._shm:
+            if 'matrix' in unshared:
+                self._matrix = unshared['matrix']
+            elif self._cache_path is not None:
+                self._matrix = np.load(self._cache_path, mmap_mode='r')
+            else:
+                self._matrix = np.array(self._matrix)
+        for k, candidates in list(self._candidates.items()):
+            key = f'candidates:{k}'
+            if key in self._shm:
+                self._candidates[k] = unshared[key] if key in unshared else np.array(candidates)
+
+        blocks, self._shm = self._shm, {}
+        for block in blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # Vẫn còn view bên ngoài trỏ vào khối; vùng nhớ được giải phóng khi chúng bị thu hồi
+                pass
+            if self._shm_owner:
+                block.unlink()
+        self._shm_owner = False
+
+    @contextmanager
+    def shared(self):
+        """
+        Context manager: đưa ma trận vào shared memory trong phạm vi khối with
+        và giải phóng khi thoát (nếu chính khối with đã gọi share()).
+
+        Ví dụ:
+            with distance_matrix.shared():
+                with ProcessPoolExecutor(initializer=..., initargs=(distance_matrix,)) as pool:
+                    ...
+        """
+        owned = not self._shm
+        self.share()
+        try:
+            yield self
+        finally:
+            if owned:
+                self.release()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shm'] = {}
+        state['_shm_owner'] = False
+        state['_unshared'] = {}
+        if not self._shm:
+            if self._cache_path is not None:
+                # Bên nhận tự memory-map lại file cache
+                state['_matrix'] = None
+            return state
+
+        # Chỉ gửi mô tả (tên khối, shape, dtype) của các mảng đang chia sẻ
+        handles = {}
+        if 'matrix' in self._shm:
+            handles['matrix'] = (self._shm['matrix'].name, self._matrix.shape, self._matrix.dtype.str)
+            state['_matrix'] = None
+        candidates = dict(self._candidates)
+        for k, array in self._candidates.items():
+            key = f'candidates:{k}'
+            if key in self._shm:
+                handles[key] = (self._shm[key].name, array.shape, array.dtype.str)
+                del candidates[k]
+        state['_candidates'] = candidates
+        state['_shared_handles'] = handles
+        return state
+
+    def __setstate__(self, state):
+        handles = state.pop('_shared_handles', {})
+        self.__dict__.update(state)
+        for key, (name, shape, dtype) in handles.items():
+            block = _attach_shared_memory(name)
+            self._shm[key] = block
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            if key == 'matrix':
+                self._matrix = view
+            else:
+                self._candidates[int(key.split(':', 1)[1])] = view
+        if self._matrix is None and self._cache_path is not None:
+            self._matrix = np.load(self._cache_path, mmap_mode='r')
+
     def get_distance(self, city_id_a: int, city_id_b: int) -> float:
         """
         Lấy khoảng cách giữa hai thành phố dựa trên ID.
-        
+
         Args:
             city_id_a (int): ID của thành phố thứ nhất
             city_id_b (int): ID của thành phố thứ hai
-            
+
         Returns:
-            float: Khoảng cách giữa hai thành phố
+            float: Khoảng cách giữa hai thành phố (inf nếu id không tồn tại)
         """
-        return self._matrix.get((city_id_a, city_id_b), float('inf'))
-    
+        i = self._index.get(city_id_a)
+        j = self._index.get(city_id_b)
+        if i is None or j is None:
+            return float('inf')
+        return float(self._matrix[i, j])
+
     def get_nearest_city(self, from_city_id: int, unvisited_ids: set) -> int:
         """
-        Tìm thành phố gần nhất trong tập các thành phố chưa thăm.
-        
+        Tìm thành phố gần nhất trong tập các thành phố chưa thăm (khác from_city_id).
+
+        Tập nhỏ được quét trực tiếp trên hàng của ma trận; tập lớn được tìm
+        qua chỉ mục không gian (chỉ kiểm tra thành viên của tập, không duyệt cả tập).
+
         Args:
             from_city_id (int): ID của thành phố xuất phát
             unvisited_ids (set): Tập các ID thành phố chưa thăm
-            
+
         Returns:
             int: ID của thành phố gần nhất
         """
-        min_distance = float('inf')
-        nearest_id = None
-        
-        for city_id in unvisited_ids:
-            distance = self.get_distance(from_city_id, city_id)
-            if distance < min_distance:
-                min_distance = distance
-                nearest_id = city_id
-        
-        return nearest_id
-    
+        row = self._index.get(from_city_id)
+        if row is None or not unvisited_ids:
+            return None
+
+        if prefers_index(len(unvisited_ids), self.num_cities):
+            ids = self._ids
+            j = self.spatial_index.nearest(row, lambda j: ids[j] in unvisited_ids)
+            return None if j is None else ids[j]
+
+        # Bỏ chính thành phố xuất phát, giống nhánh dùng chỉ mục không gian
+        candidate_ids = [city_id for city_id in unvisited_ids
+                         if city_id != from_city_id and city_id in self._index]
+        if not candidate_ids:
+            return None
+
+        columns = np.fromiter((self._index[city_id] for city_id in candidate_ids),
+                              dtype=np.intp, count=len(candidate_ids))
+        best = int(np.argmin(self._matrix[row, columns]))
+        return candidate_ids[best]
+
     def __repr__(self) -> str:
-        return f"DistanceMatrix(num_cities={self.num_cities})"
\ No newline at end of file
+        shared = ", shared=True" if self._shm else ""
+        return f"DistanceMatrix(num_cities={self.num_cities}, dtype={self.dtype.name}{shared})"
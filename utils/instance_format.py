@@ -0,0 +1,138 @@
+import json
+import os
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+from models.city import CityArray, city_coordinates, city_ids
+from utils.distance_matrix import DISTANCE_METRIC, EARTH_RADIUS_KM, instance_hash
+
+
+# Định dạng nhị phân cho một bộ dữ liệu:
+#   magic (8 byte) | phiên bản (uint32) | độ dài header (uint32) | header JSON (UTF-8)
+#   rồi các khối mảng thô, mỗi khối bắt đầu ở vị trí chia hết cho BLOCK_ALIGNMENT.
+# Header mô tả từng khối (offset, dtype, shape) nên khi đọc chỉ cần memory-map.
+MAGIC = b'TSPINST\x00'
+FORMAT_VERSION = 1
+BLOCK_ALIGNMENT = 64
+FILE_EXTENSION = '.tspbin'
+
+_PREAMBLE = struct.Struct('<8sII')
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // BLOCK_ALIGNMENT) * BLOCK_ALIGNMENT
+
+
+def write_instance(filepath: str, cities, matrix: Optional[np.ndarray] = None,
+                   candidates: Optional[np.ndarray] = None):
+    """
+    Ghi bộ dữ liệu ra file nhị phân (ghi file tạm rồi đổi tên).
+
+    Args:
+        filepath (str): Đường dẫn file
+        cities (List[City] | CityArray): Các thành phố
+        matrix (np.ndarray, optional): Ma trận khoảng cách (n x n) đi kèm
+        candidates (np.ndarray, optional): Danh sách ứng viên (n x k) đi kèm
+    """
+    n = len(cities)
+    latitudes, longitudes = city_coordinates(cities)
+    names = cities.names if isinstance(cities, CityArray) else [c.name for c in cities]
+    arrays = {
+        'ids': np.ascontiguousarray(city_ids(cities), dtype='<i8'),
+        'lat': np.ascontiguousarray(latitudes, dtype='<f8'),
+        'lon': np.ascontiguousarray(longitudes, dtype='<f8'),
+        'names': np.ascontiguousarray(np.asarray(names, dtype=np.str_).reshape(n)),
+    }
+    if matrix is not None:
+        if matrix.shape != (n, n):
+            raise ValueError(f"Ma trận có kích thước {matrix.shape}, cần ({n}, {n})")
+        arrays['distance'] = matrix
+    if candidates is not None:
+        if candidates.ndim != 2 or len(candidates) != n:
+            raise ValueError(f"Danh sách ứng viên có kích thước {candidates.shape}, cần ({n}, k)")
+        arrays['candidates'] = np.ascontiguousarray(candidates, dtype='<i4')
+
+    header = {
+        'num_cities': n,
+        'instance_hash': instance_hash(cities),
+        'metric': DISTANCE_METRIC,
+        'earth_radius_km': EARTH_RADIUS_KM,
+        'blocks': {},
+    }
+    # Header chứa offset của các khối, còn offset lại phụ thuộc độ dài header:
+    # dành sẵn chỗ cho header rồi tăng dần tới khi vừa
+    reserved = 1024
+    while True:
+        offset = _aligned(_PREAMBLE.size + reserved)
+        for key, array in arrays.items():
+            header['blocks'][key] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+            offset = _aligned(offset + array.nbytes)
+        encoded = json.dumps(header).encode('utf-8')
+        if len(encoded) <= reserved:
+            break
+        reserved = 2 * len(encoded)
+
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(encoded)))
+        f.write(encoded)
+        for key, array in arrays.items():
+            f.seek(header['blocks'][key]['offset'])
+            np.ascontiguousarray(array).tofile(f)
+        f.truncate(offset)
+    os.replace(tmp_path, filepath)
+
+
+def read_header(filepath: str) -> dict:
+    """
+    Đọc header của file nhị phân.
+
+    Raises:
+        ValueError: Nếu file không đúng định dạng hoặc phiên bản mới hơn
+    """
+    with open(filepath, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError(f"File quá ngắn, không phải bộ dữ liệu nhị phân: {filepath}")
+        magic, version, length = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"Không phải bộ dữ liệu nhị phân (magic={magic!r}): {filepath}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Phiên bản định dạng {version} mới hơn phiên bản hỗ trợ ({FORMAT_VERSION})")
+        return json.loads(f.read(length).decode('utf-8'))
+
+
+def read_instance(filepath: str) -> Dict[str, np.ndarray]:
+    """
+    Memory-map mọi khối của file nhị phân (chỉ đọc, không sao chép).
+
+    Returns:
+        dict: Tên khối ('ids', 'lat', 'lon', 'names', và nếu có 'distance',
+              'candidates') -> mảng chỉ đọc trên memory-map; khối 'distance' bị bỏ qua nếu
+              được tính bằng công thức khoảng cách khác
+    """
+    header = read_header(filepath)
+    # Một memory-map cho cả file; mỗi khối là một view (offset đã được căn lề)
+    raw = np.memmap(filepath, dtype=np.uint8, mode='r')
+    blocks = {}
+    for key, block in header['blocks'].items():
+        dtype = np.dtype(block['dtype'])
+        shape = tuple(block['shape'])
+        start = block['offset']
+        stop = start + dtype.itemsize * int(np.prod(shape))
+        if stop > len(raw):
+            raise ValueError(f"File bị cắt cụt: khối '{key}' vượt quá cuối file {filepath}")
+        blocks[key] = raw[start:stop].view(dtype).reshape(shape)
+
+    metric = (header.get('metric'), header.get('earth_radius_km'))
+    if 'distance' in blocks and metric != (DISTANCE_METRIC, EARTH_RADIUS_KM):
+        print(f"Bỏ qua ma trận khoảng cách trong {filepath}: khác công thức khoảng cách hiện tại")
+        del blocks['distance']
+    return blocks
+
+
+def city_array_from_blocks(blocks: Dict[str, np.ndarray]) -> CityArray:
+    """CityArray trên các khối đã memory-map (không sao chép)."""
+    return CityArray(blocks['ids'], blocks['names'], blocks['lat'], blocks['lon'])
@@ -0,0 +1,232 @@
+import math
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models.city import City, city_coordinates, city_ids
+from utils.distance_matrix import DistanceMatrix, EARTH_RADIUS_KM, haversine_km
+from utils.spatial_index import SpatialIndex, prefers_index
+
+
+# Số cặp (i, j) tối đa được giữ trong cache LRU
+DEFAULT_PAIR_CACHE_SIZE = 1 << 20
+
+# Từ số thành phố này trở lên, make_distance_matrix() dùng LazyDistanceMatrix
+DEFAULT_DENSE_LIMIT = 20_000
+
+
+class _LazyMatrixView:
+    """
+    Giả lập mảng n x n chỉ đọc của DistanceMatrix.matrix: m[i, j], m.item(i, j),
+    m[i] (một hàng) và fancy indexing đều tính haversine theo yêu cầu.
+    """
+
+    def __init__(self, oracle: 'LazyDistanceMatrix'):
+        n = oracle.num_cities
+        self.shape = (n, n)
+        self.ndim = 2
+        self.dtype = oracle.dtype
+        self.item = oracle.distance
+        self._lat = oracle._lat
+        self._lon = oracle._lon
+
+    def _axis(self, key):
+        if isinstance(key, slice):
+            return np.arange(*key.indices(self.shape[0]))
+        return np.asarray(key, dtype=np.intp)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, cols = key
+            if isinstance(rows, (int, np.integer)) and isinstance(cols, (int, np.integer)):
+                return self.item(int(rows), int(cols))
+            rows, cols = self._axis(rows), self._axis(cols)
+        else:
+            rows = self._axis(key)[..., np.newaxis]
+            cols = np.arange(self.shape[1])
+        return haversine_km(self._lat[rows], self._lon[rows], self._lat[cols], self._lon[cols])
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+
+class LazyDistanceMatrix:
+    """
+    Thay thế DistanceMatrix cho bộ dữ liệu rất lớn: không dựng mảng n x n.
+
+    Khoảng cách được tính bằng haversine từ mảng tọa độ khi cần, với cache LRU
+    cho các cặp hay dùng; láng giềng gần nhất và danh sách ứng viên được tìm qua
+    SpatialIndex. Giao diện giống DistanceMatrix (get_distance, get_nearest_city,
+    index_of, get_candidate_lists, matrix...) nên Tour, nearest_neighbor_tour và
+    các solver dùng được trực tiếp.
+    """
+
+    def __init__(self, cities: List[City], cache_size: int = DEFAULT_PAIR_CACHE_SIZE):
+        """
+        Args:
+            cities (List[City] | CityArray): Danh sách các thành phố
+            cache_size (int): Số cặp khoảng cách tối đa trong cache LRU
+        """
+        self.cities = cities
+        self.num_cities = len(cities)
+        self.dtype = np.dtype(np.float64)
+        self.cache_size = cache_size
+
+        self._ids: List[int] = city_ids(cities).tolist()
+        self._index: Dict[int, int] = dict(zip(self._ids, range(self.num_cities)))
+        lat, lon = city_coordinates(cities)
+        self._lat = np.radians(lat)
+        self._lon = np.radians(lon)
+        self._candidates: Dict[int, np.ndarray] = {}
+        self._spatial_index: Optional[SpatialIndex] = None
+        self._setup_pair_cache()
+
+    def _setup_pair_cache(self):
+        """Dựng hàm khoảng cách vô hướng và cache LRU (không pickle được, nên dựng lại khi unpickle)."""
+        lat, lon = self._lat.tolist(), self._lon.tolist()
+        cos_lat = [math.cos(x) for x in lat]
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+
+        @lru_cache(maxsize=self.cache_size)
+        def pair(i, j):
+            a = sin((lat[j] - lat[i]) / 2) ** 2 + cos_lat[i] * cos_lat[j] * sin((lon[j] - lon[i]) / 2) ** 2
+            return 2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0)))
+
+        def distance(i, j):
+            # Cặp (i, j) và (j, i) dùng chung một mục trong cache
+            if i < j:
+                return pair(i, j)
+            if i > j:
+                return pair(j, i)
+            return 0.0
+
+        self._pair = pair
+        self.distance = distance
+        self._matrix = _LazyMatrixView(self)
+
+    @property
+    def matrix(self) -> _LazyMatrixView:
+        """View n x n tính khoảng cách theo yêu cầu (xem _LazyMatrixView)."""
+        return self._matrix
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """Chỉ mục không gian, dựng ở lần dùng đầu tiên."""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(np.degrees(self._lat), np.degrees(self._lon))
+        return self._spatial_index
+
+    def index_of(self, city_id: int) -> int:
+        """
+        Trả về chỉ số của thành phố.
+
+        Raises:
+            KeyError: Nếu id không tồn tại
+        """
+        return self._index[city_id]
+
+    def get_candidate_lists(self, k: int) -> np.ndarray:
+        """
+        Danh sách ứng viên: k láng giềng gần nhất của mỗi thành phố
+        (tìm qua chỉ mục không gian, O(n * k) bộ nhớ).
+
+        Returns:
+            np.ndarray: Mảng int32 (n x k), mỗi hàng sắp theo khoảng cách tăng dần
+        """
+        k = max(0, min(int(k), self.num_cities - 1))
+        cached = self._candidates.get(k)
+        if cached is None:
+            cached = self.spatial_index.k_nearest_all(k)
+            self._candidates[k] = cached
+        return cached
+
+    def add_candidate_lists(self, candidates: np.ndarray):
+        """Nạp danh sách ứng viên đã tính sẵn (xem DistanceMatrix.add_candidate_lists)."""
+        if candidates.ndim != 2 or len(candidates) != self.num_cities:
+            raise ValueError(f"Danh sách ứng viên có kích thước {candidates.shape}, "
+                             f"cần ({self.num_cities}, k)")
+        self._candidates[candidates.shape[1]] = candidates
+
+    def get_distance(self, city_id_a: int, city_id_b: int) -> float:
+        """
+        Lấy khoảng cách giữa hai thành phố dựa trên ID.
+
+        Returns:
+            float: Khoảng cách (inf nếu id không tồn tại)
+        """
+        i = self._index.get(city_id_a)
+        j = self._index.get(city_id_b)
+        if i is None or j is None:
+            return float('inf')
+        return self.distance(i, j)
+
+    def get_nearest_city(self, from_city_id: int, unvisited_ids: set) -> int:
+        """
+        Tìm thành phố gần nhất trong tập các thành phố chưa thăm (khác from_city_id).
+
+        Tập nhỏ được quét trực tiếp (vector hóa); tập lớn được tìm qua các lớp
+        ô lưới của chỉ mục không gian, chỉ kiểm tra thành viên của tập.
+
+        Returns:
+            int: ID của thành phố gần nhất (None nếu không có)
+        """
+        row = self._index.get(from_city_id)
+        if row is None or not unvisited_ids:
+            return None
+
+        if prefers_index(len(unvisited_ids), self.num_cities):
+            ids = self._ids
+            j = self.spatial_index.nearest(row, lambda j: ids[j] in unvisited_ids)
+            return None if j is None else ids[j]
+
+        # Bỏ chính thành phố xuất phát, giống nhánh dùng chỉ mục không gian
+        candidate_ids = [city_id for city_id in unvisited_ids
+                         if city_id != from_city_id and city_id in self._index]
+        if not candidate_ids:
+            return None
+        columns = np.fromiter((self._index[city_id] for city_id in candidate_ids),
+                              dtype=np.intp, count=len(candidate_ids))
+        best = int(np.argmin(self._matrix[row, columns]))
+        return candidate_ids[best]
+
+    def cache_info(self):
+        """Thống kê cache LRU của các cặp khoảng cách (hits, misses, maxsize, currsize)."""
+        return self._pair.cache_info()
+
+    def prefix(self, count: int) -> 'LazyDistanceMatrix':
+        """Oracle cho `count` thành phố đầu tiên."""
+        count = max(0, min(int(count), self.num_cities))
+        if count == self.num_cities:
+            return self
+        return LazyDistanceMatrix(self.cities[:count], self.cache_size)
+
+    @contextmanager
+    def shared(self):
+        """Chỉ có dữ liệu O(n) nên không cần shared memory; giữ giao diện giống DistanceMatrix."""
+        yield self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('_pair', 'distance', '_matrix'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup_pair_cache()
+
+    def __repr__(self) -> str:
+        return f"LazyDistanceMatrix(num_cities={self.num_cities}, cache_size={self.cache_size})"
+
+
+def make_distance_matrix(cities: List[City], dense_limit: int = DEFAULT_DENSE_LIMIT,
+                         cache_dir: Optional[str] = None):
+    """
+    Chọn cách lưu khoảng cách theo kích thước dữ liệu: DistanceMatrix dày
+    (có thể kèm cache trên đĩa) khi n < dense_limit, ngược lại LazyDistanceMatrix.
+    """
+    if len(cities) < dense_limit:
+        return DistanceMatrix(cities, cache_dir=cache_dir)
+    return LazyDistanceMatrix(cities)
@@ -0,0 +1,163 @@
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+
+class SolverProfile:
+    """
+    Bộ đo tùy chọn cho một lần chạy thuật toán: thời gian và bộ nhớ theo pha,
+    số nước đi được đánh giá / được chấp nhận và số lần tra khoảng cách.
+
+    Solver nhận profile=None theo mặc định và khi đó không đo gì (chỉ một phép
+    so sánh với None ở các vòng lặp). Pha lồng nhau được tính "thời gian riêng":
+    thời gian và bộ nhớ của pha con không tính vào pha cha.
+
+    Đo bộ nhớ dùng tracemalloc (chậm hơn vài lần) nên phải bật bằng
+    track_allocations=True và dùng profile như context manager:
+
+        with SolverProfile(track_allocations=True) as profile:
+            solver.run(..., profile=profile)
+        print("\\n".join(profile.summary()))
+    """
+
+    def __init__(self, track_allocations: bool = False):
+        self.track_allocations = track_allocations
+        # Tên pha -> {"time": giây, "calls": số lần, "alloc_bytes": bộ nhớ tăng thêm (ròng)}
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.moves_evaluated = 0
+        self.moves_accepted = 0
+        self.distance_lookups = 0
+        # Các bộ đếm riêng của từng thuật toán (count())
+        self.counters: Dict[str, int] = {}
+        self.peak_bytes = 0
+        self._stack: List[List[float]] = []
+        self._started_tracing = False
+
+    def __enter__(self) -> 'SolverProfile':
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, *exc):
+        if tracemalloc.is_tracing():
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    def _memory(self) -> int:
+        if self.track_allocations and tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[0]
+        return 0
+
+    def _enter_phase(self):
+        self._stack.append([0.0, 0])
+        return time.perf_counter(), self._memory()
+
+    def _exit_phase(self, name: str, started: float, memory: int):
+        total = time.perf_counter() - started
+        allocated = self._memory() - memory
+        child_time, child_alloc = self._stack.pop()
+        entry = self.phases.setdefault(name, {"time": 0.0, "calls": 0, "alloc_bytes": 0})
+        entry["time"] += total - child_time
+        entry["calls"] += 1
+        entry["alloc_bytes"] += allocated - child_alloc
+        if self._stack:
+            self._stack[-1][0] += total
+            self._stack[-1][1] += allocated
+
+    @contextmanager
+    def phase(self, name: str):
+        """Đo một pha (có thể gọi nhiều lần, cộng dồn)."""
+        started, memory = self._enter_phase()
+        try:
+            yield
+        finally:
+            self._exit_phase(name, started, memory)
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """Bọc func để mỗi lần gọi được tính vào pha name."""
+        def wrapper(*args):
+            started, memory = self._enter_phase()
+            try:
+                return func(*args)
+            finally:
+                self._exit_phase(name, started, memory)
+        return wrapper
+
+    def counting_distance(self, dist: Callable) -> Callable:
+        """Bọc hàm khoảng cách dist(i, j) để đếm số lần tra."""
+        def wrapper(i, j):
+            self.distance_lookups += 1
+            return dist(i, j)
+        return wrapper
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Kết quả dạng dict thuần (pickle/JSON được), ví dụ để gửi từ tiến trình con."""
+        return {
+            "phases": {name: dict(entry) for name, entry in self.phases.items()},
+            "moves_evaluated": self.moves_evaluated,
+            "moves_accepted": self.moves_accepted,
+            "distance_lookups": self.distance_lookups,
+            "counters": dict(self.counters),
+            "peak_bytes": self.peak_bytes if self.track_allocations else None,
+        }
+
+    def summary(self) -> List[str]:
+        return summarize_profile(self.as_dict())
+
+
+def profile_phase(profile: Optional[SolverProfile], name: str):
+    """profile.phase(name), hoặc context rỗng khi không đo."""
+    return profile.phase(name) if profile is not None else nullcontext()
+
+
+def summarize_profile(data: Dict[str, Any]) -> List[str]:
+    """Các dòng mô tả ngắn của một kết quả as_dict() (hoặc trung bình của nhiều kết quả)."""
+    phases = data.get("phases", {})
+    total = sum(entry["time"] for entry in phases.values()) or 1.0
+    lines = []
+    for name, entry in sorted(phases.items(), key=lambda item: -item[1]["time"]):
+        line = f"{name}: {entry['time']:.4f}s ({100 * entry['time'] / total:.1f}%), {entry['calls']:.0f} lần"
+        if data.get("peak_bytes") is not None:
+            line += f", bộ nhớ {entry['alloc_bytes'] / 1024:+.1f} KiB"
+        lines.append(line)
+    lines.append(f"nước đi: {data['moves_evaluated']:.0f} đánh giá, {data['moves_accepted']:.0f} chấp nhận; "
+                 f"tra khoảng cách: {data['distance_lookups']:.0f}")
+    for name, value in data.get("counters", {}).items():
+        lines.append(f"{name}: {value:.0f}")
+    if data.get("peak_bytes") is not None:
+        lines.append(f"bộ nhớ đỉnh: {data['peak_bytes'] / 1024:.1f} KiB")
+    return lines
+
+
+def mean_profile(profiles: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Trung bình (theo lần chạy) của nhiều kết quả as_dict(); None nếu danh sách rỗng."""
+    if not profiles:
+        return None
+    n = len(profiles)
+    phases: Dict[str, Dict[str, float]] = {}
+    for data in profiles:
+        for name, entry in data["phases"].items():
+            target = phases.setdefault(name, {"time": 0.0, "calls": 0, "alloc_bytes": 0})
+            for key in target:
+                target[key] += entry[key] / n
+    counters: Dict[str, float] = {}
+    for data in profiles:
+        for name, value in data["counters"].items():
+            counters[name] = counters.get(name, 0) + value / n
+    peaks = [data["peak_bytes"] for data in profiles if data.get("peak_bytes") is not None]
+    return {
+        "phases": phases,
+        "moves_evaluated": sum(data["moves_evaluated"] for data in profiles) / n,
+        "moves_accepted": sum(data["moves_accepted"] for data in profiles) / n,
+        "distance_lookups": sum(data["distance_lookups"] for data in profiles) / n,
+        "counters": counters,
+        "peak_bytes": max(peaks) if peaks else None,
+    }
@@ -0,0 +1,254 @@
+import math
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+
+
+# Số điểm trung bình mong muốn trong mỗi ô lưới
+DEFAULT_POINTS_PER_CELL = 2
+
+
+def prefers_index(num_candidates: int, num_points: int) -> bool:
+    """
+    True nếu tìm láng giềng trong một tập num_candidates điểm (trên tổng số
+    num_points) qua chỉ mục rẻ hơn quét trực tiếp cả tập.
+    """
+    return num_candidates > 4 * math.isqrt(num_points) + 64
+
+
+def to_unit_vectors(lat_deg, lon_deg) -> np.ndarray:
+    """Chiếu tọa độ (độ) lên vector đơn vị 3D, trả về mảng (n, 3)."""
+    lat = np.radians(np.asarray(lat_deg, dtype=np.float64))
+    lon = np.radians(np.asarray(lon_deg, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+class SpatialIndex:
+    """
+    Chỉ mục lưới (grid buckets) cho các điểm trên mặt cầu.
+
+    Mỗi điểm (vĩ độ, kinh độ) được chiếu lên vector đơn vị 3D. Khoảng cách dây
+    cung giữa hai vector tăng đơn điệu theo khoảng cách haversine, nên láng
+    giềng gần nhất theo dây cung cũng là láng giềng gần nhất theo haversine
+    (kết quả chính xác, không xấp xỉ).
+
+    Các ô lưới được lưu dạng CSR: chỉ số điểm sắp theo mã ô, mảng mã ô đã sắp
+    và vị trí bắt đầu/kết thúc của từng ô; tra ô bằng searchsorted.
+
+    Điểm có thể bị xóa (remove) để truy vấn chỉ trả về các điểm còn lại; ô
+    không còn điểm nào được bỏ qua ngay khi tra. copy() tạo bản có trạng thái
+    xóa riêng nhưng dùng chung dữ liệu lưới.
+    """
+
+    def __init__(self, lat_deg, lon_deg, points_per_cell: int = DEFAULT_POINTS_PER_CELL):
+        """
+        Args:
+            lat_deg: Mảng vĩ độ (độ)
+            lon_deg: Mảng kinh độ (độ)
+            points_per_cell (int): Số điểm trung bình mong muốn trong một ô
+        """
+        self._build(to_unit_vectors(lat_deg, lon_deg).reshape(-1, 3), points_per_cell)
+
+    def _build(self, points: np.ndarray, points_per_cell: int):
+        """Chia lưới và xếp các điểm vào ô."""
+        self.points = points
+        n = len(points)
+        self.num_points = n
+        self.points_per_cell = points_per_cell
+
+        origin = points.min(axis=0) if n else np.zeros(3)
+        extent = points.max(axis=0) - origin if n else np.zeros(3)
+        # Các điểm nằm trên một mặt (2 chiều): kích thước ô theo diện tích hai cạnh lớn nhất
+        e1, e2 = sorted(extent, reverse=True)[:2]
+        if e1 * e2 > 0:
+            cell = float(np.sqrt(e1 * e2 * points_per_cell / n))
+        else:
+            cell = float(e1) * points_per_cell / max(n, 1)
+        self.cell_size = cell if cell > 0 else 1.0
+
+        self._dims = (extent // self.cell_size).astype(np.int64) + 1
+        coords = ((points - origin) // self.cell_size).astype(np.int64)
+        np.minimum(coords, self._dims - 1, out=coords)
+        self._coords = coords
+
+        keys = self._linear(coords)
+        self._order = np.argsort(keys, kind='stable')
+        self._cell_keys, self._cell_start = np.unique(keys[self._order], return_index=True)
+        self._cell_stop = np.append(self._cell_start[1:], n)
+        self._max_radius = int(self._dims.max())
+
+        cell_sizes = self._cell_stop - self._cell_start
+        self._cell_of = np.empty(n, dtype=np.int64)
+        self._cell_of[self._order] = np.repeat(np.arange(cell_sizes.size), cell_sizes)
+        # Trạng thái xóa: điểm còn lại và số điểm còn lại trong mỗi ô
+        self._alive = np.ones(n, dtype=bool)
+        self._cell_alive = cell_sizes.copy()
+        self.num_alive = n
+
+        self._shells: List[np.ndarray] = []
+        self._cubes: List[np.ndarray] = []
+
+    def _regrid(self, points_per_cell: int) -> 'SpatialIndex':
+        """Chỉ mục mới trên cùng tập điểm với kích thước ô khác."""
+        index = SpatialIndex.__new__(SpatialIndex)
+        index._build(self.points, points_per_cell)
+        return index
+
+    def copy(self, active: Optional[Iterable[int]] = None) -> 'SpatialIndex':
+        """
+        Bản sao dùng chung dữ liệu lưới nhưng có trạng thái xóa riêng.
+
+        Args:
+            active (Iterable[int], optional): Chỉ giữ các điểm này (mặc định: mọi điểm)
+        """
+        index = SpatialIndex.__new__(SpatialIndex)
+        index.__dict__.update(self.__dict__)
+        if active is None:
+            index._alive = np.ones(self.num_points, dtype=bool)
+        else:
+            index._alive = np.zeros(self.num_points, dtype=bool)
+            index._alive[np.fromiter(active, dtype=np.int64)] = True
+        index._cell_alive = np.bincount(self._cell_of[index._alive], minlength=self._cell_keys.size)
+        index.num_alive = int(index._alive.sum())
+        return index
+
+    def remove(self, i: int):
+        """Xóa điểm i khỏi các truy vấn sau (bỏ qua nếu đã xóa)."""
+        if self._alive[i]:
+            self._alive[i] = False
+            self._cell_alive[self._cell_of[i]] -= 1
+            self.num_alive -= 1
+
+    def _linear(self, coords: np.ndarray) -> np.ndarray:
+        """Mã ô tuyến tính từ tọa độ ô (x, y, z)."""
+        _, dy, dz = self._dims
+        return (coords[..., 0] * dy + coords[..., 1]) * dz + coords[..., 2]
+
+    def _offsets(self, r: int, shell: bool) -> np.ndarray:
+        """Các độ lệch ô có khoảng cách Chebyshev == r (shell) hoặc <= r (cube)."""
+        cache = self._shells if shell else self._cubes
+        while len(cache) <= r:
+            radius = len(cache)
+            axis = np.arange(-radius, radius + 1)
+            grid = np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1).reshape(-1, 3)
+            if shell:
+                grid = grid[np.abs(grid).max(axis=1) == radius]
+            cache.append(grid)
+        return cache[r]
+
+    def _gather(self, cell: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Chỉ số các điểm nằm trong các ô cell + offsets."""
+        cells = cell + offsets
+        inside = np.all((cells >= 0) & (cells < self._dims), axis=1)
+        keys = self._linear(cells[inside])
+        if keys.size == 0 or self._cell_keys.size == 0:
+            return keys[:0]
+
+        pos = np.minimum(np.searchsorted(self._cell_keys, keys), self._cell_keys.size - 1)
+        pos = pos[self._cell_keys[pos] == keys]
+        pos = pos[self._cell_alive[pos] > 0]
+        starts, stops = self._cell_start[pos], self._cell_stop[pos]
+        lengths = stops - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return keys[:0]
+        # Ghép các đoạn [start, stop) thành một mảng chỉ số liên tục
+        shift = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        found = self._order[shift + np.arange(total)]
+        if self.num_alive < self.num_points:
+            found = found[self._alive[found]]
+        return found
+
+    def nearest(self, i: int, accept: Optional[Callable[[int], bool]] = None) -> Optional[int]:
+        """
+        Điểm còn lại (chưa bị xóa) gần điểm i nhất, khác i và thỏa accept(j).
+        Bản thân i có thể đã bị xóa.
+
+        Duyệt các lớp ô đồng tâm quanh ô chứa i; dừng khi điểm tốt nhất đã
+        gần hơn mọi điểm nằm ngoài các lớp đã duyệt.
+
+        Returns:
+            int | None: Chỉ số điểm, None nếu không có điểm nào thỏa
+        """
+        q = self.points[i]
+        cell = self._coords[i]
+        best, best_d2 = None, np.inf
+        if self.num_alive - int(self._alive[i]) <= 0:
+            return None
+        for r in range(self._max_radius + 1):
+            offsets = self._offsets(r, shell=True)
+            if r > 1 and len(offsets) > self.num_alive:
+                # Vùng trống quá rộng: quét thẳng các điểm còn lại rẻ hơn duyệt tiếp các lớp ô
+                candidates = np.flatnonzero(self._alive)
+                return self._closest(i, q, candidates, accept, best, best_d2)[0]
+
+            candidates = self._gather(cell, offsets)
+            if candidates.size:
+                best, best_d2 = self._closest(i, q, candidates, accept, best, best_d2)
+            # Mọi điểm chưa duyệt cách i ít nhất r * cell_size
+            if best is not None and best_d2 <= (r * self.cell_size) ** 2:
+                break
+        return best
+
+    def _closest(self, i, q, candidates, accept, best, best_d2):
+        """Cập nhật (best, best_d2) bằng điểm gần q nhất trong candidates thỏa accept."""
+        d2 = ((self.points[candidates] - q) ** 2).sum(axis=1)
+        for t in np.argsort(d2):
+            if d2[t] >= best_d2:
+                break
+            j = int(candidates[t])
+            if j != i and (accept is None or accept(j)):
+                return j, d2[t]
+        return best, best_d2
+
+    def k_nearest_all(self, k: int) -> np.ndarray:
+        """
+        k láng giềng gần nhất của mọi điểm (kể cả điểm đã xóa), xử lý theo từng ô lưới.
+
+        Returns:
+            np.ndarray: Mảng int32 (n x k), mỗi hàng sắp theo khoảng cách tăng dần
+        """
+        n = self.num_points
+        k = max(0, min(int(k), n - 1))
+        result = np.empty((n, k), dtype=np.int32)
+        if k == 0:
+            return result
+
+        # Lưới thô hơn (khoảng k điểm mỗi ô) để mỗi lượt xử lý được nhiều điểm cùng lúc
+        if self.points_per_cell >= k and self.num_alive == n:
+            grid = self
+        else:
+            grid = self._regrid(max(k, self.points_per_cell))
+        points = self.points
+        for start, stop in zip(grid._cell_start, grid._cell_stop):
+            pending = grid._order[start:stop]
+            cell = grid._coords[pending[0]]
+            r = 1
+            while pending.size:
+                candidates = grid._gather(cell, grid._offsets(r, shell=False))
+                exhausted = r > grid._max_radius
+                if candidates.size > k or exhausted:
+                    d2 = ((points[pending][:, np.newaxis, :]
+                           - points[candidates][np.newaxis, :, :]) ** 2).sum(axis=2)
+                    d2[pending[:, np.newaxis] == candidates[np.newaxis, :]] = np.inf
+
+                    part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+                    part_d2 = np.take_along_axis(d2, part, axis=1)
+                    ranking = np.argsort(part_d2, axis=1, kind='stable')
+                    nearest = candidates[np.take_along_axis(part, ranking, axis=1)]
+                    kth = np.take_along_axis(part_d2, ranking[:, -1:], axis=1)[:, 0]
+
+                    # Mọi điểm ngoài khối đã duyệt cách ô trung tâm ít nhất r * cell_size
+                    done = exhausted | (kth <= (r * grid.cell_size) ** 2)
+                    result[pending[done]] = nearest[done]
+                    pending = pending[~done]
+                r += 1
+        return result
+
+    def __len__(self) -> int:
+        return self.num_points
+
+    def __repr__(self) -> str:
+        return (f"SpatialIndex(num_points={self.num_points}, alive={self.num_alive}, "
+                f"cells={self._cell_keys.size})")